@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+analysis_client.py
+- 分析服务 (analysis_server.py) 的客户端：通过 HTTP 或 Unix 套接字发送查询，返回解析后的 JSON
+- 只依赖标准库，命令行查询无需导入 numpy / pandas
+- 用法:
+    from analysis_client import request
+    request('/describe?columns=stepparent_current_score&by=gender')
+    request('/paired?pairs=stepparent_current_score:bioparent_current_score', '/tmp/stepfamily.sock')
+"""
+
+import http.client
+import json
+import socket
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_ADDRESS = f'{DEFAULT_HOST}:{DEFAULT_PORT}'
+
+
+class QueryError(ValueError):
+    """查询参数无效或服务返回错误"""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """经 Unix 套接字的 HTTP 连接"""
+
+    def __init__(self, path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def is_unix_address(address):
+    """地址为文件路径（含 '/' 或以 .sock 结尾）时使用 Unix 套接字"""
+    return '/' in address or address.endswith('.sock')
+
+
+def connect(address=DEFAULT_ADDRESS, timeout=60):
+    """
+    建立到分析服务的连接
+
+    Args:
+        address: 'host:port' 或 Unix 套接字路径
+    """
+    if is_unix_address(address):
+        return UnixHTTPConnection(address, timeout=timeout)
+    host, _, port = address.rpartition(':')
+    return http.client.HTTPConnection(host or DEFAULT_HOST, int(port), timeout=timeout)
+
+
+def request(path, address=DEFAULT_ADDRESS, timeout=60):
+    """
+    发送一次查询
+
+    Args:
+        path: 查询路径，如 '/describe?columns=stepparent_current_score&by=gender'
+        address: 'host:port' 或 Unix 套接字路径
+        timeout: 超时（秒）
+
+    Returns:
+        dict: 解析后的 JSON 结果
+    """
+    conn = connect(address, timeout=timeout)
+    try:
+        conn.request('GET', path if path.startswith('/') else '/' + path)
+        response = conn.getresponse()
+        data = json.loads(response.read().decode('utf-8'))
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise QueryError(data.get('error', f'HTTP {response.status}'))
+    return data
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+analysis_server.py
+- 常驻的本地分析服务：数据只加载、计分一次（StepfamilyRelationshipAnalyzer，紧凑表示），
+  得分矩阵、分组编码与题目编码矩阵放入共享内存 (multiprocessing.shared_memory)
+- 通过 HTTP 或 Unix 套接字回答描述统计、配对检验与相关矩阵查询（JSON）；
+  查询结果按规范化后的参数做 LRU 缓存，重复查询直接返回
+- 可选的查询进程池：工作进程附加到同一共享内存，不复制数据
+- 只依赖标准库与项目已有模块
+- 用法:
+    python analysis_server.py --data assets/data.xlsx              # HTTP，默认 127.0.0.1:8765
+    python analysis_server.py --socket /tmp/stepfamily.sock        # Unix 套接字
+    python cli.py query '/describe?columns=stepparent_current_score&by=gender'
+    curl 'http://127.0.0.1:8765/paired?pairs=stepparent_current_score:bioparent_current_score&by=gender'
+    curl 'http://127.0.0.1:8765/correlation?columns=stepparent_current_score,mental_depression'
+"""
+
+import argparse
+import json
+import math
+import os
+import signal
+import socketserver
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import resource_tracker, shared_memory
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from analysis_client import DEFAULT_HOST, DEFAULT_PORT, QueryError
+from correlation_accumulator import PairwiseCorrelationAccumulator
+from descriptive_stats import summarize
+from likert_encoding import decode_likert_block
+from paired_tests import ALL_GROUP, paired_comparisons
+
+# 查询结果缓存的条目数
+DEFAULT_CACHE_SIZE = 1024
+
+# 查询类型 -> (说明, 参数列表)；各参数的解析见 _parse_params
+QUERIES = {
+    'describe': ('描述统计（可按分组）', ['columns', 'by', 'quantile_error']),
+    'paired': ('配对检验：配对t检验、Wilcoxon、效应量、FDR校正（可按分组）', ['pairs', 'by']),
+    'correlation': ('相关矩阵（pearson / spearman，成对缺失处理，可按分组）',
+                    ['columns', 'method', 'by']),
+}
+
+# 未指定列时描述统计与相关矩阵使用的列
+DEFAULT_COLUMNS = ('stepparent_past_score', 'stepparent_current_score',
+                   'bioparent_past_score', 'bioparent_current_score')
+
+CORRELATION_METHODS = ('pearson', 'spearman')
+
+
+class SharedSurvey:
+    """放在共享内存中的计分后数据：数值列矩阵、分组编码与题目编码"""
+
+    def __init__(self, meta, blocks, owner):
+        """
+        Args:
+            meta: 元数据（列名、分组标签、各共享内存块的名称 / dtype / 形状）
+            blocks: 数组名 -> SharedMemory
+            owner: 是否由本进程创建（关闭时负责释放共享内存）
+        """
+        self.meta = meta
+        self.blocks = blocks
+        self.owner = owner
+        self.arrays = {}
+        for name, spec in meta['arrays'].items():
+            array = np.ndarray(spec['shape'], dtype=spec['dtype'], buffer=blocks[name].buf)
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @classmethod
+    def from_analyzer(cls, analyzer):
+        """
+        由已计分的分析器构建：数值列（人口学变量、量表与创伤经历得分、变化得分）按列连续存放为 float64，
+        基本信息列存为分类编码 (int16，缺失为 -1)，题目编码矩阵原样存放 (int8)
+        """
+        frame = analyzer.df
+        numeric = [col for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col])]
+        values = [frame[col].to_numpy(dtype=np.float64) for col in numeric]
+        if isinstance(getattr(analyzer, 'trauma_scores', None), pd.DataFrame):
+            for col in analyzer.trauma_scores.columns:
+                if col not in numeric:
+                    numeric.append(col)
+                    values.append(analyzer.trauma_scores[col].to_numpy(dtype=np.float64))
+
+        groups, codes = {}, []
+        info_columns = analyzer.survey.info_columns if analyzer.survey is not None else {
+            key: analyzer.basic_column(key) for key in analyzer.basic_info}
+        for key, col in info_columns.items():
+            if col is None or col not in frame.columns:
+                continue
+            categorical = pd.Categorical(frame[col])
+            groups[key] = {'column': str(col),
+                           'labels': [str(label) for label in categorical.categories]}
+            codes.append(categorical.codes.astype(np.int16))
+
+        items = [name for scale in analyzer.scales.names
+                 for name in analyzer.scales.item_names(scale)]
+        arrays = {
+            'numeric': np.array(values, dtype=np.float64).reshape(len(numeric), len(frame)),
+            'groups': np.array(codes, dtype=np.int16).reshape(len(codes), len(frame)),
+            'items': np.ascontiguousarray(analyzer.item_codes),
+        }
+
+        blocks, specs = {}, {}
+        try:
+            for name, array in arrays.items():
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks[name] = block
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                specs[name] = {'shm': block.name, 'dtype': array.dtype.str,
+                               'shape': list(array.shape)}
+        except Exception:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+
+        meta = {'n_rows': len(frame), 'numeric': [str(col) for col in numeric],
+                'items': items, 'groups': groups, 'arrays': specs}
+        return cls(meta, blocks, owner=True)
+
+    @classmethod
+    def attach(cls, meta, untrack=True):
+        """
+        在其他进程中附加到已有的共享内存（不复制数据）
+
+        Args:
+            meta: 创建者的元数据（/info 中的 shared_memory 即 meta['arrays']）
+            untrack: 从本进程的 resource_tracker 注销，使本进程退出时不释放共享内存（由创建者负责）；
+                     服务的查询进程池与创建者共用同一个 resource_tracker，不需要注销
+        """
+        blocks = {}
+        for name, spec in meta['arrays'].items():
+            block = shared_memory.SharedMemory(name=spec['shm'])
+            if untrack:
+                resource_tracker.unregister(block._name, 'shared_memory')
+            blocks[name] = block
+        return cls(meta, blocks, owner=False)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def close(self):
+        """释放本进程的视图；创建者同时释放共享内存"""
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+
+class QueryEngine:
+    """在共享内存数据上计算查询结果"""
+
+    def __init__(self, survey):
+        self.survey = survey
+        meta = survey.meta
+        self.numeric_index = {col: i for i, col in enumerate(meta['numeric'])}
+        self.item_index = {col: i for i, col in enumerate(meta['items'])}
+        self.group_index = {}
+        for i, (key, spec) in enumerate(meta['groups'].items()):
+            self.group_index[key] = i
+            self.group_index[spec['column']] = i
+
+    def column(self, name):
+        """某列的 float64 数值（题目编码转换为数值，缺失为 NaN）"""
+        if name in self.numeric_index:
+            return self.survey.arrays['numeric'][self.numeric_index[name]]
+        if name in self.item_index:
+            return decode_likert_block(self.survey.arrays['items'][:, self.item_index[name]])
+        raise QueryError(f"未知的列: {name}")
+
+    def frame(self, columns):
+        return pd.DataFrame({col: self.column(col) for col in columns})
+
+    def group_labels(self, by):
+        """分组变量的标签（缺失为 None）"""
+        if by not in self.group_index:
+            raise QueryError(f"未知的分组变量: {by}（可用: {', '.join(self.survey.meta['groups'])}）")
+        i = self.group_index[by]
+        spec = list(self.survey.meta['groups'].values())[i]
+        codes = self.survey.arrays['groups'][i]
+        return pd.Categorical.from_codes(codes, spec['labels'])
+
+    def groups(self, by):
+        """[(分组名, 行掩码), ...]，第一项为全体"""
+        groups = [(ALL_GROUP, np.ones(self.survey.meta['n_rows'], dtype=bool))]
+        if by is None:
+            return groups
+        labels = self.group_labels(by)
+        codes = labels.codes
+        groups += [(label, codes == i) for i, label in enumerate(labels.categories)
+                   if (codes == i).any()]
+        return groups
+
+    def describe(self, columns=None, by=None, quantile_error=None):
+        columns = list(columns or DEFAULT_COLUMNS)
+        frame = self.frame(columns)
+        results = []
+        for group, mask in self.groups(by):
+            summary = summarize(frame[mask], columns, quantile_error=quantile_error)
+            results.append({
+                'group': group,
+                'n': int(mask.sum()),
+                'statistics': {col: summary.describe(col).to_dict() for col in columns},
+            })
+        return {'query': 'describe', 'by': by, 'groups': results}
+
+    def paired(self, pairs, by=None):
+        if not pairs:
+            raise QueryError("缺少参数 pairs（格式: 列A:列B,列C:列D）")
+        columns = list(dict.fromkeys(col for pair in pairs for col in pair))
+        frame = self.frame(columns)
+        group_by = None if by is None else np.asarray(self.group_labels(by), dtype=object)
+        results = paired_comparisons(frame, pairs, group_by=group_by)
+        return {'query': 'paired', 'by': by, 'results': results.to_dict('records')}
+
+    def correlation(self, columns=None, method='pearson', by=None):
+        columns = list(columns or DEFAULT_COLUMNS)
+        frame = self.frame(columns)
+        results = []
+        for group, mask in self.groups(by):
+            if method == 'pearson':
+                corr = PairwiseCorrelationAccumulator.from_values(
+                    frame.to_numpy()[mask], columns).correlation()
+            else:
+                corr = frame[mask].corr(method=method)
+            results.append({'group': group, 'n': int(mask.sum()),
+                            'matrix': corr.to_numpy().tolist()})
+        return {'query': 'correlation', 'method': method, 'by': by, 'columns': columns,
+                'groups': results}
+
+    def run(self, kind, params):
+        return getattr(self, kind)(**dict(params))
+
+    def warm_up(self):
+        """启动时先计算一次各类查询，使统计模块（scipy 等）的导入不计入第一次查询的延迟"""
+        self.describe()
+        self.paired([DEFAULT_COLUMNS[:2]])
+        self.correlation(method='spearman')
+
+
+def _split(value):
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def _parse_params(kind, query):
+    """
+    解析并规范化查询参数（规范化后的参数作为缓存键）
+
+    Returns:
+        tuple: ((参数名, 值), ...)
+    """
+    allowed = QUERIES[kind][1]
+    unknown = set(query) - set(allowed)
+    if unknown:
+        raise QueryError(f"{kind} 查询不支持的参数: {', '.join(sorted(unknown))}")
+    params = {}
+    for name, values in query.items():
+        value = values[-1]
+        if name == 'columns':
+            params[name] = _split(value)
+        elif name == 'pairs':
+            pairs = []
+            for item in _split(value):
+                a, sep, b = item.partition(':')
+                if not sep or not a or not b:
+                    raise QueryError(f"配对格式应为 列A:列B: {item}")
+                pairs.append((a, b))
+            params[name] = tuple(pairs)
+        elif name == 'quantile_error':
+            try:
+                error = float(value)
+            except ValueError:
+                raise QueryError(f"quantile_error 应为数值: {value}") from None
+            if not 0 < error < 1:
+                raise QueryError(f"quantile_error 需在 0 与 1 之间: {value}")
+            params[name] = error
+        elif name == 'method':
+            if value not in CORRELATION_METHODS:
+                raise QueryError(f"method 应为 {' / '.join(CORRELATION_METHODS)}: {value}")
+            params[name] = value
+        else:
+            params[name] = value or None
+    return tuple(sorted(params.items()))
+
+
+def _jsonable(obj):
+    """转换为可序列化为 JSON 的对象（NaN / inf 为 null，numpy 标量转换为 Python 类型）"""
+    if isinstance(obj, dict):
+        return {str(key): _jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(value) for value in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def _encode(result):
+    return json.dumps(_jsonable(result), ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+# 查询工作进程中的数据（进程池初始化时附加到共享内存）
+_WORKER = {}
+
+
+def _init_worker(meta):
+    _WORKER['survey'] = SharedSurvey.attach(meta, untrack=False)
+    _WORKER['engine'] = QueryEngine(_WORKER['survey'])
+    _WORKER['engine'].warm_up()
+
+
+def _run_query(kind, params):
+    """进程池任务：在工作进程中计算一次查询，返回 JSON 字节串"""
+    return _encode(_WORKER['engine'].run(kind, params))
+
+
+class AnalysisService:
+    """分析服务：共享内存数据、查询引擎、结果缓存与可选的查询进程池"""
+
+    def __init__(self, survey, cache_size=DEFAULT_CACHE_SIZE, n_jobs=0, data_path=None):
+        """
+        Args:
+            survey: SharedSurvey
+            cache_size: 查询结果缓存的条目数
+            n_jobs: 查询进程数；0 表示在服务线程中直接计算
+            data_path: 数据文件路径（只用于 /info）
+        """
+        self.survey = survey
+        self.engine = QueryEngine(survey)
+        self.engine.warm_up()
+        self.data_path = data_path
+        self.started = time.time()
+        self.executor = None
+        if n_jobs > 0:
+            self.executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                                initargs=(survey.meta,))
+            # 预先启动工作进程（附加共享内存并预热），不计入第一次查询的延迟
+            self.executor.submit(int).result()
+        self.query = lru_cache(maxsize=cache_size)(self._execute)
+        self._lock = threading.Lock()
+        self.n_queries = 0
+
+    @classmethod
+    def from_data(cls, data_path, cache_size=DEFAULT_CACHE_SIZE, n_jobs=0):
+        """加载数据、计分（紧凑表示）并把结果放入共享内存"""
+        from stepfamily_analysis import StepfamilyRelationshipAnalyzer
+
+        analyzer = StepfamilyRelationshipAnalyzer(data_path, compact=True)
+        if not analyzer.load_data():
+            raise RuntimeError(f"数据加载失败: {data_path}")
+        analyzer.calculate_relationship_scores()
+        survey = SharedSurvey.from_analyzer(analyzer)
+        return cls(survey, cache_size=cache_size, n_jobs=n_jobs, data_path=data_path)
+
+    def _execute(self, kind, params):
+        if self.executor is not None:
+            return self.executor.submit(_run_query, kind, params).result()
+        return _encode(self.engine.run(kind, params))
+
+    def handle(self, path):
+        """
+        处理一次请求
+
+        Returns:
+            tuple: (HTTP 状态码, JSON 字节串)
+        """
+        url = urlsplit(path)
+        kind = url.path.strip('/') or 'info'
+        try:
+            if kind == 'info':
+                return 200, _encode(self.info())
+            if kind == 'stats':
+                return 200, _encode(self.stats())
+            if kind not in QUERIES:
+                return 404, _encode({'error': f"未知的查询: {kind}（可用: {', '.join(QUERIES)}）"})
+            params = _parse_params(kind, parse_qs(url.query, keep_blank_values=True))
+            with self._lock:
+                self.n_queries += 1
+            return 200, self.query(kind, params)
+        except QueryError as e:
+            return 400, _encode({'error': str(e)})
+        except Exception as e:
+            # 其余异常同样返回 JSON 错误，而不是中断连接
+            traceback.print_exc()
+            return 500, _encode({'error': f"查询失败: {type(e).__name__}: {e}"})
+
+    def info(self):
+        meta = self.survey.meta
+        return {
+            'data_path': self.data_path,
+            'n_rows': meta['n_rows'],
+            'numeric_columns': meta['numeric'],
+            'item_columns': meta['items'],
+            'groups': meta['groups'],
+            'queries': {kind: {'description': text, 'params': params}
+                        for kind, (text, params) in QUERIES.items()},
+            'shared_memory': meta['arrays'],
+            'shared_memory_mb': round(self.survey.nbytes / 1024 ** 2, 3),
+        }
+
+    def stats(self):
+        cache = self.query.cache_info()
+        return {'uptime_s': round(time.time() - self.started, 1), 'queries': self.n_queries,
+                'cache_hits': cache.hits, 'cache_misses': cache.misses,
+                'cache_size': cache.currsize, 'cache_max_size': cache.maxsize}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.survey.close()
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理：GET /info、/stats 与 QUERIES 中的查询"""
+
+    server_version = 'StepfamilyAnalysis/1.0'
+
+    def do_GET(self):
+        status, body = self.server.service.handle(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix 套接字的客户端地址为空字符串
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """经 Unix 套接字的多线程 HTTP 服务"""
+
+    daemon_threads = True
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, verbose=False):
+    """
+    创建 HTTP 服务（指定 socket_path 时使用 Unix 套接字）
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, AnalysisRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(data_path, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None,
+          cache_size=DEFAULT_CACHE_SIZE, n_jobs=0, verbose=False):
+    """
+    加载数据并运行分析服务，直到中断 (Ctrl+C)
+    """
+    start = time.perf_counter()
+    service = AnalysisService.from_data(data_path, cache_size=cache_size, n_jobs=n_jobs)
+    server = create_server(service, host, port, socket_path, verbose)
+    address = socket_path or f'http://{host}:{server.server_address[1]}'
+    meta = service.survey.meta
+    print(f"数据已载入共享内存: {meta['n_rows']} 行，{len(meta['numeric'])} 个数值列，"
+          f"{len(meta['items'])} 个题目（{service.survey.nbytes / 1024 ** 2:.2f} MB，"
+          f"用时 {time.perf_counter() - start:.2f} 秒）")
+    print(f"分析服务已启动: {address}（Ctrl+C 停止）")
+    # 收到 SIGTERM 时同样释放共享内存与套接字文件
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止分析服务...")
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main(argv=None):
+    """命令行入口（也供 cli.py 调用）"""
+    parser = argparse.ArgumentParser(description='继家庭关系研究 - 常驻分析服务')
+    parser.add_argument('--data', default='assets/data.xlsx',
+                        help='数据文件路径（可为通配符、目录或 JSON 清单）')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口')
+    parser.add_argument('--socket', default=None, help='改用 Unix 套接字（文件路径）')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='查询结果缓存的条目数')
+    parser.add_argument('--n-jobs', type=int, default=0,
+                        help='查询进程数（附加到共享内存）；0 表示在服务线程中计算')
+    parser.add_argument('--verbose', action='store_true', help='输出每个请求的日志')
+    args = parser.parse_args(argv)
+
+    serve(args.data, args.host, args.port, args.socket, args.cache_size, args.n_jobs,
+          args.verbose)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
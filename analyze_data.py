@@ -1,15 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import pandas as pd
-import numpy as np
+from data_loader import load_survey_data
 
 def analyze_stepfamily_data():
     """分析继家庭研究数据"""
     
     # 读取Excel文件
     print("正在读取数据文件...")
-    df = pd.read_excel('assets/data.xlsx')
+    df = load_survey_data('assets/data.xlsx')
     
     print(f"\n=== 数据文件基本信息 ===")
     print(f"数据形状: {df.shape}")
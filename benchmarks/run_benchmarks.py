@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_benchmarks.py
+- 用 synthetic_data 生成不同规模（默认 1k / 100k 行）的模拟问卷，逐个计时流水线各阶段
+- 结果与本机保存的基线比较，任一阶段变慢超过容差，或本机没有基线时以非零状态退出
+- 基线与机器、Python 环境相关，不纳入版本控制：每台机器（包括 CI）先用 --save-baseline 建立自己的基线；
+  同一个基线文件按机器信息分别保存多台机器的基线
+- 用法:
+    python benchmarks/run_benchmarks.py                       # 与基线比较
+    python benchmarks/run_benchmarks.py --sizes 1k 100k 1m    # 包含 1M 行（需要较大内存与磁盘）
+    python benchmarks/run_benchmarks.py --save-baseline       # 以本次结果作为本机新的基线
+    python benchmarks/run_benchmarks.py --allow-missing-baseline   # 本机没有基线时只提示
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+# 使脚本可以导入项目根目录下的共享模块
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from correlation_accumulator import PairwiseCorrelationAccumulator
+from data_loader import load_survey_data
+from paired_tests import paired_comparisons
+from pipeline import import_script
+from profiling import peak_rss_mb, peak_rss_since_reset_mb, reset_peak_rss, rss_mb
+from reliability import scale_reliability
+from synthetic_data import write_survey
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 生成的数据文件与缓存（不纳入版本控制）
+DATA_DIR = os.path.join(BENCHMARK_DIR, '.data')
+
+# 基线文件（按机器保存，不纳入版本控制）
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baselines.json')
+
+# 规模名称 -> 行数
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+DEFAULT_SIZES = ['1k', '100k']
+
+# 默认容差：比基线慢 50% 以上视为性能回退
+DEFAULT_TOLERANCE = 0.5
+
+# 低于该耗时的阶段计时噪声较大，比较时按该值计
+MIN_COMPARABLE_S = 0.05
+
+
+def dataset_path(size, seed, ext='csv'):
+    """某规模模拟数据的文件路径；已存在时直接复用"""
+    path = os.path.join(DATA_DIR, f'survey_{size}_seed{seed}.{ext}')
+    if not os.path.exists(path):
+        print(f"生成 {SIZES[size]} 行模拟数据: {path}")
+        write_survey(path, SIZES[size], seed=seed)
+    return path
+
+
+class BenchmarkContext:
+    """一个规模下各阶段共享的数据（按需计算）"""
+
+    def __init__(self, size, seed, work_dir):
+        self.size = size
+        self.seed = seed
+        self.work_dir = work_dir
+        self.csv_path = dataset_path(size, seed)
+        self._values = {}
+
+    def get(self, name, factory):
+        if name not in self._values:
+            self._values[name] = factory()
+        return self._values[name]
+
+    @property
+    def raw(self):
+        return self.get('raw', lambda: load_survey_data(self.csv_path, use_cache=False))
+
+    @property
+    def processed(self):
+        preprocess = import_script('01_preprocess_data')
+        return self.get('processed', lambda: preprocess.process_frame(self.raw, verbose=False))
+
+    @property
+    def analyzer(self):
+        def build():
+            from stepfamily_analysis import StepfamilyRelationshipAnalyzer
+
+            # 与流水线一致使用紧凑表示
+            analyzer = StepfamilyRelationshipAnalyzer(self.csv_path, self.work_dir, compact=True)
+            analyzer.df = self.raw
+            analyzer.calculate_relationship_scores()
+            return analyzer
+        return self.get('analyzer', build)
+
+
+# ---------------------------------------------------------------------------
+# 各阶段：准备函数(ctx) 预先计算输入（不计时），计时函数(ctx) 为被计时的部分
+# ---------------------------------------------------------------------------
+
+def _bench_load_csv(ctx):
+    load_survey_data(ctx.csv_path, use_cache=False)
+
+
+def _bench_load_cached(ctx):
+    cache_dir = os.path.join(ctx.work_dir, 'cache')
+    load_survey_data(ctx.csv_path, cache_dir=cache_dir)
+
+
+def _setup_load_cached(ctx):
+    # 预先建立缓存，计时的是缓存命中时的加载
+    load_survey_data(ctx.csv_path, cache_dir=os.path.join(ctx.work_dir, 'cache'))
+
+
+def _bench_preprocess(ctx):
+    import_script('01_preprocess_data').process_frame(ctx.raw, verbose=False)
+
+
+def _bench_preprocess_streaming(ctx):
+    import_script('01_preprocess_data').preprocess_data_streaming(
+        ctx.csv_path, os.path.join(ctx.work_dir, 'stream'), chunksize=50000)
+
+
+def _bench_correlation(ctx):
+    processed = ctx.processed
+    PairwiseCorrelationAccumulator.from_values(
+        processed.to_numpy(dtype=np.float64), processed.columns).correlation()
+
+
+def _bench_descriptive(ctx):
+    from descriptive_stats import summarize_frames
+
+    # 分块计算、分位数使用 KLL 草图（流式报告的内存有界路径）
+    processed = ctx.processed
+    chunks = (processed.iloc[start:start + 50000] for start in range(0, len(processed), 50000))
+    summarize_frames(chunks, quantile_error=0.01).describe_frame()
+
+
+def _bench_relationship_scores(ctx):
+    from stepfamily_analysis import StepfamilyRelationshipAnalyzer
+
+    analyzer = StepfamilyRelationshipAnalyzer(ctx.csv_path, ctx.work_dir)
+    analyzer.df = ctx.raw.copy(deep=False)
+    analyzer.calculate_relationship_scores()
+
+
+def _bench_item_comparisons(ctx):
+    analyzer = ctx.analyzer
+    scales = analyzer.scales
+    names = ['stepparent_past', 'stepparent_current', 'bioparent_past', 'bioparent_current']
+    items = scales.item_frame(analyzer.item_codes, names)
+    pairs = []
+    for past, current in [('stepparent_past', 'stepparent_current'),
+                          ('bioparent_past', 'bioparent_current')]:
+        pairs += list(zip(scales.item_names(past), scales.item_names(current)))
+    gender = analyzer.df[analyzer.basic_column('gender')].to_numpy()
+    paired_comparisons(items, pairs, group_by=gender)
+
+
+def _bench_reliability(ctx):
+    analyzer = ctx.analyzer
+    scale_reliability(analyzer.item_codes, analyzer.scales,
+                      group_by=analyzer.df[analyzer.basic_column('gender')])
+
+
+def _bench_clustering(ctx):
+    from clustering import cluster_relationship_patterns
+
+    cluster_relationship_patterns(ctx.analyzer.df, n_jobs=1)
+
+
+def _bench_modelling(ctx):
+    from modelling import fit_models
+
+    fit_models(ctx.get('model_frame', ctx.analyzer.model_frame), n_bootstrap=1000, n_jobs=1)
+
+
+def _bench_subgroup_analysis(ctx):
+    from subgroup_analysis import SubgroupAnalyzer
+
+    SubgroupAnalyzer(ctx.analyzer, n_jobs=1).run()
+
+
+# 阶段名 -> (计时函数, 准备函数)
+BENCHMARKS = {
+    'load_csv': (_bench_load_csv, None),
+    'load_cached': (_bench_load_cached, _setup_load_cached),
+    'preprocess': (_bench_preprocess, lambda ctx: ctx.raw),
+    'preprocess_streaming': (_bench_preprocess_streaming, None),
+    'correlation': (_bench_correlation, lambda ctx: ctx.processed),
+    'descriptive': (_bench_descriptive, lambda ctx: ctx.processed),
+    'relationship_scores': (_bench_relationship_scores, lambda ctx: ctx.raw),
+    'item_comparisons': (_bench_item_comparisons, lambda ctx: ctx.analyzer),
+    'reliability': (_bench_reliability, lambda ctx: ctx.analyzer),
+    'clustering': (_bench_clustering, lambda ctx: ctx.analyzer),
+    'modelling': (_bench_modelling, lambda ctx: ctx.get('model_frame', ctx.analyzer.model_frame)),
+    'subgroup_analysis': (_bench_subgroup_analysis, lambda ctx: ctx.analyzer),
+}
+
+
+def run_benchmarks(sizes=None, stages=None, repeat=3, seed=0):
+    """
+    运行基准测试
+
+    Returns:
+        dict: {规模: {阶段: {'seconds': 最短耗时, 'peak_rss_mb': 峰值RSS,
+                            'rss_growth_mb': 峰值RSS相对阶段开始时的增长,
+                            'peak_rss_scope': 'stage' 或 'process'}}}
+
+        系统支持重置峰值 RSS (Linux) 时 peak_rss_mb 为该阶段计时部分的峰值（scope 为 'stage'）；
+        否则为进程启动以来的累计峰值（scope 为 'process'），后面的阶段会继承前面阶段的峰值
+    """
+    sizes = sizes or DEFAULT_SIZES
+    stages = stages or list(BENCHMARKS)
+    results = {}
+    for size in sizes:
+        work_dir = tempfile.mkdtemp(prefix=f'bench_{size}_')
+        try:
+            ctx = BenchmarkContext(size, seed, work_dir)
+            results[size] = {}
+            for stage in stages:
+                func, setup = BENCHMARKS[stage]
+                # 各阶段自身的进度输出不计入结果
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if setup is not None:
+                        setup(ctx)
+                    rss_before = rss_mb()
+                    per_stage = reset_peak_rss()
+                    timings = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        func(ctx)
+                        timings.append(time.perf_counter() - start)
+                peak = peak_rss_since_reset_mb() if per_stage else peak_rss_mb()
+                results[size][stage] = {
+                    'seconds': min(timings),
+                    'peak_rss_mb': None if peak is None else round(peak, 1),
+                    'rss_growth_mb': (None if peak is None or rss_before is None
+                                      else round(peak - rss_before, 1)),
+                    'peak_rss_scope': 'stage' if per_stage else 'process',
+                }
+                memory = '' if peak is None else (
+                    f"  峰值 {peak:8.1f} MB" + ('' if per_stage else ' (进程累计)'))
+                print(f"  [{size}] {stage:<22s} {min(timings):9.4f} s{memory}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def machine_key(info=None):
+    """机器信息的摘要，作为基线文件中本机基线的键"""
+    info = info or machine_info()
+    return hashlib.sha1(json.dumps(info, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def load_baselines(path):
+    """
+    读取基线文件
+
+    Returns:
+        dict: 机器键 -> 基线报告；文件不存在时为空
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'results' in data:
+        # 旧格式：整个文件为一台机器的基线
+        return {machine_key(data.get('machine')): data}
+    return data.get('machines', {})
+
+
+def save_baselines(path, baselines):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'machines': baselines}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    与基线比较
+
+    Returns:
+        tuple: (回退列表 [(规模, 阶段, 基线耗时, 本次耗时), ...], 基线中没有的 [(规模, 阶段), ...])
+    """
+    regressions = []
+    missing = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get('results', {}).get(size, {}).get(stage)
+            if base is None:
+                print(f"  [{size}] {stage:<22s} 基线中没有该阶段")
+                missing.append((size, stage))
+                continue
+            base_s = max(base['seconds'], MIN_COMPARABLE_S)
+            current_s = max(result['seconds'], MIN_COMPARABLE_S)
+            ratio = current_s / base_s
+            flag = '回退' if ratio > 1 + tolerance else ''
+            print(f"  [{size}] {stage:<22s} 基线 {base['seconds']:9.4f} s  "
+                  f"本次 {result['seconds']:9.4f} s  x{ratio:5.2f} {flag}")
+            if ratio > 1 + tolerance:
+                regressions.append((size, stage, base['seconds'], result['seconds']))
+    return regressions, missing
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='流水线各阶段的基准测试')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES,
+                        help='数据规模')
+    parser.add_argument('--stages', nargs='+', choices=list(BENCHMARKS), default=None,
+                        help='只运行指定阶段')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段的重复次数（取最短耗时）')
+    parser.add_argument('--seed', type=int, default=0, help='模拟数据的随机种子')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件')
+    parser.add_argument('--save-baseline', action='store_true', help='以本次结果作为新的基线')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='允许的变慢比例（0.5 表示慢 50%% 以内不算回退）')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help='基线文件缺失、来自不同机器或缺少某些阶段时只提示，不以非零状态退出')
+    parser.add_argument('--output', default=None, help='将本次结果写入该 JSON 文件')
+    args = parser.parse_args()
+
+    print("运行基准测试...")
+    results = run_benchmarks(args.sizes, args.stages, repeat=args.repeat, seed=args.seed)
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baselines = load_baselines(args.baseline)
+    key = machine_key()
+    if args.save_baseline:
+        # 保留本机未重新测量的规模/阶段的旧基线，其他机器的基线不变
+        old = baselines.get(key, {})
+        for size, stages in old.get('results', {}).items():
+            for stage, result in stages.items():
+                report['results'].setdefault(size, {}).setdefault(stage, result)
+        baselines[key] = report
+        save_baselines(args.baseline, baselines)
+        print(f"本机基线 ({key}) 已保存到: {args.baseline}")
+        return
+
+    def baseline_problem(message):
+        """基线不可用：默认以非零状态退出，--allow-missing-baseline 时只提示"""
+        if args.allow_missing_baseline:
+            print(f"警告: {message}")
+            return
+        print(f"错误: {message}")
+        print("使用 --save-baseline 在当前机器上建立基线，或以 --allow-missing-baseline 跳过该检查")
+        sys.exit(2)
+
+    baseline = baselines.get(key)
+    if baseline is None:
+        baseline_problem(f"{args.baseline} 中没有本机 ({key}: {machine_info()}) 的基线")
+        return
+
+    print(f"与基线比较（容差 {args.tolerance:.0%}）...")
+    regressions, missing = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"发现 {len(regressions)} 个性能回退:")
+        for size, stage, base_s, current_s in regressions:
+            print(f"  - [{size}] {stage}: {base_s:.4f} s -> {current_s:.4f} s")
+        sys.exit(1)
+    if missing:
+        baseline_problem(f"基线中缺少 {len(missing)} 个阶段: "
+                         + ", ".join(f"[{size}] {stage}" for size, stage in missing))
+    print("未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cli.py
+- 统一命令行入口：overview / preprocess / correlate / compare / describe / visualize / serve / query
+- 模块顶层只导入标准库；各子命令运行时才导入所需模块（pandas、scipy、matplotlib 等），
+  matplotlib 与中文字体只在渲染图表时设置（figure_rendering），查看帮助、列概览等快速命令
+  不必等待这些依赖加载
+- 用法:
+    python cli.py overview                      # 列概览（有缓存时只读取列名与行数）
+    python cli.py overview --stats              # 同时输出基本统计信息（需要加载数据）
+    python cli.py preprocess --imputation mice  # 参数同 scripts/01_preprocess_data.py
+    python cli.py correlate --bootstrap 1000    # 参数同 scripts/02_correlation_analysis.py
+    python cli.py compare --items               # 继父母vs生身父母对比（可加题目级对比）
+    python cli.py describe --quantile-error 0.01 --n-jobs 4   # 分块流式描述性统计（内存有界）
+    python cli.py visualize                     # 参数同 scripts/03_visualize_results.py
+    python cli.py serve --socket /tmp/stepfamily.sock         # 常驻分析服务（参数同 analysis_server.py）
+    python cli.py query '/describe?by=gender'   # 向分析服务发送查询
+    python cli.py <子命令> -h                   # 查看子命令参数
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(ROOT_DIR, 'scripts')
+
+
+def _import_script(name):
+    """导入 scripts/ 下的编号脚本（文件名以数字开头，只能通过 importlib 导入）"""
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    return importlib.import_module(name)
+
+
+def _run_script(name, argv):
+    """以给定参数运行 scripts/ 下编号脚本的 main()"""
+    return _import_script(name).main(argv)
+
+
+def run_overview(argv):
+    """列概览；--stats 时加载数据并输出基本统计信息"""
+    parser = argparse.ArgumentParser(prog='cli.py overview', description='数据列概览')
+    parser.add_argument('--data', default='assets/data.xlsx', help='数据文件路径')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--stats', action='store_true', help='同时生成基本统计信息（需要加载数据）')
+    args = parser.parse_args(argv)
+
+    from main import StepfamilyDataAnalyzer
+
+    analyzer = StepfamilyDataAnalyzer(args.data, args.output_dir)
+    if args.stats:
+        if not analyzer.load_data():
+            return 1
+        analyzer.generate_column_overview()
+        analyzer.basic_statistics()
+        return 0
+
+    from data_loader import CACHED_EXTENSIONS, survey_header
+
+    ext = os.path.splitext(args.data)[1].lower()
+    if os.path.isfile(args.data) and ext in CACHED_EXTENSIONS + ('.parquet',):
+        columns, n_rows = survey_header(args.data)
+        analyzer.generate_column_overview(columns, n_rows)
+    else:
+        # 多文件来源（通配符、目录、清单）需合并后才能确定列与行数
+        if not analyzer.load_data():
+            return 1
+        analyzer.generate_column_overview()
+    return 0
+
+
+def run_compare(argv):
+    """继父母vs生身父母对比分析（配对检验），可选题目级对比"""
+    from imputation import DEFAULT_IMPUTATIONS, IMPUTATION_METHODS
+
+    parser = argparse.ArgumentParser(prog='cli.py compare', description='继父母vs生身父母对比分析')
+    parser.add_argument('--data', default='assets/data.xlsx',
+                        help='数据文件路径（可为通配符、目录或 JSON 清单）')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--compact', action='store_true', help='计分后只保留紧凑表示')
+    parser.add_argument('--items', action='store_true', help='同时进行题目级对比（按性别分组）')
+    parser.add_argument('--imputation', choices=IMPUTATION_METHODS, default='none',
+                        help='缺失数据处理方法；mice 时另外输出按 Rubin 规则合并的结果')
+    parser.add_argument('--min-completeness', type=float, default=None,
+                        help='量表最低作答比例 (0-1)，低于该比例的参与者不计分')
+    parser.add_argument('--n-imputations', type=int, default=DEFAULT_IMPUTATIONS,
+                        help='多重填补的数据集数')
+    parser.add_argument('--seed', type=int, default=0, help='多重填补的随机种子')
+    parser.add_argument('--n-jobs', type=int, default=None, help='多重填补的并行进程数')
+    args = parser.parse_args(argv)
+
+    from stepfamily_analysis import StepfamilyRelationshipAnalyzer
+
+    analyzer = StepfamilyRelationshipAnalyzer(args.data, args.output_dir, compact=args.compact)
+    if not analyzer.load_data():
+        return 1
+    analyzer.calculate_relationship_scores()
+    if args.imputation != 'none' or args.min_completeness is not None:
+        analyzer.impute_scores(args.imputation, args.min_completeness, args.n_imputations,
+                               args.seed, n_jobs=args.n_jobs)
+    analyzer.comparative_analysis()
+    if args.items:
+        analyzer.item_comparisons()
+    return 0
+
+
+def run_describe(argv):
+    """分块读取 CSV / Parquet 数据文件计算描述性统计；使用分位数草图时内存与总行数无关"""
+    parser = argparse.ArgumentParser(prog='cli.py describe', description='流式描述性统计')
+    parser.add_argument('--data', default='output/processed_data.csv',
+                        help='数据文件路径（CSV 或 Parquet）')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--columns', nargs='+', default=None, help='统计的列（默认全部数值列）')
+    parser.add_argument('--chunksize', type=int, default=100000, help='每块的行数')
+    parser.add_argument('--quantile-error', type=float, default=0.01,
+                        help='分位数的目标秩误差（KLL 草图）；0 表示精确计算（需保存全部数值）')
+    parser.add_argument('--seed', type=int, default=0, help='分位数草图的随机种子')
+    parser.add_argument('--n-jobs', type=int, default=1, help='并行进程数')
+    args = parser.parse_args(argv)
+
+    from datetime import datetime
+
+    from descriptive_stats import summarize_frames
+
+    quantile_error = args.quantile_error or None
+    chunks = _import_script('01_preprocess_data').iter_input_chunks(args.data, args.chunksize)
+    summary = summarize_frames(chunks, args.columns, quantile_error=quantile_error,
+                               seed=args.seed, n_workers=args.n_jobs)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_file = os.path.join(args.output_dir, f'descriptive_summary_{timestamp}.txt')
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("继家庭研究数据 - 描述性统计（分块计算）\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"数据文件: {args.data}\n")
+        f.write(f"总行数: {summary.n_rows}\n")
+        f.write(f"缺失值总数: {summary.total_missing}\n")
+        if quantile_error is not None:
+            f.write(f"分位数为近似值，秩误差约 {quantile_error:.2%}\n")
+        f.write("\n")
+        f.write(summary.describe_frame().T.to_string())
+        f.write("\n")
+    print(f"描述性统计已保存到: {output_file}")
+    return 0
+
+
+def run_serve(argv):
+    import analysis_server
+
+    return analysis_server.main(argv)
+
+
+def run_query(argv):
+    """向常驻分析服务发送查询并输出 JSON 结果（只依赖标准库）"""
+    from analysis_client import DEFAULT_ADDRESS, QueryError, request
+
+    parser = argparse.ArgumentParser(prog='cli.py query', description='向分析服务发送查询')
+    parser.add_argument('path', help="查询路径，如 '/describe?columns=stepparent_current_score&by=gender'")
+    parser.add_argument('--address', default=DEFAULT_ADDRESS,
+                        help='服务地址（host:port 或 Unix 套接字路径）')
+    args = parser.parse_args(argv)
+
+    import json
+
+    try:
+        result = request(args.path, args.address)
+    except QueryError as e:
+        print(f"查询失败: {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"无法连接分析服务 {args.address}: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+def run_preprocess(argv):
+    return _run_script('01_preprocess_data', argv)
+
+
+def run_correlate(argv):
+    return _run_script('02_correlation_analysis', argv)
+
+
+def run_visualize(argv):
+    return _run_script('03_visualize_results', argv)
+
+
+# 子命令 -> (运行函数, 说明)；运行函数接收子命令自己的参数列表
+COMMANDS = {
+    'overview': (run_overview, '列概览：列名分类与完整列名清单'),
+    'preprocess': (run_preprocess, '数据预处理（scripts/01_preprocess_data.py）'),
+    'correlate': (run_correlate, '相关性分析（scripts/02_correlation_analysis.py）'),
+    'compare': (run_compare, '继父母vs生身父母对比分析'),
+    'describe': (run_describe, '分块流式描述性统计（分位数草图，内存有界）'),
+    'visualize': (run_visualize, '结果可视化（scripts/03_visualize_results.py）'),
+    'serve': (run_serve, '常驻分析服务（analysis_server.py，数据载入共享内存）'),
+    'query': (run_query, '向分析服务发送描述统计 / 配对检验 / 相关查询'),
+}
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='继家庭关系研究 - 统一命令行入口',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='子命令:\n' + '\n'.join(f'  {name:<12s}{text}' for name, (_, text) in COMMANDS.items())
+               + '\n\n使用 "python cli.py <子命令> -h" 查看子命令参数')
+    parser.add_argument('command', choices=list(COMMANDS), metavar='子命令')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    run, _ = COMMANDS[args.command]
+    return run(args.args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
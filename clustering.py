@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+clustering.py
+- 关系模式聚类：以四个关系质量得分与两个变化得分为特征（标准化后），
+  识别不同的继家庭关系模式类型
+- k-means（k-means++ 初始化）与对角协方差高斯混合模型（潜在剖面分析），按 BIC 选择类别数
+- 各类别数、各次随机重启在进程池中并行运行；距离与对数似然均以矩阵运算一次计算
+- 类别按关系质量由低到高编号，结果写回处理后的数据供后续分析使用
+- 用法:
+    python clustering.py --input output/processed_data.csv --k-min 2 --k-max 6
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from profiling import annotate, profile_stage
+from scale_registry import SCALE_REGISTRY
+
+# 聚类特征：关系分析器中的得分列名
+RELATIONSHIP_FEATURES = ['stepparent_past_score', 'stepparent_current_score',
+                         'bioparent_past_score', 'bioparent_current_score',
+                         'stepparent_change', 'bioparent_change']
+
+# 写回数据的类别列（1 为关系质量最低的一类，特征缺失的参与者为空）与所属类别的后验概率；
+# 这些列不参与相关性分析
+PROFILE_COLUMN = 'cluster_profile'
+LABEL_COLUMNS = ['cluster_kmeans', PROFILE_COLUMN]
+CLUSTER_COLUMNS = LABEL_COLUMNS + ['profile_probability']
+
+# 默认的类别数范围与每个类别数的随机重启次数
+DEFAULT_K_RANGE = range(2, 7)
+DEFAULT_RESTARTS = 10
+
+# 迭代上限与收敛阈值（k-means 为中心移动的平方和，混合模型为平均每人对数似然的变化量）
+MAX_ITER = 300
+TOL = 1e-4
+
+# 每个类别数中，组内平方和最小的几个 k-means 解作为混合模型的初始划分
+MIXTURE_STARTS = 3
+
+# 随机重启在最多这么多行的随机子样本上进行，各类别数的最优解再在全部数据上迭代至收敛
+SAMPLE_ROWS = 20000
+
+# 方差下限（相对于标准化后的单位方差），避免某一类退化为一个点
+MIN_VARIANCE = 1e-3
+
+# 最小类别所占比例低于该值的解不参与类别数选择（潜在剖面分析的常用标准）
+MIN_PROFILE_FRACTION = 0.05
+
+# 工作进程中的标准化特征矩阵
+_DATA = {}
+
+
+def feature_frame(df):
+    """
+    取出聚类特征；处理后的数据（rel_* 列）先换算为分析器的列名并计算变化得分
+
+    Returns:
+        DataFrame，列为 RELATIONSHIP_FEATURES
+    """
+    if all(col in df.columns for col in RELATIONSHIP_FEATURES):
+        return df[RELATIONSHIP_FEATURES]
+    features = pd.DataFrame({f'{name}_score': df[SCALE_REGISTRY[name]['score_name']]
+                             for name in ['stepparent_past', 'stepparent_current',
+                                          'bioparent_past', 'bioparent_current']},
+                            index=df.index)
+    features['stepparent_change'] = features['stepparent_current_score'] - features['stepparent_past_score']
+    features['bioparent_change'] = features['bioparent_current_score'] - features['bioparent_past_score']
+    return features
+
+
+def _squared_distances(x, x_sq, centers):
+    """(n, k) 平方欧氏距离：|x|^2 - 2 x·c + |c|^2，一次矩阵乘法"""
+    d = x_sq[:, np.newaxis] - 2 * (x @ centers.T) + (centers * centers).sum(axis=1)
+    return np.maximum(d, 0.0)
+
+
+def _kmeans_plus_plus(x, x_sq, k, rng):
+    """k-means++ 初始中心"""
+    centers = np.empty((k, x.shape[1]))
+    centers[0] = x[rng.integers(len(x))]
+    closest = _squared_distances(x, x_sq, centers[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        idx = rng.choice(len(x), p=closest / total) if total > 0 else rng.integers(len(x))
+        centers[i] = x[idx]
+        closest = np.minimum(closest, _squared_distances(x, x_sq, centers[i:i + 1])[:, 0])
+    return centers
+
+
+def kmeans(x, k, rng=None, centers=None):
+    """
+    一次 k-means（Lloyd 迭代），未给出初始中心时以 k-means++ 初始化
+
+    Returns:
+        (labels, centers, inertia)
+    """
+    x_sq = (x * x).sum(axis=1)
+    centers = _kmeans_plus_plus(x, x_sq, k, rng) if centers is None else centers.copy()
+    for _ in range(MAX_ITER):
+        labels = _squared_distances(x, x_sq, centers).argmin(axis=1)
+        onehot = labels[:, np.newaxis] == np.arange(k)
+        counts = onehot.sum(axis=0)
+        sums = onehot.T.astype(np.float64) @ x
+        # 空类别保留原来的中心
+        nonempty = counts > 0
+        previous = centers.copy()
+        centers[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+        if ((centers - previous) ** 2).sum() < TOL:
+            break
+    labels = _squared_distances(x, x_sq, centers).argmin(axis=1)
+    inertia = _squared_distances(x, x_sq, centers)[np.arange(len(x)), labels].sum()
+    return labels, centers, float(inertia)
+
+
+def _log_densities(x, weights, means, variances):
+    """(n, k) 各类别的对数加权密度（对角协方差）"""
+    inv = 1 / variances
+    quad = (x * x) @ inv.T - 2 * x @ (means * inv).T + (means * means * inv).sum(axis=1)
+    log_norm = -0.5 * (x.shape[1] * np.log(2 * np.pi) + np.log(variances).sum(axis=1))
+    return np.log(weights) + log_norm - 0.5 * quad
+
+
+def _hard_assignment(x, centers):
+    """按最近中心划分的 (n, k) 0/1 后验概率"""
+    labels = _squared_distances(x, (x * x).sum(axis=1), centers).argmin(axis=1)
+    return (labels[:, np.newaxis] == np.arange(len(centers))).astype(np.float64)
+
+
+def gaussian_mixture(x, resp):
+    """
+    对角协方差高斯混合模型的 EM
+
+    Args:
+        x: (n, d) 标准化特征
+        resp: (n, k) 初始后验概率（k-means 的划分，或子样本上拟合的参数给出的后验）
+
+    Returns:
+        (后验概率 (n, k), 权重, 均值, 方差, 对数似然)
+    """
+    log_likelihood = -np.inf
+    for _ in range(MAX_ITER):
+        # M 步
+        nk = resp.sum(axis=0) + 10 * np.finfo(np.float64).eps
+        weights = nk / len(x)
+        means = resp.T @ x / nk[:, np.newaxis]
+        variances = resp.T @ (x * x) / nk[:, np.newaxis] - means * means
+        variances = np.maximum(variances, MIN_VARIANCE)
+
+        # E 步（先减去每行最大值再取指数）
+        log_dens = _log_densities(x, weights, means, variances)
+        log_max = log_dens.max(axis=1, keepdims=True)
+        resp = np.exp(log_dens - log_max)
+        total = resp.sum(axis=1, keepdims=True)
+        resp /= total
+        new_log_likelihood = float((log_max + np.log(total)).sum())
+        converged = new_log_likelihood - log_likelihood < TOL * len(x)
+        log_likelihood = new_log_likelihood
+        if converged:
+            break
+    return resp, weights, means, variances, log_likelihood
+
+
+def _init_worker(sample, x):
+    """工作进程初始化：保存子样本与全部数据的标准化特征矩阵"""
+    _DATA['sample'] = sample
+    _DATA['x'] = x
+
+
+def _fit_kmeans(k, seed_seq):
+    """子样本上的一次随机重启（只返回中心与组内平方和，不传回 n 行的类别）"""
+    _, centers, inertia = kmeans(_DATA['sample'], k, np.random.default_rng(seed_seq))
+    return {'k': k, 'centers': centers, 'inertia': inertia}
+
+
+def _mixture_result(k, weights, means, variances, log_likelihood):
+    return {'k': k, 'weights': weights, 'means': means, 'variances': variances,
+            'log_likelihood': log_likelihood}
+
+
+def _fit_mixture(k, centers):
+    """子样本上以 k-means 中心划分的类别初始化高斯混合模型（只返回参数与对数似然）"""
+    sample = _DATA['sample']
+    return _mixture_result(k, *gaussian_mixture(sample, _hard_assignment(sample, centers))[1:])
+
+
+def _refine(kmeans_fit, mixture_fit):
+    """在全部数据上从子样本的最优解继续迭代至收敛"""
+    x = _DATA['x']
+    k = kmeans_fit['k']
+    _, centers, inertia = kmeans(x, k, centers=kmeans_fit['centers'])
+    mixture = _mixture_result(k, *gaussian_mixture(x, _posterior(x, mixture_fit))[1:])
+    return {'k': k, 'centers': centers, 'inertia': inertia}, mixture
+
+
+def _posterior(x, fit):
+    """混合模型参数下的后验概率"""
+    log_dens = _log_densities(x, fit['weights'], fit['means'], fit['variances'])
+    resp = np.exp(log_dens - log_dens.max(axis=1, keepdims=True))
+    return resp / resp.sum(axis=1, keepdims=True)
+
+
+def _calinski_harabasz(x, labels, centers, inertia):
+    n, k = len(x), len(centers)
+    counts = np.bincount(labels, minlength=k)
+    between = (counts * ((centers - x.mean(axis=0)) ** 2).sum(axis=1)).sum()
+    return between / (k - 1) / (inertia / (n - k)) if inertia > 0 else np.nan
+
+
+def _relabel(labels, centers):
+    """按类别中心的平均得分由低到高重新编号（1 起）"""
+    order = np.argsort(centers.mean(axis=1), kind='stable')
+    rank = np.empty(len(order), dtype=np.int16)
+    rank[order] = np.arange(1, len(order) + 1)
+    return rank[labels], order
+
+
+@profile_stage()
+def cluster_relationship_patterns(df, k_range=DEFAULT_K_RANGE, n_restarts=DEFAULT_RESTARTS,
+                                  seed=0, n_jobs=None):
+    """
+    关系模式聚类与类别数选择
+
+    Args:
+        df: 包含关系得分的数据（分析器的 df 或处理后的数据）
+        k_range: 候选类别数
+        n_restarts: 每个类别数的随机重启次数
+        seed: 随机种子（结果与并行进程数无关）
+        n_jobs: 并行进程数，默认为 CPU 核数
+
+    Returns:
+        dict:
+            'selection': 各类别数的拟合指标（k-means 组内平方和与 Calinski-Harabasz 指数，
+                         混合模型的对数似然、AIC、BIC 与分类熵）
+            'k': 按混合模型 BIC 选出的类别数（最小类别不少于 MIN_PROFILE_FRACTION 的解中）
+            'assignments': 与 df 行对齐的 cluster_kmeans / cluster_profile（可空整数）
+                           及 profile_probability（所属类别的后验概率）
+            'profiles': 各类别的人数与各特征均值（原始量纲）
+    """
+    features = feature_frame(df)
+    complete = features.notna().all(axis=1).to_numpy()
+    raw = features.to_numpy(dtype=np.float64)[complete]
+    k_range = [k for k in k_range if 1 < k < len(raw)]
+    if not k_range:
+        raise ValueError(f"完整样本 {len(raw)} 行，不足以聚类")
+
+    # 标准化：各特征在距离中权重相同
+    mean = raw.mean(axis=0)
+    sd = raw.std(axis=0, ddof=1)
+    sd[sd == 0] = 1.0
+    x = (raw - mean) / sd
+    annotate(rows=len(x), columns=x.shape[1])
+
+    n, d = x.shape
+    seeds = np.random.SeedSequence(seed).spawn(len(k_range) + 1)
+    sample = (x[np.sort(np.random.default_rng(seeds[-1]).choice(n, SAMPLE_ROWS, replace=False))]
+              if n > SAMPLE_ROWS else x)
+    tasks = [(k, s) for k, restart_seeds in zip(k_range, seeds)
+             for s in restart_seeds.spawn(n_restarts)]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks))
+
+    def mixture_tasks(kmeans_fits):
+        # 每个类别数取组内平方和最小的几个 k-means 解初始化混合模型
+        ranked = sorted(kmeans_fits, key=lambda fit: (fit['k'], fit['inertia']))
+        return [(fit['k'], fit['centers']) for k in k_range
+                for fit in [f for f in ranked if f['k'] == k][:MIXTURE_STARTS]]
+
+    def best_fits(kmeans_fits, mixture_fits):
+        # 每个类别数：k-means 取组内平方和最小的重启，混合模型取对数似然最大的起点
+        best_kmeans = {}
+        best_mixture = {}
+        for fit in kmeans_fits:
+            if fit['k'] not in best_kmeans or fit['inertia'] < best_kmeans[fit['k']]['inertia']:
+                best_kmeans[fit['k']] = fit
+        for fit in mixture_fits:
+            if (fit['k'] not in best_mixture
+                    or fit['log_likelihood'] > best_mixture[fit['k']]['log_likelihood']):
+                best_mixture[fit['k']] = fit
+        return best_kmeans, best_mixture
+
+    def run(submit):
+        kmeans_fits = submit(_fit_kmeans, tasks)
+        mixture_fits = submit(_fit_mixture, mixture_tasks(kmeans_fits))
+        best_kmeans, best_mixture = best_fits(kmeans_fits, mixture_fits)
+        if sample is x:
+            return best_kmeans, best_mixture
+        refined = submit(_refine, [(best_kmeans[k], best_mixture[k]) for k in k_range])
+        return best_fits([km for km, _ in refined], [gm for _, gm in refined])
+
+    if n_jobs <= 1:
+        _init_worker(sample, x)
+        best_kmeans, best_mixture = run(lambda func, args: [func(*a) for a in args])
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(sample, x)) as executor:
+            best_kmeans, best_mixture = run(lambda func, args: [
+                future.result() for future in [executor.submit(func, *a) for a in args]])
+
+    x_sq = (x * x).sum(axis=1)
+    for fit in best_kmeans.values():
+        fit['labels'] = _squared_distances(x, x_sq, fit['centers']).argmin(axis=1)
+    for fit in best_mixture.values():
+        fit['resp'] = _posterior(x, fit)
+
+    rows = []
+    for k in k_range:
+        km, gm = best_kmeans[k], best_mixture[k]
+        n_params = k * 2 * d + (k - 1)
+        resp = gm['resp']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -(resp * np.log(np.where(resp > 0, resp, 1.0))).sum()
+        rows.append({
+            'k': k,
+            'kmeans_inertia': km['inertia'],
+            'calinski_harabasz': _calinski_harabasz(x, km['labels'], km['centers'], km['inertia']),
+            'log_likelihood': gm['log_likelihood'],
+            'n_parameters': n_params,
+            'aic': -2 * gm['log_likelihood'] + 2 * n_params,
+            'bic': -2 * gm['log_likelihood'] + np.log(n) * n_params,
+            'entropy': 1 - entropy / (n * np.log(k)),
+            'smallest_profile': int(np.bincount(resp.argmax(axis=1), minlength=k).min()),
+        })
+    selection = pd.DataFrame(rows)
+    selection['admissible'] = selection['smallest_profile'] >= MIN_PROFILE_FRACTION * n
+    candidates = selection[selection['admissible']] if selection['admissible'].any() else selection
+    best_k = int(candidates.loc[candidates['bic'].idxmin(), 'k'])
+    selection['selected'] = selection['k'] == best_k
+
+    km, gm = best_kmeans[best_k], best_mixture[best_k]
+    kmeans_labels, _ = _relabel(km['labels'], km['centers'])
+    profile_labels, order = _relabel(gm['resp'].argmax(axis=1), gm['means'])
+
+    assignments = pd.DataFrame(index=df.index)
+    for col, labels in zip(LABEL_COLUMNS, [kmeans_labels, profile_labels]):
+        values = np.zeros(len(df), dtype=np.int8)
+        values[complete] = labels
+        assignments[col] = pd.arrays.IntegerArray(values, ~complete)
+    probability = np.full(len(df), np.nan)
+    probability[complete] = gm['resp'].max(axis=1)
+    assignments['profile_probability'] = probability
+
+    profiles = pd.DataFrame(gm['means'][order] * sd + mean, columns=RELATIONSHIP_FEATURES)
+    profiles.insert(0, 'weight', gm['weights'][order])
+    profiles.insert(0, 'n', np.bincount(profile_labels - 1, minlength=best_k))
+    profiles.insert(0, 'profile', np.arange(1, best_k + 1))
+
+    return {'selection': selection, 'k': best_k, 'assignments': assignments, 'profiles': profiles}
+
+
+def write_clusters(processed_path, result):
+    """
+    将类别列写回处理后的数据文件（已有的类别列被替换）
+    """
+    df = pd.read_csv(processed_path)
+    df = df.drop(columns=[col for col in result['assignments'].columns if col in df.columns])
+    df = pd.concat([df, result['assignments'].set_axis(df.index)], axis=1)
+    tmp_path = processed_path + '.tmp'
+    df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    os.replace(tmp_path, processed_path)
+    return processed_path
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='继家庭关系模式聚类')
+    parser.add_argument('--input', default='output/processed_data.csv', help='预处理后的数据')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--k-min', type=int, default=min(DEFAULT_K_RANGE), help='最小类别数')
+    parser.add_argument('--k-max', type=int, default=max(DEFAULT_K_RANGE), help='最大类别数')
+    parser.add_argument('--restarts', type=int, default=DEFAULT_RESTARTS,
+                        help='每个类别数的随机重启次数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--n-jobs', type=int, default=None, help='并行进程数')
+    args = parser.parse_args()
+
+    print("--- 开始关系模式聚类 ---")
+    df = pd.read_csv(args.input)
+    result = cluster_relationship_patterns(df, range(args.k_min, args.k_max + 1),
+                                           n_restarts=args.restarts, seed=args.seed,
+                                           n_jobs=args.n_jobs)
+    print(result['selection'].to_string(index=False, float_format="%.3f"))
+    print(f"按 BIC 选择的类别数: {result['k']}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    selection_path = os.path.join(args.output_dir, 'cluster_selection.csv')
+    profiles_path = os.path.join(args.output_dir, 'cluster_profiles.csv')
+    result['selection'].to_csv(selection_path, index=False, encoding='utf-8-sig')
+    result['profiles'].to_csv(profiles_path, index=False, encoding='utf-8-sig')
+    write_clusters(args.input, result)
+    print(f"类别列 {', '.join(LABEL_COLUMNS)} 已写回: {args.input}")
+    print(f"类别数选择与各类别均值已保存到: {selection_path}, {profiles_path}")
+    print("--- 关系模式聚类完成 ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+column_schema.py
+- 列分组的统一定义：按列名关键词把问卷列归入各类别（基本信息、继父母关系、心理健康、创伤经历……）
+- 全部类别的关键词编译为一个 Aho-Corasick 自动机，所有列名拼接后一次扫描完成分类
+  （重叠的关键词均能识别，不含关键词字符的片段由正则预筛选直接跳过）
+- 分类结果 (ColumnSchema) 可序列化为 JSON，按表头签名缓存（进程内，以及 .cache/column_schema/<签名>.json），
+  同一表头只分类一次；StepfamilyRelationshipAnalyzer 据此核对按索引定义的列分组
+- 只依赖标准库，列概览等快速命令无需导入 pandas
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import re
+from collections import deque
+
+# 分类结构版本，修改序列化格式时递增
+SCHEMA_VERSION = 1
+
+# 列分类的缓存目录（相对于运行目录），文件名为表头签名
+DEFAULT_SCHEMA_DIR = os.path.join('.cache', 'column_schema')
+
+# 列类别定义：类别名 -> 标签、列名关键词（包含任一关键词即属于该类别）、
+# 列概览中最多列出的列数（None 表示全部列出）与超出时的说明
+COLUMN_CATEGORIES = {
+    'basic_info': {
+        'label': '基本信息类',
+        'keywords': ['序号', '时间', '来源', 'IP', '电话', '性别', '年龄', '教育'],
+        'display_limit': 10,
+        'more_label': '基本信息列',
+    },
+    'stepparent': {
+        'label': '继父母关系评估类',
+        'keywords': ['继父', '继母', '我未满18岁时的感受', '我现在的感受'],
+        'display_limit': 15,
+        'more_label': '继父母关系评估列',
+    },
+    'mental_health': {
+        'label': '心理健康评估类',
+        'keywords': ['自己感到满意', '一无是处', '优点', '失败者', '积极态度'],
+        'display_limit': None,
+        'more_label': None,
+    },
+    'trauma': {
+        'label': '创伤经历类',
+        'keywords': ['打击', '拳打', '脚踢', '烧灼', '受伤', '性经历'],
+        'display_limit': None,
+        'more_label': None,
+    },
+}
+
+# 拼接列名时的分隔符（关键词不能包含该字符，匹配片段不会跨越两列）
+_SEPARATOR = '\x00'
+
+
+class KeywordClassifier:
+    """全部类别关键词编译成的一个 Aho-Corasick 自动机"""
+
+    def __init__(self, categories):
+        """
+        Args:
+            categories: 类别定义字典（格式同 COLUMN_CATEGORIES）
+        """
+        self.names = list(categories)
+
+        # 关键词字典树：goto[状态][字符] -> 状态，out[状态] 为在该状态结束的关键词的类别掩码
+        self.goto = [{}]
+        self.out = [0]
+        for bit, spec in enumerate(categories.values()):
+            for keyword in spec['keywords']:
+                if not keyword or _SEPARATOR in keyword:
+                    raise ValueError(f"无效的列名关键词: {keyword!r}")
+                state = 0
+                for ch in keyword:
+                    nxt = self.goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(self.goto)
+                        self.goto[state][ch] = nxt
+                        self.goto.append({})
+                        self.out.append(0)
+                    state = nxt
+                self.out[state] |= 1 << bit
+
+        # 失败指针（广度优先）：失配时退回到当前已读文本的最长可匹配后缀，
+        # 并合并该后缀状态上结束的关键词，使重叠的关键词也都被识别
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if state else 0
+                self.out[nxt] |= self.out[self.fail[nxt]]
+
+        # 预筛选：关键词只可能出现在由关键词字符组成的连续片段内，其余字符由正则一次跳过
+        chars = ''.join(sorted({ch for edges in self.goto for ch in edges}))
+        self.runs = re.compile(f'[{re.escape(chars)}]+') if chars else None
+
+    def _scan(self, text):
+        """在一段文本上运行自动机，返回匹配到的类别掩码"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        mask = 0
+        for ch in text:
+            edges = goto[state]
+            while state and ch not in edges:
+                state = fail[state]
+                edges = goto[state]
+            state = edges.get(ch, 0)
+            mask |= out[state]
+        return mask
+
+    def classify(self, columns):
+        """
+        一次扫描为每列计算类别掩码
+
+        Returns:
+            list: 与 columns 对齐的整数掩码，第 i 位表示属于第 i 个类别
+        """
+        columns = [str(col) for col in columns]
+        masks = [0] * len(columns)
+        if self.runs is None or not columns:
+            return masks
+
+        starts = []
+        offset = 0
+        for col in columns:
+            starts.append(offset)
+            offset += len(col) + 1
+        for match in self.runs.finditer(_SEPARATOR.join(columns)):
+            mask = self._scan(match.group())
+            if mask:
+                masks[bisect.bisect_right(starts, match.start()) - 1] |= mask
+        return masks
+
+
+class ColumnSchema:
+    """列分类结果：各类别包含的列（按原始列顺序）"""
+
+    def __init__(self, columns, categories, signature):
+        """
+        Args:
+            columns: 列名列表
+            categories: 类别名 -> 列索引列表
+            signature: 表头签名（列名与类别定义的摘要）
+        """
+        self.columns = list(columns)
+        self.categories = {name: list(indices) for name, indices in categories.items()}
+        self.signature = signature
+
+    def category_columns(self, name):
+        """某类别的 [(列索引, 列名), ...]"""
+        return [(idx, self.columns[idx]) for idx in self.categories.get(name, [])]
+
+    def column_categories(self, column):
+        """某列（列名或列索引）所属的类别名列表"""
+        idx = column if isinstance(column, int) else self.columns.index(column)
+        return [name for name, indices in self.categories.items() if idx in indices]
+
+    def to_dict(self):
+        return {
+            'version': SCHEMA_VERSION,
+            'signature': self.signature,
+            'columns': [str(col) for col in self.columns],
+            'categories': self.categories,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != SCHEMA_VERSION:
+            raise ValueError(f"不支持的列分类版本: {data.get('version')}")
+        return cls(data['columns'], data['categories'], data['signature'])
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def header_signature(columns, categories=COLUMN_CATEGORIES):
+    """表头签名：列名与类别定义的 SHA-1 摘要"""
+    payload = json.dumps([[str(col) for col in columns],
+                          {name: spec['keywords'] for name, spec in categories.items()}],
+                         ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+# 表头签名 -> ColumnSchema；编译后的分类器按类别定义缓存
+_SCHEMA_CACHE = {}
+_CLASSIFIER_CACHE = {}
+
+
+def _load_cached_schema(path, signature):
+    """读取缓存的列分类；文件不存在、损坏或签名不符时返回 None"""
+    try:
+        schema = ColumnSchema.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return schema if schema.signature == signature else None
+
+
+def build_column_schema(columns, categories=COLUMN_CATEGORIES, cache_dir=None):
+    """
+    按列名关键词对所有列分类（同一表头只分类一次）
+
+    Args:
+        columns: 列名列表（DataFrame.columns 亦可）
+        categories: 类别定义字典
+        cache_dir: 列分类的缓存目录（如 DEFAULT_SCHEMA_DIR），按表头签名读写
+                   <cache_dir>/<签名>.json；None 表示只在进程内缓存
+
+    Returns:
+        ColumnSchema
+    """
+    columns = list(columns)
+    signature = header_signature(columns, categories)
+    schema = _SCHEMA_CACHE.get(signature)
+    if schema is not None:
+        return schema
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f'{signature}.json')
+        schema = _load_cached_schema(cache_path, signature)
+        if schema is not None:
+            _SCHEMA_CACHE[signature] = schema
+            return schema
+
+    key = json.dumps({name: spec['keywords'] for name, spec in categories.items()},
+                     ensure_ascii=False)
+    classifier = _CLASSIFIER_CACHE.get(key)
+    if classifier is None:
+        classifier = _CLASSIFIER_CACHE[key] = KeywordClassifier(categories)
+
+    masks = classifier.classify(columns)
+    schema = ColumnSchema(
+        columns,
+        {name: [idx for idx, mask in enumerate(masks) if mask >> bit & 1]
+         for bit, name in enumerate(classifier.names)},
+        signature)
+    _SCHEMA_CACHE[signature] = schema
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        schema.save(cache_path)
+    return schema
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+compact_survey.py
+- 编码后问卷数据的紧凑表示：不再保留 366 列原始文本
+    题目编码: int8 矩阵，缺失值为 MISSING_CODE（另提供缺失掩码 / pandas 可空 Int8 视图）
+    基本信息: 分类 (category) 类型
+    人口学变量与量表得分: float32
+- 可保存为 Parquet 并原样读回，供多批次数据在单机上分析
+- load_processed() 读取预处理结果（CSV / Parquet / 紧凑格式），紧凑格式只读取人口学变量与得分列，
+  相关性分析与可视化可直接使用 processed_compact.parquet
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from demographics import BASIC_INFO_COLUMNS, DEMOGRAPHIC_COLUMNS, clean_demographic_column
+from likert_encoding import LIKERT_5_POINT_MAPPING, MISSING_CODE
+from scale_registry import PROCESSED_SCALES, SCALE_REGISTRY, compile_scale_registry
+from survey_ingestion import SOURCE_COLUMN, WAVE_COLUMN
+
+# Parquet 文件中的格式版本
+COMPACT_VERSION = 1
+
+# Parquet schema 元数据的键
+METADATA_KEY = b'compact_survey'
+
+
+def _item_column(col_idx):
+    """题目编码在 Parquet 文件中的列名（原始列位置）"""
+    return f'item_{col_idx:03d}'
+
+
+class CompactSurvey:
+    """紧凑表示的问卷数据"""
+
+    def __init__(self, n_columns, info, info_columns, demographics, items, scores):
+        """
+        Args:
+            n_columns: 原始数据的列数（用于编译量表注册表）
+            info: 基本信息 DataFrame（分类类型，保留原始列名）
+            info_columns: basic_info 键（及多批次数据的 wave / source）-> info 中的列名
+            demographics: 人口学变量 DataFrame (float32)
+            items: 题目编码矩阵，列顺序同 scales.column_indices；
+                   int8（缺失值为 MISSING_CODE）或 float32（缺失值为 NaN）
+            scores: 量表得分 DataFrame (float32)，列名为 score_name
+        """
+        self.n_columns = n_columns
+        self.scales = compile_scale_registry(n_columns)
+        self.info = info
+        self.info_columns = info_columns
+        self.demographics = demographics
+        self.items = items
+        self.scores = scores
+
+    @classmethod
+    def from_frame(cls, df, mapping=LIKERT_5_POINT_MAPPING):
+        """
+        由原始问卷 DataFrame 构建：一次性编码、反向计分并计算所有量表得分
+
+        Args:
+            df: 原始数据
+            mapping: 文本答案 -> 分数的映射
+        """
+        n_columns = len(df.columns)
+        scales = compile_scale_registry(n_columns)
+        items = scales.encode(df, mapping)
+        scales.reverse_score(items)
+
+        # 得分在转换精度之前计算
+        scores = pd.DataFrame({SCALE_REGISTRY[name]['score_name']: values.astype(np.float32)
+                               for name, values in scales.score(items).items()},
+                              index=df.index)
+        if items.dtype != np.int8:
+            items = items.astype(np.float32)
+
+        info = {}
+        info_columns = {}
+        for key, idx in BASIC_INFO_COLUMNS.items():
+            if idx < n_columns:
+                info_columns[key] = df.columns[idx]
+                info[df.columns[idx]] = df.iloc[:, idx].astype('category')
+        # 多批次数据追加的批次与来源列
+        for column in (WAVE_COLUMN, SOURCE_COLUMN):
+            if column in df.columns:
+                info_columns[column] = column
+                info[column] = df[column].astype('category')
+        info = pd.DataFrame(info, index=df.index)
+
+        demographics = pd.DataFrame(
+            {name: clean_demographic_column(df.iloc[:, idx]).astype(np.float32)
+             for idx, name in DEMOGRAPHIC_COLUMNS if idx < n_columns},
+            index=df.index)
+
+        return cls(n_columns, info, info_columns, demographics, items, scores)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def index(self):
+        return self.scores.index
+
+    @property
+    def missing(self):
+        """题目缺失掩码（布尔矩阵，列顺序同 items）"""
+        if self.items.dtype == np.int8:
+            return self.items == MISSING_CODE
+        return np.isnan(self.items)
+
+    def item_frame(self, names=None):
+        """
+        若干量表的题目编码（pandas 可空 Int8，列名为 量表名_题号）
+        """
+        names = self.scales.names if names is None else names
+        columns = {}
+        for name in names:
+            positions = self.scales.scale_positions[name]
+            block = self.items[:, positions]
+            missing = self.missing[:, positions]
+            if block.dtype != np.int8:
+                block = np.where(missing, 0, block).astype(np.int8)
+            for j, col in enumerate(self.scales.item_names(name)):
+                columns[col] = pd.arrays.IntegerArray(block[:, j].copy(), missing[:, j].copy())
+        return pd.DataFrame(columns, index=self.index)
+
+    def frame(self):
+        """分析用的 DataFrame：基本信息 + 人口学变量 + 量表得分"""
+        return pd.concat([self.info, self.demographics, self.scores], axis=1)
+
+    def processed_frame(self):
+        """与 processed_data.csv 列相同的处理结果：人口学变量 + 预处理量表的得分 (float32)"""
+        return pd.concat([self.demographics, self.scores[processed_score_columns()]], axis=1)
+
+    def memory_usage(self):
+        """
+        各部分占用的内存
+
+        Returns:
+            dict: 部分名 -> 字节数
+        """
+        return {
+            'info': int(self.info.memory_usage(index=False, deep=True).sum()),
+            'demographics': int(self.demographics.memory_usage(index=False).sum()),
+            'items': int(self.items.nbytes),
+            'scores': int(self.scores.memory_usage(index=False).sum()),
+        }
+
+    def save(self, path):
+        """
+        保存为 Parquet：题目编码存为可空 int8 列，分类与 float32 类型原样保留
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        item_columns = [_item_column(i) for i in self.scales.column_indices]
+        missing = self.missing
+        if self.items.dtype == np.int8:
+            items = {col: pd.arrays.IntegerArray(self.items[:, j].copy(), missing[:, j].copy())
+                     for j, col in enumerate(item_columns)}
+        else:
+            items = {col: self.items[:, j] for j, col in enumerate(item_columns)}
+        frame = pd.concat([self.info, self.demographics, self.scores,
+                           pd.DataFrame(items, index=self.index)], axis=1)
+
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps({
+            'version': COMPACT_VERSION,
+            'n_columns': self.n_columns,
+            'info_columns': self.info_columns,
+            'demographics': list(self.demographics.columns),
+            'scores': list(self.scores.columns),
+            'items': item_columns,
+        }, ensure_ascii=False).encode('utf-8')
+        pq.write_table(table.replace_schema_metadata(metadata), path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """读取 save() 保存的 Parquet 文件"""
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        raw = (table.schema.metadata or {}).get(METADATA_KEY)
+        if raw is None:
+            raise ValueError(f"不是紧凑格式的问卷数据文件: {path}")
+        spec = json.loads(raw)
+        if spec['version'] != COMPACT_VERSION:
+            raise ValueError(f"不支持的紧凑格式版本: {spec['version']}")
+
+        frame = table.to_pandas()
+        items = frame[spec['items']]
+        if all(dtype == 'Int8' for dtype in items.dtypes):
+            items = items.to_numpy(dtype=np.int8, na_value=MISSING_CODE)
+        else:
+            items = items.to_numpy(dtype=np.float32, na_value=np.nan)
+
+        info_columns = spec['info_columns']
+        return cls(spec['n_columns'], frame[list(info_columns.values())], info_columns,
+                   frame[spec['demographics']], items, frame[spec['scores']])
+
+
+def processed_score_columns():
+    """processed_data.csv 中的得分列"""
+    return [SCALE_REGISTRY[name]['score_name'] for name in PROCESSED_SCALES]
+
+
+def _compact_spec(path):
+    """紧凑格式文件的元数据；不是紧凑格式时返回 None"""
+    if not str(path).endswith('.parquet') or not os.path.exists(path):
+        return None
+    import pyarrow.parquet as pq
+
+    raw = (pq.read_schema(path).metadata or {}).get(METADATA_KEY)
+    return None if raw is None else json.loads(raw)
+
+
+def is_compact_file(path):
+    """是否为 CompactSurvey.save() 保存的 Parquet 文件"""
+    return _compact_spec(path) is not None
+
+
+def load_processed(path):
+    """
+    读取预处理结果
+
+    Args:
+        path: processed_data.csv、流式预处理的 Parquet 文件，或紧凑格式的 processed_compact.parquet
+
+    Returns:
+        DataFrame: 人口学变量与量表得分（列同 processed_data.csv）。紧凑格式只读取这些列，
+        不读取基本信息与题目编码，数值为 float32 精度
+    """
+    spec = _compact_spec(path)
+    if spec is None:
+        return pd.read_parquet(path) if str(path).endswith('.parquet') else pd.read_csv(path)
+    if spec['version'] != COMPACT_VERSION:
+        raise ValueError(f"不支持的紧凑格式版本: {spec['version']}")
+    columns = spec['demographics'] + processed_score_columns()
+    return pd.read_parquet(path, columns=columns).reset_index(drop=True)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+correlation_accumulator.py
+- 皮尔逊相关矩阵的增量计算
+- 保存成对完整样本（pairwise-complete）的充分统计量：样本数、均值、离差平方和、协离差
+- 新数据只需按批更新，不同分片的累加器可以合并，结果与 DataFrame.corr(method='pearson') 一致
+- 数据文件只在末尾追加行时，刷新只读取新增部分
+"""
+
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+class PairwiseCorrelationAccumulator:
+    """成对缺失处理的相关矩阵累加器"""
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns: 变量名列表
+        """
+        self.columns = list(columns)
+        k = len(self.columns)
+        # 以下矩阵的 [i, j] 元素均只统计变量 i、j 同时非缺失的行
+        self.n = np.zeros((k, k), dtype=np.float64)      # 样本数
+        self.mean = np.zeros((k, k), dtype=np.float64)   # 变量 i 的均值
+        self.m2 = np.zeros((k, k), dtype=np.float64)     # 变量 i 的离差平方和
+        self.comoment = np.zeros((k, k), dtype=np.float64)  # i、j 的协离差
+        self.n_rows = 0
+
+    @staticmethod
+    def _batch_statistics(values):
+        """
+        计算一批数据的成对充分统计量
+        先按列均值平移以减小数值误差，平移不影响离差平方和与协离差
+        """
+        present = ~np.isnan(values)
+        weights = present.astype(np.float64)
+        with np.errstate(invalid='ignore'):
+            counts = weights.sum(axis=0)
+            shift = np.where(counts > 0,
+                             np.where(present, values, 0.0).sum(axis=0) / np.maximum(counts, 1),
+                             0.0)
+        centered = np.where(present, values - shift, 0.0)
+
+        n = weights.T @ weights
+        sums = centered.T @ weights
+        squares = (centered * centered).T @ weights
+        cross = centered.T @ centered
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, sums / n, 0.0)
+        m2 = squares - n * mean * mean
+        comoment = cross - n * mean * mean.T
+        return n, mean + shift[:, np.newaxis], m2, comoment
+
+    def _combine(self, n_b, mean_b, m2_b, comoment_b):
+        """按 Chan 等人的并行公式合并两组充分统计量"""
+        n_a = self.n
+        n = n_a + n_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(n > 0, n_a * n_b / n, 0.0)
+            ratio_b = np.where(n > 0, n_b / n, 0.0)
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * ratio_b
+        self.m2 = self.m2 + m2_b + delta * delta * weight
+        self.comoment = self.comoment + comoment_b + delta * delta.T * weight
+        self.n = n
+
+    def update(self, df):
+        """
+        用一批新数据更新累加器
+
+        Args:
+            df: 包含 self.columns 的 DataFrame
+        """
+        values = df[self.columns].to_numpy(dtype=np.float64)
+        if len(values) == 0:
+            return self
+        self._combine(*self._batch_statistics(values))
+        self.n_rows += len(values)
+        return self
+
+    def merge(self, other):
+        """
+        合并另一个累加器（例如其他进程处理的数据分片）
+        """
+        if other.columns != self.columns:
+            raise ValueError("累加器的变量列表不一致，无法合并")
+        self._combine(other.n, other.mean, other.m2, other.comoment)
+        self.n_rows += other.n_rows
+        return self
+
+    @classmethod
+    def from_values(cls, values, columns):
+        """由二维数组直接构建累加器"""
+        acc = cls(columns)
+        if len(values) > 0:
+            acc._combine(*cls._batch_statistics(np.asarray(values, dtype=np.float64)))
+            acc.n_rows = len(values)
+        return acc
+
+    def correlation(self):
+        """
+        返回成对完整样本的皮尔逊相关矩阵 (DataFrame)
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            denom = np.sqrt(self.m2 * self.m2.T)
+            corr = np.where((self.n > 0) & (denom > 0), self.comoment / denom, np.nan)
+        corr = (corr + corr.T) / 2
+        diag = np.diag_indices_from(corr)
+        corr[diag] = np.where(np.isnan(corr[diag]), np.nan, 1.0)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def save(self, path):
+        """保存累加器状态 (.npz)"""
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, n=self.n, mean=self.mean, m2=self.m2,
+                 comoment=self.comoment, n_rows=self.n_rows,
+                 columns=json.dumps(self.columns, ensure_ascii=False))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """从 .npz 文件恢复累加器"""
+        with np.load(path) as data:
+            acc = cls(json.loads(str(data['columns'])))
+            acc.n = data['n']
+            acc.mean = data['mean']
+            acc.m2 = data['m2']
+            acc.comoment = data['comoment']
+            acc.n_rows = int(data['n_rows'])
+        return acc
+
+
+# 增量状态目录（位于数据文件所在目录下）
+STATE_DIR_NAME = '.incremental'
+
+
+def default_state_path(data_path):
+    """数据文件对应的累加器状态路径"""
+    stem = os.path.splitext(os.path.basename(data_path))[0]
+    return os.path.join(os.path.dirname(data_path), STATE_DIR_NAME, f'{stem}_correlation.npz')
+
+
+def file_signature(path):
+    """文件大小与修改时间，用于判断累加器状态是否对应当前数据文件"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# 校验追加写入时比对的文件末尾字节数
+TAIL_CHECK_BYTES = 1 << 16
+
+
+def _tail_digest(path, size):
+    """文件前 size 字节中最后一段的摘要，用于确认旧内容未被改写"""
+    start = max(0, size - TAIL_CHECK_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(size - start)).hexdigest()
+
+
+def save_accumulator_state(acc, state_path, data_path):
+    """
+    保存累加器，并记录其对应的数据文件签名
+    """
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    acc.save(state_path)
+    signature = file_signature(data_path)
+    with open(state_path + '.json', 'w', encoding='utf-8') as f:
+        json.dump({'data_path': os.path.abspath(data_path),
+                   'n_rows': acc.n_rows,
+                   'signature': signature,
+                   'tail_digest': _tail_digest(data_path, signature['size'])}, f, indent=2)
+
+
+def _load_state(state_path, data_path):
+    meta_path = state_path + '.json'
+    if not (os.path.exists(state_path) and os.path.exists(meta_path)
+            and os.path.exists(data_path)):
+        return None, None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('data_path') != os.path.abspath(data_path):
+        return None, None
+    return PairwiseCorrelationAccumulator.load(state_path), meta
+
+
+def load_current_accumulator(state_path, data_path):
+    """
+    读取累加器状态；若数据文件在状态保存后被修改过则返回 None
+    """
+    acc, meta = _load_state(state_path, data_path)
+    if acc is None or meta.get('signature') != file_signature(data_path):
+        return None
+    return acc
+
+
+def _accumulate_values(values, columns):
+    """进程池任务：计算一个数据分片的累加器"""
+    return PairwiseCorrelationAccumulator.from_values(values, columns)
+
+
+def accumulate_frames(frames, columns, n_workers=1):
+    """
+    并行计算多个数据分片的累加器并合并
+
+    Args:
+        frames: DataFrame 的可迭代对象（例如 read_csv 的分块读取器）
+        columns: 变量名列表
+        n_workers: 进程数，1 表示在当前进程中计算
+    """
+    columns = list(columns)
+    total = PairwiseCorrelationAccumulator(columns)
+    if n_workers <= 1:
+        for frame in frames:
+            total.update(frame)
+        return total
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = []
+        for frame in frames:
+            pending.append(executor.submit(
+                _accumulate_values, frame[columns].to_numpy(dtype=np.float64), columns))
+            # 限制同时在途的分片数量，避免一次性读入全部数据
+            if len(pending) >= 2 * n_workers:
+                total.merge(pending.pop(0).result())
+        for future in pending:
+            total.merge(future.result())
+    return total
+
+
+def refresh_accumulator(data_path, state_path=None, chunksize=100000, n_workers=1):
+    """
+    返回与数据文件当前内容对应的累加器，并保存状态
+
+    - 文件未变化：直接读取状态
+    - CSV 文件只在末尾追加了行：只读取新增部分并更新，代价与新增行数成正比
+    - 其他情况：分块（可多进程）全量重算
+    """
+    state_path = state_path or default_state_path(data_path)
+    acc, meta = _load_state(state_path, data_path)
+    signature = file_signature(data_path)
+
+    if acc is not None and meta.get('signature') == signature:
+        return acc
+
+    old_size = meta['signature']['size'] if acc is not None else None
+    if (acc is not None and data_path.endswith('.csv')
+            and signature['size'] > old_size
+            and meta.get('tail_digest') == _tail_digest(data_path, old_size)):
+        with open(data_path, 'rb') as f:
+            f.seek(old_size)
+            appended = f.read()
+        new_rows = pd.read_csv(io.BytesIO(appended), header=None, names=acc.columns)
+        print(f"  - 读取新增数据: {len(new_rows)} 行")
+        acc.update(new_rows)
+    elif data_path.endswith('.parquet'):
+        df = pd.read_parquet(data_path)
+        acc = accumulate_frames([df], df.columns, n_workers=1)
+    else:
+        columns = pd.read_csv(data_path, nrows=0).columns
+        chunks = pd.read_csv(data_path, chunksize=chunksize)
+        acc = accumulate_frames(chunks, columns, n_workers=n_workers)
+
+    save_accumulator_state(acc, state_path, data_path)
+    return acc
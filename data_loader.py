@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+data_loader.py
+- 所有入口共用的调查数据加载器
+- 首次读取 Excel/CSV 时转换为列式缓存 (Parquet，不可用时回退为 pickle)
+- 缓存以源文件的 SHA-256 与修改时间为键，源文件变化后自动失效
+"""
+
+import hashlib
+import json
+import os
+
+# 缓存目录（相对于运行目录）
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'survey')
+
+# 缓存格式版本，修改缓存结构时递增以使旧缓存失效
+CACHE_VERSION = 1
+
+# 需要缓存的源文件类型（Parquet 本身已是列式格式，直接读取）
+CACHED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# 与 pandas 默认值相同的读取参数：不参与缓存键，显式传入默认值时仍与无参数调用共用同一份缓存
+DEFAULT_READ_KWARGS = {'header': 0}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    计算文件内容的 SHA-256 摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_source(path, **read_kwargs):
+    """
+    按扩展名读取源文件
+    """
+    # pandas 导入较慢，只在真正读取数据时导入（列概览等快速命令只读元数据）
+    import pandas as pd
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        return pd.read_excel(path, **read_kwargs)
+    if ext == '.csv':
+        return pd.read_csv(path, **read_kwargs)
+    if ext == '.parquet':
+        return pd.read_parquet(path, **read_kwargs)
+    raise ValueError(f"不支持的数据文件格式: {path}")
+
+
+def _cache_base(path, cache_dir, read_options):
+    """
+    缓存文件的基础路径：文件名 + 绝对路径与读取参数的摘要，避免互相覆盖
+    """
+    abs_path = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    key = hashlib.sha1(f'{abs_path}|{read_options}'.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(cache_dir, f'{stem}_{key}')
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def _write_cache(df, base):
+    """
+    写入列式缓存，返回 (文件路径, 格式)
+    优先使用 Parquet；混合类型的对象列或缺少 pyarrow 时回退为 pickle
+    """
+    parquet_path = base + '.parquet'
+    tmp_path = parquet_path + '.tmp'
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+        return parquet_path, 'parquet'
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    pickle_path = base + '.pkl'
+    tmp_path = pickle_path + '.tmp'
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, pickle_path)
+    return pickle_path, 'pickle'
+
+
+def _read_cache(data_path, fmt):
+    import pandas as pd
+
+    if fmt == 'parquet':
+        return pd.read_parquet(data_path)
+    return pd.read_pickle(data_path)
+
+
+def load_survey_data(path='assets/data.xlsx', use_cache=True,
+                     cache_dir=DEFAULT_CACHE_DIR, **read_kwargs):
+    """
+    加载调查数据，Excel/CSV 源文件通过列式缓存读取
+
+    Args:
+        path: 数据文件路径 (.xlsx/.xls/.csv/.parquet)
+        use_cache: 是否使用缓存
+        cache_dir: 缓存目录
+        read_kwargs: 传递给 pandas 读取函数的参数（参与缓存键）
+
+    Returns:
+        DataFrame
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if not use_cache or ext not in CACHED_EXTENSIONS:
+        return _read_source(path, **read_kwargs)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    read_options = json.dumps({key: value for key, value in read_kwargs.items()
+                               if DEFAULT_READ_KWARGS.get(key, object()) != value},
+                              sort_keys=True, default=str)
+    base = _cache_base(path, cache_dir, read_options)
+    meta_path = base + '.json'
+
+    stat = os.stat(path)
+    meta = _read_meta(meta_path)
+
+    if (meta is not None
+            and meta.get('version') == CACHE_VERSION
+            and meta.get('read_options') == read_options
+            and os.path.exists(meta.get('data_path', ''))):
+        # 大小与修改时间均未变化：直接使用缓存，无需重新计算摘要
+        if meta.get('size') == stat.st_size and meta.get('mtime_ns') == stat.st_mtime_ns:
+            return _read_cache(meta['data_path'], meta['format'])
+
+        # 修改时间变化但内容相同（例如重新复制了同一文件）：刷新元数据
+        if meta.get('size') == stat.st_size and meta.get('sha256') == file_sha256(path):
+            meta['mtime_ns'] = stat.st_mtime_ns
+            _write_meta(meta_path, meta)
+            return _read_cache(meta['data_path'], meta['format'])
+
+    print(f"  - 构建列式缓存: {path}")
+    df = _read_source(path, **read_kwargs)
+    data_path, fmt = _write_cache(df, base)
+
+    # 清理旧格式的缓存文件
+    if meta is not None and meta.get('data_path') not in (None, data_path):
+        if os.path.exists(meta['data_path']):
+            os.remove(meta['data_path'])
+
+    _write_meta(meta_path, {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(path),
+        'read_options': read_options,
+        'data_path': data_path,
+        'format': fmt,
+    })
+    return df
+
+
+def survey_header(path='assets/data.xlsx', cache_dir=DEFAULT_CACHE_DIR):
+    """
+    只读取列名与行数，供列概览等快速命令使用
+
+    源文件未变化且已有 Parquet 缓存（或源文件本身为 Parquet）时只读取 Parquet 元数据，
+    不导入 pandas；否则完整加载一次（同时建立缓存）
+
+    Returns:
+        (列名列表, 行数)
+    """
+    parquet_path = path if os.path.splitext(path)[1].lower() == '.parquet' else None
+    if os.path.splitext(path)[1].lower() in CACHED_EXTENSIONS:
+        read_options = json.dumps({}, sort_keys=True, default=str)
+        meta = _read_meta(_cache_base(path, cache_dir, read_options) + '.json')
+        stat = os.stat(path)
+        if (meta is not None
+                and meta.get('version') == CACHE_VERSION
+                and meta.get('format') == 'parquet'
+                and meta.get('size') == stat.st_size
+                and meta.get('mtime_ns') == stat.st_mtime_ns
+                and os.path.exists(meta.get('data_path', ''))):
+            parquet_path = meta['data_path']
+
+    if parquet_path is not None:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pq = None
+        if pq is not None:
+            parquet = pq.ParquetFile(parquet_path)
+            columns = [name for name in parquet.schema_arrow.names
+                       if not name.startswith('__index_level_')]
+            return columns, parquet.metadata.num_rows
+
+    df = load_survey_data(path, cache_dir=cache_dir)
+    return list(df.columns), len(df)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+demographics.py
+- 人口学变量的清洗：年龄范围、时长等文本转换为数值
+- 基本信息与人口学列的位置定义
+- 预处理脚本、关系分析器与分组分析共用
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# 基本信息字段 -> 原始数据中的列索引 (pandas iloc，从0开始)
+BASIC_INFO_COLUMNS = {
+    'gender': 9,  # 性别
+    'age': 10,    # 年龄
+    'stepparent_count': 11,  # 继父母数量
+    'stepparent_gender': 12, # 继父母性别
+    'cohabitation_duration': 13, # 同住时长
+    'start_age': 15,  # 开始同住年龄
+    'education': 23   # 教育水平
+}
+
+# 处理后数据中的人口学列：(原始列索引, 新列名)
+# 年龄 -> 第11列 (索引10)
+# 同住时长 -> 第14列 (索引13)
+# 开始同住年龄 -> 第16列 (索引15)
+DEMOGRAPHIC_COLUMNS = [(10, 'demo_age'), (13, 'demo_cohab_duration'), (15, 'demo_start_age_cohab')]
+
+
+# 按优先级排列的解析规则（与逐个单元格 re.search 的顺序一致）
+# "X-Y年" -> 区间中点；"大于X年" -> X + 5（假设一个开放区间的增量）；
+# "小于X年" -> X / 2；其他包含数字的文本 -> 第一个数字
+_RANGE_PATTERN = re.compile(r'(\d+)-(\d+)')
+_GREATER_PATTERN = re.compile(r'大于(\d+)')
+_LESS_PATTERN = re.compile(r'小于(\d+)')
+_NUMBER_PATTERN = re.compile(r'(\d+)')
+
+# 已解析过的文本 -> 数值；这些列的不同取值很少，分块处理时跨块复用
+_PARSED_TEXT = {}
+_PARSED_TEXT_LIMIT = 100000
+
+
+def _parse_text_values(texts):
+    """
+    将一组不重复的文本一次性解析为数值（向量化的 str.extract）
+    """
+    s = pd.Series(texts, dtype=object)
+    result = np.full(len(s), np.nan)
+    pending = np.ones(len(s), dtype=bool)
+
+    bounds = s.str.extract(_RANGE_PATTERN).astype(np.float64).to_numpy()
+    matched = ~np.isnan(bounds[:, 0])
+    result[matched] = (bounds[matched, 0] + bounds[matched, 1]) / 2
+    pending &= ~matched
+
+    for pattern, convert in [(_GREATER_PATTERN, lambda x: x + 5),
+                             (_LESS_PATTERN, lambda x: x / 2),
+                             (_NUMBER_PATTERN, lambda x: x)]:
+        number = s.str.extract(pattern)[0].astype(np.float64).to_numpy()
+        matched = pending & ~np.isnan(number)
+        result[matched] = convert(number[matched])
+        pending &= ~matched
+
+    return result
+
+
+def clean_demographic_column(series):
+    """
+    清洗包含年龄范围或文本的列，将其转换为数值。
+    例如 '1-3年' -> 2, '小于1年' -> 0.5, '18' -> 18
+
+    只对不重复的取值解析一次再按编码映射回各行，耗时与不同取值的数量有关而与行数无关
+    """
+    # 数值类型的列直接转换
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.astype(np.float64)
+
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = np.asarray(uniques, dtype=object)
+    values = np.full(len(uniques), np.nan)
+
+    # 已经是数字的取值直接转换
+    is_number = np.array([isinstance(val, (int, float)) for val in uniques], dtype=bool)
+    values[is_number] = uniques[is_number].astype(np.float64)
+
+    texts = [str(val) for val in uniques[~is_number]]
+    unknown = list({text for text in texts if text not in _PARSED_TEXT})
+    if unknown:
+        if len(_PARSED_TEXT) + len(unknown) > _PARSED_TEXT_LIMIT:
+            _PARSED_TEXT.clear()
+        _PARSED_TEXT.update(zip(unknown, _parse_text_values(unknown)))
+    values[~is_number] = [_PARSED_TEXT[text] for text in texts]
+
+    # 缺失值的编码为 -1，映射到末尾追加的 NaN
+    values = np.append(values, np.nan)
+    return pd.Series(values[codes], index=series.index, name=series.name)
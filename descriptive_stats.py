@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+descriptive_stats.py
+- 描述性统计的单次扫描计算：所有数值列的样本数、均值、离差平方和、最小/最大值与分位数
+  在一次向量化计算中完成，同时统计全部列的缺失值数量与指定列的取值频数
+- 汇总结果 (DescriptiveSummary) 可以按数据块、分片合并（均值与方差按 Chan 等人的并行公式）
+- 分位数默认保存全部数值精确计算；指定 quantile_error 时改用 KLL 草图 (quantile_sketch)，
+  内存与样本数无关，适合流式、分片处理大规模数据
+- 文本报告由汇总结果渲染，格式与 Series.describe() / value_counts() 一致
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import KLLSketch, k_for_error
+
+# describe() 默认输出的分位数
+DEFAULT_PERCENTILES = (0.25, 0.5, 0.75)
+
+
+def _is_numeric(dtype):
+    """与 describe() 的判断一致：数值类型（不含布尔）按数值列统计，其余按取值频数统计"""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+class DescriptiveSummary:
+    """可合并的描述性统计汇总"""
+
+    def __init__(self, columns, numeric, categorical=(), quantile_error=None, seed=0):
+        """
+        Args:
+            columns: 数据的全部列名（统计缺失值）
+            numeric: 计算矩与分位数的数值列
+            categorical: 统计取值频数的列
+            quantile_error: 分位数的目标秩误差（如 0.01）；None 表示精确计算
+            seed: 分位数草图的随机种子
+        """
+        self.columns = list(columns)
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        k = len(self.numeric)
+        self.n_rows = 0
+        self.missing = np.zeros(len(self.columns), dtype=np.int64)  # 各列缺失值数量
+        self.count = np.zeros(k, dtype=np.int64)                    # 各数值列非缺失样本数
+        self.mean = np.zeros(k, dtype=np.float64)
+        self.m2 = np.zeros(k, dtype=np.float64)                     # 离差平方和
+        self.min = np.full(k, np.nan)
+        self.max = np.full(k, np.nan)
+        # 分位数：精确计算时保存各列排序后的非缺失值（合并时归并），结果与 quantile() 完全一致；
+        # 否则每列一个 KLL 草图
+        self.quantile_error = quantile_error
+        if quantile_error is None:
+            self.values = [np.empty(0) for _ in range(k)]
+        else:
+            self.values = [KLLSketch(k_for_error(quantile_error), seed=child)
+                           for child in np.random.SeedSequence(seed).spawn(k)]
+        # 取值频数：列名 -> {取值: 频数}（按首次出现顺序）
+        self.frequencies = {col: {} for col in self.categorical}
+
+    @staticmethod
+    def _batch_statistics(values):
+        """
+        计算一批数值的统计量
+
+        Args:
+            values: (列数, 行数) 的连续数组，每列数据在内存中连续，求和与 Series 一样按成对求和
+        """
+        present = ~np.isnan(values)
+        count = present.sum(axis=1)
+        filled = np.where(present, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = filled.sum(axis=1) / count
+            deviation = np.where(present, values - mean[:, np.newaxis], 0.0)
+        m2 = (deviation * deviation).sum(axis=1)
+        lo = np.min(values, axis=1, where=present, initial=np.inf)
+        hi = np.max(values, axis=1, where=present, initial=-np.inf)
+        empty = count == 0
+        mean[empty] = 0.0
+        m2[empty] = 0.0
+        lo[empty] = np.nan
+        hi[empty] = np.nan
+        return count, mean, m2, lo, hi
+
+    def _combine(self, count_b, mean_b, m2_b, lo_b, hi_b):
+        """按 Chan 等人的并行公式合并两组统计量（其中一组为空时结果与单组完全相同）"""
+        count_a = self.count
+        count = count_a + count_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(count > 0, count_a * count_b / count, 0.0)
+            ratio_b = np.where(count > 0, count_b / count, 0.0)
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * ratio_b
+        self.m2 = self.m2 + m2_b + delta * delta * weight
+        self.count = count
+        self.min = np.fmin(self.min, lo_b)
+        self.max = np.fmax(self.max, hi_b)
+
+    def _add_values(self, values):
+        """加入各数值列的非缺失值（精确计算时为已排序数组）或草图"""
+        if self.quantile_error is not None:
+            for sketch, other in zip(self.values, values):
+                if isinstance(other, KLLSketch):
+                    sketch.merge(other)
+                else:
+                    sketch.update(other)
+            return
+        self.values = [b if len(a) == 0 else a if len(b) == 0
+                       else np.sort(np.concatenate([a, b]), kind='stable')
+                       for a, b in zip(self.values, values)]
+
+    def _add_frequencies(self, frequencies):
+        for col, counts in frequencies.items():
+            target = self.frequencies[col]
+            for value, n in counts.items():
+                target[value] = target.get(value, 0) + n
+
+    def update(self, df):
+        """
+        用一批新数据更新汇总
+
+        Args:
+            df: 包含 self.columns 的 DataFrame
+        """
+        if len(df) == 0:
+            return self
+        self.missing += df[self.columns].isna().to_numpy().sum(axis=0)
+        if self.numeric:
+            values = np.ascontiguousarray(
+                df[self.numeric].to_numpy(dtype=np.float64, na_value=np.nan).T)
+            self._combine(*self._batch_statistics(values))
+            present = ~np.isnan(values)
+            observed = [row[mask] for row, mask in zip(values, present)]
+            self._add_values(observed if self.quantile_error is not None
+                             else [np.sort(v) for v in observed])
+        self._add_frequencies({
+            col: df[col].value_counts(sort=False, dropna=True).to_dict()
+            for col in self.categorical})
+        self.n_rows += len(df)
+        return self
+
+    def merge(self, other):
+        """
+        合并另一个汇总（例如其他数据块或其他进程处理的分片）
+        """
+        if (other.columns, other.numeric, other.categorical, other.quantile_error) != (
+                self.columns, self.numeric, self.categorical, self.quantile_error):
+            raise ValueError("汇总的列结构或分位数精度不一致，无法合并")
+        self.missing += other.missing
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self._add_values(other.values)
+        self._add_frequencies(other.frequencies)
+        self.n_rows += other.n_rows
+        return self
+
+    @property
+    def total_missing(self):
+        """全部列的缺失值总数"""
+        return int(self.missing.sum())
+
+    def std(self):
+        """各数值列的样本标准差（ddof=1）"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+    def quantiles(self, column, percentiles=DEFAULT_PERCENTILES):
+        """某数值列的分位数（线性插值，同 Series.quantile；使用草图时为近似值）"""
+        values = self.values[self.numeric.index(column)]
+        if self.quantile_error is not None:
+            return np.atleast_1d(values.quantile(percentiles))
+        if len(values) == 0:
+            return np.full(len(percentiles), np.nan)
+        return np.quantile(values, percentiles)
+
+    def value_counts(self, column):
+        """某列的取值频数，格式同 Series.value_counts()"""
+        counts = pd.Series(self.frequencies[column], dtype=np.int64, name='count')
+        counts.index.name = column
+        return counts.sort_values(ascending=False)
+
+    def describe(self, column, percentiles=DEFAULT_PERCENTILES):
+        """某列的描述统计，格式同 Series.describe()"""
+        if column in self.numeric:
+            i = self.numeric.index(column)
+            count = self.count[i]
+            stats = [count,
+                     self.mean[i] if count else np.nan,
+                     self.std()[i],
+                     self.min[i],
+                     *self.quantiles(column, percentiles),
+                     self.max[i]]
+            index = ['count', 'mean', 'std', 'min',
+                     *[f'{p * 100:g}%' for p in percentiles], 'max']
+            return pd.Series(stats, index=index, name=column, dtype=np.float64)
+
+        counts = self.value_counts(column)
+        observed = counts[counts != 0]
+        stats = [int(counts.sum()), len(observed)]
+        if len(observed):
+            stats += [counts.index[0], counts.iloc[0]]
+        else:
+            stats += [np.nan, np.nan]
+        return pd.Series(stats, index=['count', 'unique', 'top', 'freq'],
+                         name=column, dtype=object)
+
+    def describe_frame(self, columns=None, percentiles=DEFAULT_PERCENTILES):
+        """多个数值列的描述统计表，格式同 DataFrame.describe()"""
+        columns = self.numeric if columns is None else list(columns)
+        return pd.DataFrame({col: self.describe(col, percentiles) for col in columns})
+
+
+def summary_layout(df, columns=None, value_counts=()):
+    """
+    按数据类型划分汇总的列结构
+
+    Args:
+        df: DataFrame
+        columns: 需要描述统计的列（默认全部数值列）；非数值列统计取值频数
+        value_counts: 另外需要取值频数的列
+
+    Returns:
+        tuple: (全部列, 数值列, 频数列)
+    """
+    if columns is None:
+        columns = [col for col in df.columns if _is_numeric(df[col].dtype)]
+    numeric = [col for col in columns if _is_numeric(df[col].dtype)]
+    categorical = [col for col in columns if col not in numeric]
+    categorical += [col for col in value_counts if col not in categorical]
+    return list(df.columns), numeric, categorical
+
+
+def summarize(df, columns=None, value_counts=(), quantile_error=None, seed=0):
+    """
+    一次扫描计算 DataFrame 的描述性统计汇总
+
+    Args:
+        df: DataFrame
+        columns: 需要描述统计的列（默认全部数值列）
+        value_counts: 另外需要取值频数的列
+        quantile_error: 分位数的目标秩误差；None 表示精确计算
+        seed: 分位数草图的随机种子
+
+    Returns:
+        DescriptiveSummary
+    """
+    layout = summary_layout(df, columns, value_counts)
+    return DescriptiveSummary(*layout, quantile_error=quantile_error, seed=seed).update(df)
+
+
+def _summarize_frame(frame, layout, quantile_error, seed):
+    """进程池任务：计算一个数据分片的汇总"""
+    return DescriptiveSummary(*layout, quantile_error=quantile_error, seed=seed).update(frame)
+
+
+def summarize_frames(frames, columns=None, value_counts=(), quantile_error=None, seed=0,
+                     n_workers=1):
+    """
+    分块（可多进程）计算汇总并合并；列结构由第一个数据块确定
+
+    指定 quantile_error 时各列只保留有界大小的分位数草图，内存只取决于数据块大小与列数，
+    与总行数无关
+
+    Args:
+        frames: DataFrame 的可迭代对象（例如 read_csv 的分块读取器）
+        columns: 需要描述统计的列（默认全部数值列）
+        value_counts: 另外需要取值频数的列
+        quantile_error: 分位数的目标秩误差；None 表示精确计算
+        seed: 分位数草图的随机种子（各分片由其派生，结果与进程数无关）
+        n_workers: 进程数，1 表示在当前进程中计算
+    """
+    frames = iter(frames)
+    first = next(frames)
+    layout = summary_layout(first, columns, value_counts)
+    seeds = np.random.SeedSequence(seed)
+    total = DescriptiveSummary(*layout, quantile_error=quantile_error, seed=seed).update(first)
+
+    def shard_seed():
+        return int(seeds.spawn(1)[0].generate_state(1)[0])
+
+    if n_workers <= 1:
+        for frame in frames:
+            total.merge(_summarize_frame(frame, layout, quantile_error, shard_seed()))
+        return total
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = []
+        for frame in frames:
+            pending.append(executor.submit(
+                _summarize_frame, frame, layout, quantile_error, shard_seed()))
+            # 限制同时在途的分片数量，避免一次性读入全部数据
+            if len(pending) >= 2 * n_workers:
+                total.merge(pending.pop(0).result())
+        for future in pending:
+            total.merge(future.result())
+    return total
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+figure_rendering.py
+- 图表渲染阶段：每张图由 (类型, 输出路径, 数据, 参数) 描述
+- 以图表数据与参数的摘要为键记录在清单文件中，输入未变化的图表直接跳过
+- 内容相同但文件名不同的图表（如带时间戳的输出）直接复制已有结果
+- 需要重新绘制的图表在进程池中使用 Agg 画布并行渲染
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from profiling import profile_stage
+
+# 清单文件名（保存在图表所在目录中）
+MANIFEST_NAME = '.figure_manifest.json'
+
+# 中文字体设置
+CHINESE_FONT_RC = {
+    'font.sans-serif': ['SimHei', 'DejaVu Sans'],
+    'axes.unicode_minus': False,
+}
+
+# 同一进程内的多个线程（如流水线中并发的步骤）共用清单文件与 matplotlib 全局设置
+_MANIFEST_LOCK = threading.Lock()
+_RENDER_LOCK = threading.Lock()
+
+
+def figure_job(kind, path, data, **params):
+    """
+    创建一个图表任务
+
+    Args:
+        kind: 图表类型（FIGURE_RENDERERS 中的键）
+        path: 输出文件路径
+        data: 绘图所需的 DataFrame（只应包含用到的列）
+        **params: 绘图参数（标题、尺寸、dpi 等），须可 JSON 序列化
+    """
+    return {'kind': kind, 'path': path, 'data': data, 'params': params}
+
+
+@lru_cache(maxsize=1)
+def render_code_digest():
+    """
+    渲染代码（本文件）的摘要：修改任何绘图函数或共用设置后，已有图表自动失效
+    """
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def figure_digest(job):
+    """
+    计算图表任务的摘要：渲染代码 + 类型 + 参数 + 数据内容（含列名、类型与索引）
+    """
+    digest = hashlib.sha256()
+    spec = {'code': render_code_digest(), 'kind': job['kind'], 'params': job['params']}
+    digest.update(json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+
+    data = job['data']
+    digest.update(json.dumps([list(map(str, data.columns)), list(map(str, data.index.names)),
+                              list(map(str, data.dtypes))]).encode('utf-8'))
+    # hash_pandas_object 逐行计算且不包含列名，列名已在上面单独计入
+    digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(data, index=True).to_numpy()))
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# 绘图函数：在独立的 Figure 上绘制，不依赖 pyplot 的全局状态
+# ---------------------------------------------------------------------------
+
+def _new_figure(figsize, nrows=1, ncols=1):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(nrows, ncols)
+
+
+def render_heatmap(data, params):
+    """相关性热力图"""
+    import seaborn as sns
+
+    fig, ax = _new_figure(params.get('figsize', (12, 10)))
+    # 以0为中心的 coolwarm 色图，格子内显示数值
+    sns.heatmap(data, annot=True, cmap='coolwarm', fmt=".2f", linewidths=.5, ax=ax)
+    ax.set_title(params.get('title', ''), fontsize=16, pad=20)
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+    for label in ax.get_yticklabels():
+        label.set_rotation(0)
+    return fig
+
+
+def render_regplot(data, params):
+    """带线性回归拟合线的散点图"""
+    import seaborn as sns
+
+    x_col, y_col = params['x'], params['y']
+    fig, ax = _new_figure(params.get('figsize', (8, 6)))
+    sns.regplot(x=x_col, y=y_col, data=data,
+                scatter_kws={'alpha': 0.5},
+                line_kws={"color": "red"}, ax=ax)
+    ax.set_title(params.get('title', ''), fontsize=14)
+    ax.set_xlabel(x_col)
+    ax.set_ylabel(y_col)
+    return fig
+
+
+def render_relationship_panel(data, params):
+    """继家庭关系质量 2x2 综合图"""
+    fig, axes = _new_figure((15, 12), nrows=2, ncols=2)
+    fig.suptitle(params.get('title', '继家庭关系质量分析'), fontsize=16, fontweight='bold')
+
+    def has(*cols):
+        return all(col in data.columns for col in cols)
+
+    # 1. 关系质量得分对比（箱线图）
+    score_labels = [('stepparent_past_score', '继父母-过去'),
+                    ('stepparent_current_score', '继父母-现在'),
+                    ('bioparent_past_score', '生身父母-过去'),
+                    ('bioparent_current_score', '生身父母-现在')]
+    if has(*[col for col, _ in score_labels]):
+        axes[0, 0].boxplot([data[col].dropna() for col, _ in score_labels],
+                           labels=[label for _, label in score_labels])
+        axes[0, 0].set_title('关系质量得分对比')
+        axes[0, 0].set_ylabel('关系质量得分')
+        axes[0, 0].tick_params(axis='x', rotation=45)
+
+    # 2. 关系质量变化对比
+    if has('stepparent_change', 'bioparent_change'):
+        axes[0, 1].boxplot([data['stepparent_change'].dropna(), data['bioparent_change'].dropna()],
+                           labels=['继父母关系变化', '生身父母关系变化'])
+        axes[0, 1].set_title('关系质量变化对比')
+        axes[0, 1].set_ylabel('变化得分')
+        axes[0, 1].axhline(y=0, color='red', linestyle='--', alpha=0.7)
+
+    # 3. 散点图：过去vs现在关系质量
+    if has('stepparent_past_score', 'stepparent_current_score'):
+        axes[1, 0].scatter(data['stepparent_past_score'], data['stepparent_current_score'],
+                           alpha=0.6, label='继父母关系')
+    if has('bioparent_past_score', 'bioparent_current_score'):
+        axes[1, 0].scatter(data['bioparent_past_score'], data['bioparent_current_score'],
+                           alpha=0.6, label='生身父母关系')
+    axes[1, 0].plot([1, 5], [1, 5], 'r--', alpha=0.7, label='无变化线')
+    axes[1, 0].set_xlabel('过去关系质量')
+    axes[1, 0].set_ylabel('现在关系质量')
+    axes[1, 0].set_title('关系质量：过去vs现在')
+    axes[1, 0].legend()
+
+    # 4. 关系质量分布直方图
+    if has('stepparent_current_score', 'bioparent_current_score'):
+        axes[1, 1].hist(data['stepparent_current_score'].dropna(), alpha=0.7,
+                        label='继父母关系', bins=20)
+        axes[1, 1].hist(data['bioparent_current_score'].dropna(), alpha=0.7,
+                        label='生身父母关系', bins=20)
+        axes[1, 1].set_xlabel('关系质量得分')
+        axes[1, 1].set_ylabel('频数')
+        axes[1, 1].set_title('当前关系质量分布')
+        axes[1, 1].legend()
+
+    fig.tight_layout()
+    return fig
+
+
+# 图表类型 -> 绘图函数
+FIGURE_RENDERERS = {
+    'heatmap': render_heatmap,
+    'regplot': render_regplot,
+    'relationship_panel': render_relationship_panel,
+}
+
+
+def _render(kind, path, data, params):
+    """
+    渲染一张图表并原子地写入输出路径（可在工作进程中执行）
+    """
+    from matplotlib import rc_context, style
+
+    with style.context('default'), rc_context(params.get('rc')):
+        fig = FIGURE_RENDERERS[kind](data, params)
+        root, ext = os.path.splitext(path)
+        tmp_path = f'{root}.tmp{ext}'
+        fig.savefig(tmp_path, dpi=params.get('dpi', 300), bbox_inches='tight')
+    os.replace(tmp_path, path)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# 清单
+# ---------------------------------------------------------------------------
+
+def _manifest_path(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), MANIFEST_NAME)
+
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest_path, updates):
+    """将本次的记录合并进清单文件（重新读取，避免覆盖其他调用者的记录）"""
+    with _MANIFEST_LOCK:
+        manifest = _load_manifest(manifest_path)
+        manifest.update(updates)
+        _write_manifest(manifest_path, manifest)
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _is_current(entry, path, digest):
+    """清单记录与磁盘上的文件是否都对应当前摘要"""
+    if entry is None or entry.get('digest') != digest or not os.path.exists(path):
+        return False
+    stamp = _file_stamp(path)
+    return entry.get('size') == stamp['size'] and entry.get('mtime_ns') == stamp['mtime_ns']
+
+
+@profile_stage()
+def render_figures(jobs, n_jobs=None, force=False):
+    """
+    渲染一组图表，跳过输入未变化的图表
+
+    Args:
+        jobs: figure_job() 创建的任务列表
+        n_jobs: 并行进程数，默认为 CPU 核数
+        force: 为 True 时忽略清单，全部重新渲染
+
+    Returns:
+        dict: 输出路径 -> 状态（'rendered' / 'copied' / 'skipped'）
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    manifests = {}
+    updates = {}
+    status = {}
+    pending = []
+
+    for job in jobs:
+        path = job['path']
+        digest = figure_digest(job)
+        manifest_path = _manifest_path(path)
+        manifest = manifests.setdefault(manifest_path, _load_manifest(manifest_path))
+        updates.setdefault(manifest_path, {})
+        name = os.path.basename(path)
+        job = dict(job, digest=digest)
+
+        if not force and _is_current(manifest.get(name), path, digest):
+            status[path] = 'skipped'
+            print(f"  - 未变化，跳过: {path}")
+            continue
+
+        # 同一目录中已有内容相同的图表时直接复制
+        source = None
+        if not force:
+            source = next((other for other, entry in manifest.items()
+                           if other != name and _is_current(
+                               entry, os.path.join(os.path.dirname(path), other), digest)), None)
+        if source is not None:
+            shutil.copyfile(os.path.join(os.path.dirname(path), source), path)
+            updates[manifest_path][name] = dict(digest=digest, **_file_stamp(path))
+            status[path] = 'copied'
+            print(f"  - 内容未变化，已复制: {path}")
+            continue
+
+        pending.append(job)
+
+    if pending:
+        print(f"渲染 {len(pending)} 张图表...")
+        args = [(job['kind'], job['path'], job['data'], job['params']) for job in pending]
+        if n_jobs <= 1 or len(pending) == 1:
+            with _RENDER_LOCK:
+                for arg in args:
+                    _render(*arg)
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(pending))) as executor:
+                for future in [executor.submit(_render, *arg) for arg in args]:
+                    future.result()
+
+        for job in pending:
+            path = job['path']
+            updates[_manifest_path(path)][os.path.basename(path)] = dict(
+                digest=job['digest'], **_file_stamp(path))
+            status[path] = 'rendered'
+            print(f"  - 已保存: {path}")
+
+    for manifest_path, entries in updates.items():
+        if entries:
+            _save_manifest(manifest_path, entries)
+    return status
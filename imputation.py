@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+imputation.py
+- 编码与计分之间的缺失数据处理：最低作答比例规则、个人均值填补、链式方程多重填补 (MICE)
+- 多重填补的各条链在进程池中并行运行，编码矩阵放入共享内存，只向进程传递随机数种子
+- 按 Rubin 规则合并各填补数据集上的配对t检验与相关系数（Fisher z）
+- 多重填补的数据集保存在处理结果旁的 imputations/ 目录，以处理结果文件签名判断是否过期
+"""
+
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from correlation_accumulator import PairwiseCorrelationAccumulator, file_signature
+from likert_encoding import MISSING_CODE, decode_likert_block
+from paired_tests import fdr_bh, paired_statistics
+from scale_registry import SCALE_REGISTRY
+
+# 可选的填补方法
+IMPUTATION_METHODS = ('none', 'person_mean', 'mice')
+
+# 多重填补的默认数据集数与每条链的迭代次数
+DEFAULT_IMPUTATIONS = 5
+DEFAULT_ITERATIONS = 10
+
+# 每个题目的回归模型最多使用的观测行数（大样本时随机抽取，避免每题构造 n 行设计矩阵）
+MAX_FIT_ROWS = 100000
+
+# 回归模型的岭参数（相对于 X'X 对角线），避免题目高度共线时矩阵奇异
+RIDGE = 1e-5
+
+# 多重填补数据集的保存位置（相对于处理结果所在目录）
+IMPUTATION_DIR = 'imputations'
+MANIFEST_NAME = 'manifest.json'
+
+# 工作进程中映射的共享编码矩阵
+_SHARED = {}
+
+
+def _missing_mask(codes):
+    if codes.dtype == np.int8:
+        return codes == MISSING_CODE
+    return np.isnan(codes)
+
+
+def completeness(codes, scales, names):
+    """
+    每个参与者在各量表上的作答比例
+
+    Returns:
+        dict: 量表名 -> (n,) 作答比例
+    """
+    missing = _missing_mask(codes)
+    return {name: 1 - missing[:, scales.scale_positions[name]].mean(axis=1) for name in names}
+
+
+def apply_min_completeness(scores, fractions, min_completeness):
+    """
+    作答比例低于 min_completeness 的参与者不计分（得分设为 NaN）；
+    未作答任何题目的量表始终不计分（填补只补全部分作答的量表）
+    """
+    threshold = 0.0 if min_completeness is None else min_completeness
+    return {name: np.where((fractions[name] > 0) & (fractions[name] >= threshold), values, np.nan)
+            for name, values in scores.items()}
+
+
+def person_mean_impute(codes, scales, names):
+    """
+    个人均值填补：缺失题目以该参与者在同一量表已作答题目的均值填补
+    （量表均分与按已答题目求均值相同，与最低作答比例规则配合即为按比例计分）
+
+    Returns:
+        float64 矩阵（列顺序同 codes），未作答任何题目的量表仍为 NaN
+    """
+    values = decode_likert_block(codes)
+    with warnings.catch_warnings():
+        # 整个量表均未作答时均值为 NaN，保持缺失即可
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for name in names:
+            positions = scales.scale_positions[name]
+            block = values[:, positions]
+            person_mean = np.nanmean(block, axis=1)
+            values[:, positions] = np.where(np.isnan(block), person_mean[:, np.newaxis], block)
+    return values
+
+
+def _draw_regression(z, y, rng):
+    """贝叶斯线性回归的一次后验抽样（系数与残差标准差）"""
+    xtx = z.T @ z
+    xtx[np.diag_indices_from(xtx)] += RIDGE * np.diag(xtx) + RIDGE
+    beta_hat = np.linalg.solve(xtx, z.T @ y)
+    resid = y - z @ beta_hat
+    df = max(len(y) - z.shape[1], 1)
+    sigma = np.sqrt(resid @ resid / rng.chisquare(df))
+    chol = np.linalg.cholesky(np.linalg.inv(xtx))
+    return beta_hat + sigma * (chol @ rng.standard_normal(len(beta_hat))), sigma
+
+
+def _attach_shared(name, shape, dtype):
+    """工作进程初始化：映射共享内存中的编码矩阵"""
+    shm = shared_memory.SharedMemory(name=name)
+    _SHARED['shm'] = shm
+    _SHARED['codes'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _mice_chain(groups, scale_max, n_iter, seed_seq):
+    """
+    一条链式方程填补链
+
+    每个题目以同一量表的其他题目与其余量表的当前均值为预测变量，
+    贝叶斯线性回归抽样后四舍五入并截断到 1..scale_max
+
+    Args:
+        groups: 各量表题目在编码矩阵中的列位置
+        scale_max: 各量表的最大分值
+        n_iter: 迭代次数
+        seed_seq: 随机数种子
+
+    Returns:
+        填补后的 (n, 题目数) int8 矩阵，列顺序为 groups 拼接的顺序
+    """
+    rng = np.random.default_rng(seed_seq)
+    columns = np.concatenate(groups)
+    values = decode_likert_block(_SHARED['codes'][:, columns])
+    missing = np.isnan(values)
+    n = len(values)
+
+    # 本链内各量表的局部列位置
+    local = np.split(np.arange(len(columns)), np.cumsum([len(g) for g in groups])[:-1])
+
+    # 初始值：同一量表的个人均值，整个量表缺失时用题目均值
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        item_mean = np.nanmean(values, axis=0)
+        for positions in local:
+            block = values[:, positions]
+            fill = np.nanmean(block, axis=1)[:, np.newaxis]
+            fill = np.where(np.isnan(fill), item_mean[positions], fill)
+            values[:, positions] = np.where(np.isnan(block), fill, block)
+    values = np.where(np.isnan(values), np.nanmean(values), values)
+
+    scale_means = np.column_stack([values[:, positions].mean(axis=1) for positions in local])
+    ones = np.ones((n, 1))
+    for _ in range(n_iter):
+        fit_rows = (np.sort(rng.choice(n, MAX_FIT_ROWS, replace=False))
+                    if n > MAX_FIT_ROWS else np.arange(n))
+        for s, positions in enumerate(local):
+            others = np.delete(scale_means, s, axis=1)
+            for j in positions:
+                miss = missing[:, j]
+                if not miss.any():
+                    continue
+                predictors = [p for p in positions if p != j]
+                design = np.hstack([ones, values[:, predictors], others])
+                observed = fit_rows[~miss[fit_rows]]
+                if len(observed) <= design.shape[1]:
+                    continue
+                beta, sigma = _draw_regression(design[observed], values[observed, j], rng)
+                draw = design[miss] @ beta + sigma * rng.standard_normal(int(miss.sum()))
+                values[miss, j] = np.clip(np.round(draw), 1, scale_max[s])
+            scale_means[:, s] = values[:, positions].mean(axis=1)
+
+    return values.astype(np.int8)
+
+
+def mice_impute(codes, scales, names, n_imputations=DEFAULT_IMPUTATIONS,
+                n_iter=DEFAULT_ITERATIONS, seed=0, n_jobs=None):
+    """
+    链式方程多重填补
+
+    Args:
+        codes: 已反向计分的编码矩阵
+        scales: CompiledScaleRegistry
+        names: 参与填补的量表（互为预测变量）
+        n_imputations: 填补数据集数
+        n_iter: 每条链的迭代次数
+        seed: 随机种子（结果与并行进程数无关）
+        n_jobs: 并行进程数，默认为 CPU 核数
+
+    Returns:
+        list: n_imputations 个与 codes 形状、类型相同的编码矩阵，names 中量表的缺失题目均已填补
+    """
+    groups = [scales.scale_positions[name] for name in names]
+    scale_max = [SCALE_REGISTRY[name]['scale_max'] for name in names]
+    columns = np.concatenate(groups)
+    seeds = np.random.SeedSequence(seed).spawn(n_imputations)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, n_imputations)
+
+    source = np.ascontiguousarray(codes)
+    shm = shared_memory.SharedMemory(create=True, size=max(source.nbytes, 1))
+    try:
+        shared = np.ndarray(source.shape, dtype=source.dtype, buffer=shm.buf)
+        shared[:] = source
+        init_args = (shm.name, source.shape, source.dtype)
+
+        if n_jobs <= 1:
+            _attach_shared(*init_args)
+            chains = [_mice_chain(groups, scale_max, n_iter, s) for s in seeds]
+            _SHARED.pop('codes')
+            _SHARED.pop('shm').close()
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                     initargs=init_args) as executor:
+                futures = [executor.submit(_mice_chain, groups, scale_max, n_iter, s)
+                           for s in seeds]
+                chains = [future.result() for future in futures]
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+    imputed = []
+    for chain in chains:
+        completed = codes.copy()
+        completed[:, columns] = chain.astype(codes.dtype)
+        imputed.append(completed)
+    return imputed
+
+
+def impute_codes(codes, scales, names, method='none', n_imputations=DEFAULT_IMPUTATIONS,
+                 seed=0, n_jobs=None):
+    """
+    按指定方法填补编码矩阵
+
+    Returns:
+        list: 填补后的编码矩阵；'none' 与 'person_mean' 只有一个，'mice' 有 n_imputations 个
+    """
+    if method not in IMPUTATION_METHODS:
+        raise ValueError(f"不支持的填补方法: {method}，可选 {IMPUTATION_METHODS}")
+    if method == 'none':
+        return [codes]
+    if method == 'person_mean':
+        return [person_mean_impute(codes, scales, names)]
+    return mice_impute(codes, scales, names, n_imputations=n_imputations, seed=seed,
+                       n_jobs=n_jobs)
+
+
+def score_imputations(codes, scales, names, method='none', min_completeness=None,
+                      n_imputations=DEFAULT_IMPUTATIONS, seed=0, n_jobs=None,
+                      auxiliary=None):
+    """
+    编码与计分之间的缺失数据处理：填补后计分，并应用最低作答比例规则
+
+    Args:
+        codes: 已反向计分的编码矩阵
+        scales: CompiledScaleRegistry
+        names: 需要计分的量表
+        method: 'none' / 'person_mean' / 'mice'
+        min_completeness: 最低作答比例（按填补前的编码计算），None 表示不限制
+        n_imputations: 多重填补的数据集数
+        seed: 随机种子
+        n_jobs: 并行进程数
+        auxiliary: 只作为多重填补预测变量、不计分的其他量表
+
+    Returns:
+        list: 每个填补数据集一个 dict（量表名 -> float64 得分）
+    """
+    impute_names = list(names) + [name for name in auxiliary or [] if name not in names]
+    fractions = completeness(codes, scales, names)
+    return [apply_min_completeness(scales.score(imputed, names), fractions, min_completeness)
+            for imputed in impute_codes(codes, scales, impute_names, method,
+                                        n_imputations=n_imputations, seed=seed, n_jobs=n_jobs)]
+
+
+# ---------------------------------------------------------------------------
+# Rubin 规则合并
+# ---------------------------------------------------------------------------
+
+def rubin_pool(estimates, variances, complete_df=None):
+    """
+    按 Rubin 规则合并 m 个填补数据集上的估计值
+
+    Args:
+        estimates: (m, ...) 各数据集上的估计值
+        variances: (m, ...) 各数据集上估计值的方差（标准误的平方）
+        complete_df: 完整数据时的自由度，提供时使用 Barnard-Rubin 小样本校正
+
+    Returns:
+        dict: estimate（合并估计）、se（总标准误）、df（自由度）、fmi（缺失信息比例）
+    """
+    estimates = np.asarray(estimates, dtype=np.float64)
+    variances = np.asarray(variances, dtype=np.float64)
+    m = len(estimates)
+    q = estimates.mean(axis=0)
+    within = variances.mean(axis=0)
+    between = estimates.var(axis=0, ddof=1) if m > 1 else np.zeros_like(q)
+    total = within + (1 + 1 / m) * between
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (1 + 1 / m) * between / within
+        df = np.where(between > 0, (m - 1) * (1 + 1 / r) ** 2, np.inf)
+        if complete_df is not None:
+            complete_df = np.asarray(complete_df, dtype=np.float64)
+            lam = (1 + 1 / m) * between / total
+            observed_df = (complete_df + 1) / (complete_df + 3) * complete_df * (1 - lam)
+            df = 1 / (1 / df + 1 / observed_df)
+        fmi = np.where(between > 0, (r + 2 / (df + 3)) / (r + 1), 0.0)
+    return {'estimate': q, 'se': np.sqrt(total), 'df': df, 'fmi': fmi}
+
+
+def pooled_paired_tests(frames, pairs, labels=None):
+    """
+    多重填补数据集上的配对t检验，按 Rubin 规则合并
+
+    Args:
+        frames: 各填补数据集（包含待比较列的 DataFrame）
+        pairs: [(列A, 列B), ...]
+        labels: 每组比较的名称，默认为 "列A vs 列B"
+
+    Returns:
+        DataFrame，每行为一组比较的合并结果，p 值做 FDR 校正
+    """
+    from scipy import stats
+
+    pairs = list(pairs)
+    if labels is None:
+        labels = [f'{a} vs {b}' for a, b in pairs]
+    cols_a = [a for a, _ in pairs]
+    cols_b = [b for _, b in pairs]
+
+    results = [paired_statistics(frame[cols_a].to_numpy(dtype=np.float64),
+                                 frame[cols_b].to_numpy(dtype=np.float64))
+               for frame in frames]
+    n = np.array([r['n'] for r in results], dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variances = np.array([r['sd_diff'] ** 2 / r['n'] for r in results])
+    pooled = rubin_pool([r['mean_diff'] for r in results], variances,
+                        complete_df=n.mean(axis=0) - 1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = pooled['estimate'] / pooled['se']
+    p_t = 2 * stats.t.sf(np.abs(t), pooled['df'])
+    result = pd.DataFrame({
+        'comparison': labels,
+        'var_a': cols_a,
+        'var_b': cols_b,
+        'm': len(frames),
+        'n': n.mean(axis=0),
+        'mean_a': np.mean([r['mean_a'] for r in results], axis=0),
+        'mean_b': np.mean([r['mean_b'] for r in results], axis=0),
+        'mean_diff': pooled['estimate'],
+        'se': pooled['se'],
+        't': t,
+        'df': pooled['df'],
+        'p_t': p_t,
+        'cohen_dz': np.mean([r['cohen_dz'] for r in results], axis=0),
+        'fmi': pooled['fmi'],
+    })
+    result['p_t_fdr'] = fdr_bh(result['p_t'])
+    return result
+
+
+def pooled_correlations(frames, columns=None, ci=0.95):
+    """
+    多重填补数据集上的皮尔逊相关，按 Rubin 规则合并 Fisher z
+
+    Returns:
+        (合并相关矩阵 DataFrame, 整洁格式的逐对结果 DataFrame)
+    """
+    from scipy import stats
+
+    columns = list(frames[0].columns if columns is None else columns)
+    z_values = []
+    variances = []
+    counts = []
+    for frame in frames:
+        acc = PairwiseCorrelationAccumulator.from_values(
+            frame[columns].to_numpy(dtype=np.float64), columns)
+        r = acc.correlation().to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z_values.append(np.arctanh(np.clip(r, -0.999999, 0.999999)))
+            variances.append(1 / (acc.n - 3))
+        counts.append(acc.n)
+    n = np.mean(counts, axis=0)
+    pooled = rubin_pool(z_values, variances, complete_df=n - 3)
+
+    r = np.tanh(pooled['estimate'])
+    np.fill_diagonal(r, 1.0)
+    matrix = pd.DataFrame(r, index=columns, columns=columns)
+
+    upper = np.triu_indices(len(columns), k=1)
+    z = pooled['estimate'][upper]
+    se = pooled['se'][upper]
+    df = pooled['df'][upper]
+    crit = stats.t.ppf(0.5 + ci / 2, df)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = 2 * stats.t.sf(np.abs(z / se), df)
+    tidy = pd.DataFrame({
+        'var1': [columns[i] for i in upper[0]],
+        'var2': [columns[j] for j in upper[1]],
+        'm': len(frames),
+        'n': n[upper],
+        'r': r[upper],
+        'ci_low': np.tanh(z - crit * se),
+        'ci_high': np.tanh(z + crit * se),
+        'df': df,
+        'p': p,
+        'fmi': pooled['fmi'][upper],
+    })
+    return matrix, tidy
+
+
+# ---------------------------------------------------------------------------
+# 多重填补数据集的保存与读取
+# ---------------------------------------------------------------------------
+
+def imputation_dir(processed_path):
+    """处理结果对应的填补数据集目录"""
+    return os.path.join(os.path.dirname(processed_path), IMPUTATION_DIR)
+
+
+def save_imputations(frames, processed_path, settings):
+    """
+    保存多重填补的数据集，并记录处理结果文件的签名（处理结果须已写出）
+
+    Returns:
+        填补数据集文件路径列表
+    """
+    directory = imputation_dir(processed_path)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(processed_path))[0]
+    paths = []
+    for i, frame in enumerate(frames, 1):
+        path = os.path.join(directory, f'{stem}_imp_{i:02d}.csv')
+        frame.to_csv(path, index=False, encoding='utf-8-sig')
+        paths.append(path)
+
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'processed_path': os.path.abspath(processed_path),
+                   'signature': file_signature(processed_path),
+                   'settings': settings,
+                   'files': [os.path.basename(path) for path in paths]},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return paths
+
+
+def _current_manifest(processed_path):
+    """与当前处理结果对应的填补数据集清单；没有或已过期时返回 None"""
+    manifest_path = os.path.join(imputation_dir(processed_path), MANIFEST_NAME)
+    if not (os.path.exists(manifest_path) and os.path.exists(processed_path)):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if (manifest.get('processed_path') != os.path.abspath(processed_path)
+            or manifest.get('signature') != file_signature(processed_path)):
+        return None
+    return manifest
+
+
+def imputation_files(processed_path):
+    """
+    与当前处理结果对应的多重填补数据集文件（含清单文件）
+
+    Returns:
+        文件路径列表；没有对应的填补数据集时为空列表
+    """
+    manifest = _current_manifest(processed_path)
+    if manifest is None:
+        return []
+    directory = imputation_dir(processed_path)
+    return ([os.path.join(directory, name) for name in manifest['files']]
+            + [os.path.join(directory, MANIFEST_NAME)])
+
+
+def load_imputations(processed_path):
+    """
+    读取与当前处理结果对应的多重填补数据集
+
+    Returns:
+        DataFrame 列表；没有填补数据集或处理结果在填补后被重新生成时返回 None
+    """
+    manifest = _current_manifest(processed_path)
+    if manifest is None:
+        return None
+    directory = imputation_dir(processed_path)
+    return [pd.read_csv(os.path.join(directory, name)) for name in manifest['files']]
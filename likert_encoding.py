@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+likert_encoding.py
+- 李克特量表文本答案的向量化编码
+- 对整个量表列块只建立一次 "唯一取值 -> 分数" 查找表，输出二维 int8 矩阵
+- 反向计分以单次掩码数组运算完成
+"""
+
+import numpy as np
+import pandas as pd
+
+# 李克特5点量表映射
+# 这是根据常见的李克特5点量表进行的假设，可能需要根据实际问卷调整
+LIKERT_5_POINT_MAPPING = {
+    '几乎从不或从不': 1,
+    '很少如此': 2,
+    '有时如此': 3,
+    '通常如此': 4,
+    '几乎总是或总是如此': 5
+}
+
+# int8 编码矩阵中表示缺失值的哨兵
+MISSING_CODE = np.iinfo(np.int8).min
+
+
+def _build_lookup_table(uniques, mapping):
+    """
+    为唯一取值建立数值查找表
+    规则与逐列 map(mapping).fillna(原值) + to_numeric(errors='coerce') 一致
+    """
+    uniques = pd.Series(uniques, dtype=object)
+    mapped = uniques.map(mapping)
+    numeric = pd.to_numeric(uniques, errors='coerce')
+    return mapped.fillna(numeric).to_numpy(dtype=np.float64)
+
+
+def encode_likert_block(block, mapping=LIKERT_5_POINT_MAPPING):
+    """
+    一次性编码整个量表列块
+
+    Args:
+        block: DataFrame 或二维数组（行=参与者，列=题目）
+        mapping: 文本答案到分数的映射
+
+    Returns:
+        二维数组。所有有效分数均为 int8 范围内的整数时返回 int8 矩阵
+        （缺失值为 MISSING_CODE），否则返回 float64 矩阵（缺失值为 NaN）
+    """
+    values = np.asarray(block, dtype=object)
+    codes, uniques = pd.factorize(values.ravel())
+
+    # 查找表末尾追加一个缺失值，factorize 对缺失值给出的 -1 正好索引到它
+    table = np.append(_build_lookup_table(uniques, mapping), np.nan)
+
+    valid = ~np.isnan(table)
+    int8_info = np.iinfo(np.int8)
+    if (np.all(table[valid] == np.round(table[valid]))
+            and np.all(table[valid] > int8_info.min)
+            and np.all(table[valid] <= int8_info.max)):
+        int_table = np.where(valid, table, MISSING_CODE).astype(np.int8)
+        return int_table[codes].reshape(values.shape)
+
+    return table[codes].reshape(values.shape)
+
+
+def reverse_score_block(codes, reverse_mask, scale_max=5):
+    """
+    原地对编码矩阵中的反向计分题进行计分: new = (scale_max + 1) - old
+
+    Args:
+        codes: encode_likert_block 的输出
+        reverse_mask: 长度为列数的布尔数组，True 表示该列为反向计分题
+        scale_max: 量表最大值
+    """
+    reverse_mask = np.asarray(reverse_mask, dtype=bool)
+    if codes.dtype == np.int8:
+        mask = reverse_mask[np.newaxis, :] & (codes != MISSING_CODE)
+    else:
+        # NaN 参与运算后仍为 NaN，无需额外屏蔽
+        mask = np.broadcast_to(reverse_mask, codes.shape)
+    np.subtract(codes.dtype.type(scale_max + 1), codes, out=codes, where=mask)
+    return codes
+
+
+def decode_likert_block(codes):
+    """
+    将编码矩阵转换为 float64，缺失值为 NaN
+    """
+    if codes.dtype != np.int8:
+        return codes.astype(np.float64)
+    decoded = codes.astype(np.float64)
+    decoded[codes == MISSING_CODE] = np.nan
+    return decoded
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+modelling.py
+- 关系质量、创伤经历与心理健康之间的回归与中介模型
+- 线性回归（OLS）：各心理健康得分对四个关系得分与创伤经历得分回归
+- 简单中介模型（X -> M -> Y，如继父母关系 -> 自责 -> 抑郁），间接效应 a*b 的 bootstrap 置信区间
+- bootstrap 以重抽样次数矩阵批量计算：每块重抽样、全部模型的 X'WX 由一次矩阵乘法得到，
+  再批量求解全部系数；各重抽样块在进程池中并行运行
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from likert_encoding import LIKERT_5_POINT_MAPPING, MISSING_CODE, encode_likert_block
+from profiling import annotate, profile_stage
+from scale_registry import SCALE_REGISTRY
+
+# 创伤经历的次数选项 -> 分数；题目使用频率量表文本时沿用李克特5点映射
+TRAUMA_FREQUENCY_MAPPING = {
+    '从未': 0,
+    '1-2次': 1,
+    '3-5次': 2,
+    '6次及以上': 3
+}
+
+# 关系得分（分析器中的列名）
+RELATIONSHIP_PREDICTORS = ['stepparent_past_score', 'stepparent_current_score',
+                           'bioparent_past_score', 'bioparent_current_score']
+
+# 创伤经历得分（分析器 trauma 分组的题目均值）
+TRAUMA_PREDICTORS = ['trauma_stepparent_abuse', 'trauma_bioparent_abuse',
+                     'trauma_stepparent_sexual', 'trauma_bioparent_sexual']
+
+# 心理健康得分列名
+MENTAL_HEALTH = {name: SCALE_REGISTRY[name]['score_name']
+                 for name in ['self_esteem', 'self_blame', 'anxiety', 'depression']}
+
+# 回归模型：模型名 -> 因变量与自变量
+OLS_MODELS = {
+    name: {'outcome': outcome, 'predictors': RELATIONSHIP_PREDICTORS + TRAUMA_PREDICTORS}
+    for name, outcome in MENTAL_HEALTH.items()
+}
+
+# 中介模型：模型名 -> 自变量 x、中介变量 m、因变量 y 与协变量
+MEDIATION_MODELS = {
+    **{f"{x.replace('_score', '')}->self_blame->{y}": {
+        'x': x, 'm': MENTAL_HEALTH['self_blame'], 'y': MENTAL_HEALTH[y], 'covariates': []}
+       for x in RELATIONSHIP_PREDICTORS for y in ['depression', 'anxiety', 'self_esteem']},
+    **{f"{x.replace('trauma_', '')}->self_blame->depression": {
+        'x': x, 'm': MENTAL_HEALTH['self_blame'], 'y': MENTAL_HEALTH['depression'],
+        'covariates': []}
+       for x in ['trauma_stepparent_abuse', 'trauma_bioparent_abuse']},
+    'stepparent_abuse->stepparent_current->depression': {
+        'x': 'trauma_stepparent_abuse', 'm': 'stepparent_current_score',
+        'y': MENTAL_HEALTH['depression'], 'covariates': ['stepparent_past_score']},
+}
+
+DEFAULT_BOOTSTRAP = 5000
+
+# 每块重抽样的次数矩阵最多包含这么多个元素（约 40MB），块内最多 MAX_BLOCK 次重抽样
+BLOCK_ELEMENTS = 5000000
+MAX_BLOCK = 1000
+
+# 重抽样的正规方程按这么多行一段累加，限制各模型逐行乘积矩阵的内存
+CHUNK_ROWS = 20000
+
+# 工作进程中的模型变量矩阵与各中介模型的变量列号
+_DATA = {}
+
+
+def trauma_scores(df, groups):
+    """
+    创伤经历得分：每组题目的均值（忽略缺失值）
+
+    Args:
+        df: 原始问卷数据（创伤题目为文本答案）
+        groups: 分组名 -> 列索引或列索引列表（分析器的 trauma 分组）
+
+    Returns:
+        DataFrame，列为 trauma_<分组名>
+    """
+    mapping = {**LIKERT_5_POINT_MAPPING, **TRAUMA_FREQUENCY_MAPPING}
+    scores = {}
+    for name, columns in groups.items():
+        columns = columns if isinstance(columns, list) else [columns]
+        columns = [idx for idx in columns if idx < len(df.columns)]
+        if not columns:
+            continue
+        block = np.asarray(encode_likert_block(df.iloc[:, columns], mapping), dtype=np.float64)
+        block[block == MISSING_CODE] = np.nan
+        counts = (~np.isnan(block)).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores[f'trauma_{name}'] = np.where(counts > 0, np.nansum(block, axis=1) / counts, np.nan)
+    return pd.DataFrame(scores, index=df.index)
+
+
+def _solve(gram, rhs):
+    """（批量）求解正规方程；奇异时改用伪逆"""
+    try:
+        return np.linalg.solve(gram, rhs)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(gram) @ rhs
+
+
+def ols(y, X):
+    """
+    普通最小二乘回归（X 不含截距列，自动加入）
+
+    Returns:
+        dict: coef / se / t / p（第 0 项为截距）、n、r2、adj_r2、f、p_f
+    """
+    from scipy import stats
+
+    n, k = X.shape
+    design = np.column_stack([np.ones(n), X])
+    gram = design.T @ design
+    coef = _solve(gram, design.T @ y)
+    resid = y - design @ coef
+    df_resid = n - k - 1
+    rss = resid @ resid
+    tss = ((y - y.mean()) ** 2).sum()
+    sigma2 = rss / df_resid if df_resid > 0 else np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        se = np.sqrt(sigma2 * np.diag(np.linalg.pinv(gram)))
+        t = coef / se
+        r2 = 1 - rss / tss
+        adj_r2 = 1 - (1 - r2) * (n - 1) / df_resid
+        f = (r2 / k) / ((1 - r2) / df_resid) if k > 0 else np.nan
+    return {
+        'coef': coef,
+        'se': se,
+        't': t,
+        'p': 2 * stats.t.sf(np.abs(t), df_resid),
+        'df': df_resid,
+        'n': n,
+        'r2': r2,
+        'adj_r2': adj_r2,
+        'f': f,
+        'p_f': stats.f.sf(f, k, df_resid) if k > 0 else np.nan,
+    }
+
+
+def _complete(frame, columns):
+    """各列均无缺失的行（列表删除）"""
+    return frame[columns].dropna().to_numpy(dtype=np.float64)
+
+
+def fit_ols_models(frame, models=OLS_MODELS, ci=0.95):
+    """
+    拟合全部回归模型（跳过变量不在 frame 中的模型）
+
+    Returns:
+        (coefficients, fit) 两个 DataFrame：各项系数（含标准化系数 beta）与模型拟合指标
+    """
+    from scipy import stats
+
+    coef_rows = []
+    fit_rows = []
+    for name, spec in models.items():
+        predictors = [col for col in spec['predictors'] if col in frame.columns]
+        if spec['outcome'] not in frame.columns or not predictors:
+            continue
+        data = _complete(frame, [spec['outcome']] + predictors)
+        if len(data) <= len(predictors) + 1:
+            continue
+        y, X = data[:, 0], data[:, 1:]
+        result = ols(y, X)
+        crit = stats.t.ppf(0.5 + ci / 2, result['df'])
+        sd = np.concatenate([[np.nan], X.std(axis=0, ddof=1)])
+        for j, term in enumerate(['const'] + predictors):
+            coef_rows.append({
+                'model': name,
+                'outcome': spec['outcome'],
+                'term': term,
+                'coef': result['coef'][j],
+                'se': result['se'][j],
+                't': result['t'][j],
+                'p': result['p'][j],
+                'ci_low': result['coef'][j] - crit * result['se'][j],
+                'ci_high': result['coef'][j] + crit * result['se'][j],
+                'beta': result['coef'][j] * sd[j] / y.std(ddof=1),
+            })
+        fit_rows.append({'model': name, 'outcome': spec['outcome'], 'n': result['n'],
+                         'n_predictors': len(predictors), 'r2': result['r2'],
+                         'adj_r2': result['adj_r2'], 'f': result['f'], 'p_f': result['p_f']})
+    return pd.DataFrame(coef_rows), pd.DataFrame(fit_rows)
+
+
+def _mediation_columns(spec):
+    """中介模型的变量顺序：x、协变量、m、y"""
+    return [spec['x']] + spec['covariates'] + [spec['m'], spec['y']]
+
+
+def _init_worker(values, models):
+    _DATA['values'] = values
+    _DATA['models'] = models
+
+
+def _products(values, models):
+    """
+    每行对各模型正规方程的贡献，按模型依次拼接 [D 外积, D*m, D*y]
+
+    D = [1, x, 协变量..., m]；a 路径为 m 对 D 的前 q-1 列回归，b 路径与直接效应为
+    y 对 D 全部列回归。变量不完整的行整行为 0（重抽样后再列表删除）
+    """
+    parts = []
+    for columns in models:
+        data = values[:, columns]
+        complete = ~np.isnan(data).any(axis=1)
+        data = np.where(complete[:, np.newaxis], data, 0.0)
+        design = np.column_stack([complete.astype(np.float64), data[:, :-1]])
+        n, q = design.shape
+        parts += [(design[:, :, np.newaxis] * design[:, np.newaxis, :]).reshape(n, q * q),
+                  design * data[:, -2:-1], design * data[:, -1:]]
+    return np.hstack(parts)
+
+
+def _bootstrap_block(n_resamples, seed_seq):
+    """
+    一块重抽样中全部模型的 a、b 路径系数
+
+    每次重抽样表示为各行被抽中的次数 w，则 X'WX = w @ 外积、X'Wy = w @ (D*y)：
+    整块、全部模型的正规方程由同一个次数矩阵的一次矩阵乘法（按行分段累加）得到，
+    再对每个模型批量求解
+
+    Returns:
+        (a, b)，形状均为 (模型数, n_resamples)
+    """
+    values, models = _DATA['values'], _DATA['models']
+    n = len(values)
+    rng = np.random.default_rng(seed_seq)
+    draws = rng.integers(0, n, size=(n_resamples, n))
+    draws += np.arange(n_resamples)[:, np.newaxis] * n
+    counts = np.bincount(draws.ravel(), minlength=n_resamples * n).reshape(n_resamples, n)
+    counts = counts.astype(np.float64)
+
+    sums = sum(counts[:, start:start + CHUNK_ROWS] @ _products(values[start:start + CHUNK_ROWS], models)
+               for start in range(0, n, CHUNK_ROWS))
+
+    a = np.empty((len(models), n_resamples))
+    b = np.empty((len(models), n_resamples))
+    offset = 0
+    for i, columns in enumerate(models):
+        q = len(columns)
+        gram = sums[:, offset:offset + q * q].reshape(n_resamples, q, q)
+        rhs_m = sums[:, offset + q * q:offset + q * q + q]
+        rhs_y = sums[:, offset + q * q + q:offset + q * q + 2 * q]
+        offset += q * q + 2 * q
+        a[i] = _solve(gram[:, :q - 1, :q - 1], rhs_m[:, :q - 1, np.newaxis])[:, 1, 0]
+        b[i] = _solve(gram, rhs_y[:, :, np.newaxis])[:, -1, 0]
+    return a, b
+
+
+def block_sizes(n_rows, n_bootstrap):
+    """按数据行数把 bootstrap 次数切分为若干块（与并行进程数无关）"""
+    size = int(np.clip(BLOCK_ELEMENTS // max(n_rows, 1), 1, MAX_BLOCK))
+    return [min(size, n_bootstrap - start) for start in range(0, n_bootstrap, size)]
+
+
+def fit_mediation_models(frame, models=MEDIATION_MODELS, n_bootstrap=DEFAULT_BOOTSTRAP,
+                         ci=0.95, seed=0, n_jobs=None):
+    """
+    拟合全部简单中介模型（跳过变量不在 frame 中的模型）
+
+    bootstrap 对全体参与者重抽样后在每个重抽样样本中列表删除，全部模型共用同一组重抽样
+
+    Args:
+        frame: 模型变量
+        models: 中介模型定义
+        n_bootstrap: bootstrap 次数，0 表示只计算 Sobel 检验
+        ci: 置信水平
+        seed: 随机种子（结果与并行进程数无关）
+        n_jobs: 并行进程数，默认为 CPU 核数
+
+    Returns:
+        DataFrame: 每个模型一行，a / b 路径、直接效应、总效应、间接效应及其
+                   bootstrap 标准误与百分位置信区间、Sobel 检验、中介效应占比
+    """
+    from scipy import stats
+
+    variables = []
+    fitted = []
+    rows = []
+    for name, spec in models.items():
+        columns = _mediation_columns(spec)
+        if not all(col in frame.columns for col in columns):
+            continue
+        data = _complete(frame, columns)
+        x, m, y = data[:, :-2], data[:, -2], data[:, -1]
+        if len(data) <= x.shape[1] + 2:
+            continue
+        path_a = ols(m, x)
+        path_b = ols(y, data[:, :-1])
+        total = ols(y, x)
+        a, b = path_a['coef'][1], path_b['coef'][-1]
+        se_a, se_b = path_a['se'][1], path_b['se'][-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sobel_z = a * b / np.sqrt(b ** 2 * se_a ** 2 + a ** 2 * se_b ** 2)
+            proportion = a * b / total['coef'][1]
+        rows.append({
+            'model': name, 'x': spec['x'], 'm': spec['m'], 'y': spec['y'],
+            'covariates': ','.join(spec['covariates']), 'n': len(data),
+            'a': a, 'se_a': se_a, 'p_a': path_a['p'][1],
+            'b': b, 'se_b': se_b, 'p_b': path_b['p'][-1],
+            'direct': path_b['coef'][1], 'p_direct': path_b['p'][1],
+            'total': total['coef'][1], 'p_total': total['p'][1],
+            'indirect': a * b, 'sobel_z': sobel_z, 'p_sobel': 2 * stats.norm.sf(np.abs(sobel_z)),
+            'proportion_mediated': proportion,
+        })
+        variables += [col for col in columns if col not in variables]
+        fitted.append([variables.index(col) for col in columns])
+    results = pd.DataFrame(rows)
+    if results.empty or n_bootstrap <= 0:
+        return results
+
+    values = frame[variables].to_numpy(dtype=np.float64)
+    sizes = block_sizes(len(values), n_bootstrap)
+    tasks = list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks))
+    if n_jobs <= 1:
+        _init_worker(values, fitted)
+        blocks = [_bootstrap_block(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(values, fitted)) as executor:
+            blocks = [future.result() for future in
+                      [executor.submit(_bootstrap_block, *task) for task in tasks]]
+
+    indirect = np.concatenate([a * b for a, b in blocks], axis=1)
+    alpha = (1 - ci) / 2
+    results['boot_se'] = indirect.std(axis=1, ddof=1)
+    results['ci_low'] = np.quantile(indirect, alpha, axis=1)
+    results['ci_high'] = np.quantile(indirect, 1 - alpha, axis=1)
+    results['significant'] = (results['ci_low'] > 0) | (results['ci_high'] < 0)
+    results['n_bootstrap'] = n_bootstrap
+    return results
+
+
+@profile_stage()
+def fit_models(frame, ols_models=OLS_MODELS, mediation_models=MEDIATION_MODELS,
+               n_bootstrap=DEFAULT_BOOTSTRAP, ci=0.95, seed=0, n_jobs=None):
+    """
+    拟合全部回归与中介模型
+
+    Returns:
+        dict: 'coefficients' / 'fit'（回归模型）与 'mediation'（中介模型）三个 DataFrame
+    """
+    annotate(rows=len(frame), columns=len(frame.columns))
+    coefficients, fit = fit_ols_models(frame, ols_models, ci=ci)
+    mediation = fit_mediation_models(frame, mediation_models, n_bootstrap=n_bootstrap,
+                                     ci=ci, seed=seed, n_jobs=n_jobs)
+    return {'coefficients': coefficients, 'fit': fit, 'mediation': mediation}
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+paired_tests.py
+- 批量配对比较引擎：任意多组 (得分A, 得分B) 在一个二维数组上向量化计算
+- 配对t检验、Wilcoxon 符号秩检验（正态近似）、效应量 (Cohen's dz, 秩二列相关)
+- Benjamini-Hochberg FDR 校正，返回整洁的结果表
+"""
+
+import numpy as np
+import pandas as pd
+
+# 未分组时 group 列的取值
+ALL_GROUP = '全体'
+
+
+def fdr_bh(p_values):
+    """
+    Benjamini-Hochberg FDR 校正（忽略缺失值）
+    """
+    p = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full_like(p, np.nan)
+    valid = ~np.isnan(p)
+    m = int(valid.sum())
+    if m == 0:
+        return adjusted
+    order = np.argsort(p[valid])
+    ranked = p[valid][order] * m / np.arange(1, m + 1)
+    # 从大到小取累积最小值，保证校正后的 p 值单调
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    result = np.empty(m)
+    result[order] = np.minimum(ranked, 1.0)
+    adjusted[valid] = result
+    return adjusted
+
+
+def paired_statistics(a, b):
+    """
+    对 (n, m) 的两个数组按列计算配对统计量，每列只使用两者均非缺失的行
+    """
+    # scipy 导入较慢，只在计算时导入
+    from scipy import stats
+
+    complete = ~np.isnan(a) & ~np.isnan(b)
+    n = complete.sum(axis=0)
+    diff = np.where(complete, a - b, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_a = np.where(complete, a, 0.0).sum(axis=0) / n
+        mean_b = np.where(complete, b, 0.0).sum(axis=0) / n
+        mean_diff = np.where(complete, diff, 0.0).sum(axis=0) / n
+        centered = np.where(complete, diff - mean_diff, 0.0)
+        sd_diff = np.sqrt((centered * centered).sum(axis=0) / (n - 1))
+
+        # 配对t检验
+        t = mean_diff / (sd_diff / np.sqrt(n))
+        dof = n - 1
+        p_t = 2 * stats.t.sf(np.abs(t), dof)
+        cohen_dz = mean_diff / sd_diff
+
+        # Wilcoxon 符号秩检验：去掉差值为0的配对 (zero_method='wilcox')
+        nonzero = complete & (diff != 0)
+        n_w = nonzero.sum(axis=0)
+        # 缺失位置填为 +inf 排在最后，不影响有效差值的秩
+        abs_diff = np.where(nonzero, np.abs(diff), np.inf)
+        ranks = np.where(nonzero, stats.rankdata(abs_diff, axis=0), 0.0)
+        w_plus = np.where(diff > 0, ranks, 0.0).sum(axis=0)
+        w_minus = np.where(diff < 0, ranks, 0.0).sum(axis=0)
+        # 原假设下 W+ 的方差为 sum(r^2)/4，已包含同秩校正
+        expected = n_w * (n_w + 1) / 4
+        variance = (ranks * ranks).sum(axis=0) / 4
+        z_w = (w_plus - expected) / np.sqrt(variance)
+        p_w = 2 * stats.norm.sf(np.abs(z_w))
+        rank_biserial = (w_plus - w_minus) / (w_plus + w_minus)
+
+    return {
+        'n': n,
+        'mean_a': mean_a,
+        'mean_b': mean_b,
+        'mean_diff': mean_diff,
+        'sd_diff': sd_diff,
+        't': t,
+        'df': dof,
+        'p_t': p_t,
+        'cohen_dz': cohen_dz,
+        'n_wilcoxon': n_w,
+        'wilcoxon_w': np.minimum(w_plus, w_minus),
+        'z_wilcoxon': z_w,
+        'p_wilcoxon': p_w,
+        'rank_biserial': rank_biserial,
+    }
+
+
+def paired_comparisons(df, pairs, labels=None, group_by=None):
+    """
+    批量配对比较
+
+    Args:
+        df: 包含待比较列的 DataFrame
+        pairs: [(列A, 列B), ...]
+        labels: 每组比较的名称，默认为 "列A vs 列B"
+        group_by: 可选的分组变量（Series 或列名），每个分组分别比较
+
+    Returns:
+        DataFrame，每行为一个 (分组, 比较) 的结果，p 值在全部行上做 FDR 校正
+    """
+    pairs = list(pairs)
+    if labels is None:
+        labels = [f'{a} vs {b}' for a, b in pairs]
+    cols_a = [a for a, _ in pairs]
+    cols_b = [b for _, b in pairs]
+    a = df[cols_a].to_numpy(dtype=np.float64)
+    b = df[cols_b].to_numpy(dtype=np.float64)
+
+    if group_by is None:
+        groups = [(ALL_GROUP, np.ones(len(df), dtype=bool))]
+    else:
+        keys = df[group_by] if isinstance(group_by, str) else pd.Series(group_by, index=df.index)
+        groups = [(ALL_GROUP, np.ones(len(df), dtype=bool))]
+        groups += [(value, (keys == value).to_numpy())
+                   for value in keys.dropna().unique()]
+
+    frames = []
+    for group, mask in groups:
+        result = pd.DataFrame(paired_statistics(a[mask], b[mask]))
+        result.insert(0, 'var_b', cols_b)
+        result.insert(0, 'var_a', cols_a)
+        result.insert(0, 'comparison', labels)
+        result.insert(0, 'group', group)
+        frames.append(result)
+
+    results = pd.concat(frames, ignore_index=True)
+    results['p_t_fdr'] = fdr_bh(results['p_t'])
+    results['p_wilcoxon_fdr'] = fdr_bh(results['p_wilcoxon'])
+    return results
@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pipeline.py
+- 将数据分析流程（预处理 -> 相关性分析 -> 可视化，以及 StepfamilyRelationshipAnalyzer 的各阶段）
+  描述为有向无环图
+- 每个步骤以 (代码摘要, 输入数据摘要, 上游产物摘要) 为键，产物按内容摘要记录，
+  键未变化且产物完好的步骤直接跳过
+- 相互独立的分支在线程池中并发执行；同一进程内的步骤之间直接传递内存中的 DataFrame，
+  只有上游步骤被跳过、或增量预处理只追加了新参与者（全部数据不在内存中）时才从产物文件读取
+- 步骤的代码或选项变化、或指定 --force 时，增量步骤（预处理）全部重新计算，而不是只处理新增数据
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import pandas as pd
+
+from data_loader import file_sha256
+from imputation import DEFAULT_IMPUTATIONS, IMPUTATION_METHODS, imputation_files
+from profiling import enable_profiling, profile_stage
+from survey_ingestion import is_multi_source, load_survey, resolve_sources
+
+# 项目根目录与编号脚本所在目录
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(ROOT_DIR, 'scripts')
+
+# 流水线状态文件（相对于输出目录）
+STATE_PATH = os.path.join('.pipeline', 'state.json')
+
+# 缺失数据处理与描述性统计分位数精度的选项及默认值（步骤以其影响结果的选项作为键的一部分）
+DEFAULT_OPTIONS = {
+    'imputation': 'none',
+    'min_completeness': None,
+    'n_imputations': DEFAULT_IMPUTATIONS,
+    'seed': 0,
+    'quantile_error': None,
+}
+IMPUTATION_OPTIONS = ['imputation', 'min_completeness', 'n_imputations', 'seed']
+
+
+def import_script(name):
+    """导入 scripts/ 下的编号脚本（文件名以数字开头，只能通过 importlib 导入）"""
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    return importlib.import_module(name)
+
+
+# ---------------------------------------------------------------------------
+# 步骤实现：run(ctx) 返回该步骤写出的产物路径列表
+# ---------------------------------------------------------------------------
+
+def run_preprocess(ctx):
+    preprocess = import_script('01_preprocess_data')
+    options = ctx.options
+    raw = ctx.get('raw')
+    if (options['imputation'] in preprocess.INCREMENTAL_IMPUTATION_METHODS
+            and preprocess.ID_COLUMN in raw.columns):
+        # 增量计分：只对新增参与者计分并追加，同时更新相关性分析的充分统计量；
+        # 代码或选项变化、强制重跑时全部重新计分
+        output_path, df_processed = preprocess.preprocess_data_incremental(
+            ctx.data_path, ctx.output_dir, imputation=options['imputation'],
+            min_completeness=options['min_completeness'], df=raw,
+            full=ctx.needs_rebuild('preprocess'), return_frame=True)
+    else:
+        output_path, df_processed = preprocess.preprocess_data(
+            ctx.data_path, ctx.output_dir, imputation=options['imputation'],
+            min_completeness=options['min_completeness'], n_imputations=options['n_imputations'],
+            seed=options['seed'], n_jobs=ctx.n_jobs, df=raw, return_frame=True)
+    if df_processed is not None:
+        # 下游步骤直接使用内存中的处理结果
+        ctx.set('processed', df_processed)
+    # 多重填补数据集由相关性分析按 Rubin 规则合并
+    return [output_path] + imputation_files(output_path)
+
+
+def run_correlation(ctx):
+    correlation = import_script('02_correlation_analysis')
+    # 处理结果在内存中时直接计算；否则（预处理被跳过或只追加了新参与者）从增量状态刷新
+    # 充分统计量，代价与新增行数成正比
+    outputs = correlation.analyze_correlations(ctx.path('processed_data.csv'), ctx.output_dir,
+                                               n_jobs=ctx.n_jobs, df=ctx.peek('processed'))
+    return list(outputs)
+
+
+def run_visualize(ctx):
+    visualize = import_script('03_visualize_results')
+    return visualize.visualize_results(ctx.path('correlation_matrix.csv'),
+                                       ctx.path('processed_data.csv'), ctx.output_dir,
+                                       n_jobs=ctx.n_jobs, force=ctx.force,
+                                       df=ctx.get('processed'))
+
+
+def run_relationship_descriptive(ctx):
+    return [ctx.get('analyzer').descriptive_analysis(ctx.options['quantile_error'])]
+
+
+def run_relationship_comparison(ctx):
+    output_file = ctx.get('analyzer').comparative_analysis()
+    outputs = [output_file, output_file.replace('.txt', '.csv')]
+    pooled_file = output_file.replace('.txt', '_pooled.csv')
+    if os.path.exists(pooled_file):
+        outputs.append(pooled_file)
+    return outputs
+
+
+def run_relationship_items(ctx):
+    return [ctx.get('analyzer').item_comparisons()]
+
+
+def run_relationship_reliability(ctx):
+    output_file = ctx.get('analyzer').reliability_analysis()
+    return [output_file, output_file.replace('.csv', '_items.csv')]
+
+
+def run_relationship_clusters(ctx):
+    ctx.get('clusters')
+    output_file = ctx.get('analyzer').cluster_analysis()
+    return [output_file, output_file.replace('.csv', '_selection.csv')]
+
+
+def run_relationship_models(ctx):
+    ctx.get('models')
+    output_file = ctx.get('analyzer').modelling_analysis()
+    model_file = output_file.replace('relationship_mediation_', 'relationship_models_')
+    return [output_file, model_file, model_file.replace('.csv', '_fit.csv')]
+
+
+def run_relationship_plots(ctx):
+    return [ctx.get('analyzer').create_visualizations()]
+
+
+def run_relationship_subgroups(ctx):
+    from subgroup_analysis import SubgroupAnalyzer
+
+    # 聚类类别作为分组字段之一
+    ctx.get('clusters')
+    return SubgroupAnalyzer(ctx.get('analyzer'), n_jobs=ctx.n_jobs).save()
+
+
+def run_relationship_summary(ctx):
+    # 总结报告列出各分析阶段（含被跳过的阶段）的主要产物
+    ctx.get('clusters')
+    ctx.get('models')
+    files = [ctx.outputs(name)[0] for name in PIPELINE_STEPS['relationship_summary']['deps']]
+    return [ctx.get('analyzer').generate_summary_report(files)]
+
+
+# 流水线步骤定义
+# deps: 上游步骤；code: 步骤执行的入口源文件（相对于项目根目录），其导入的项目模块由
+# step_sources() 递归补全；
+# uses_data: 是否以原始数据文件为输入；options: 影响结果的选项（缺失数据处理、分位数精度）
+PIPELINE_STEPS = {
+    'preprocess': {
+        'label': '数据预处理',
+        'deps': [],
+        'code': ['scripts/01_preprocess_data.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_preprocess,
+    },
+    'correlation': {
+        'label': '相关性分析',
+        'deps': ['preprocess'],
+        'code': ['scripts/02_correlation_analysis.py'],
+        'uses_data': False,
+        'run': run_correlation,
+    },
+    'visualize': {
+        'label': '结果可视化',
+        'deps': ['preprocess', 'correlation'],
+        'code': ['scripts/03_visualize_results.py'],
+        'uses_data': False,
+        'run': run_visualize,
+    },
+    'relationship_descriptive': {
+        'label': '关系质量描述性统计',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS + ['quantile_error'],
+        'run': run_relationship_descriptive,
+    },
+    'relationship_comparison': {
+        'label': '继父母vs生身父母对比',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_relationship_comparison,
+    },
+    'relationship_items': {
+        'label': '题目级对比',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'run': run_relationship_items,
+    },
+    'relationship_reliability': {
+        'label': '量表信度',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'run': run_relationship_reliability,
+    },
+    'relationship_clusters': {
+        'label': '关系模式聚类',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_relationship_clusters,
+    },
+    'relationship_models': {
+        'label': '回归与中介分析',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_relationship_models,
+    },
+    'relationship_plots': {
+        'label': '关系质量图表',
+        'deps': [],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_relationship_plots,
+    },
+    'relationship_subgroups': {
+        'label': '分组分析',
+        'deps': [],
+        'code': ['stepfamily_analysis.py', 'subgroup_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_relationship_subgroups,
+    },
+    'relationship_summary': {
+        'label': '总结报告',
+        'deps': ['relationship_descriptive', 'relationship_comparison',
+                 'relationship_items', 'relationship_reliability', 'relationship_clusters',
+                 'relationship_models', 'relationship_plots'],
+        'code': ['stepfamily_analysis.py'],
+        'uses_data': True,
+        'options': IMPUTATION_OPTIONS,
+        'run': run_relationship_summary,
+    },
+}
+
+
+# ---------------------------------------------------------------------------
+# 内存中的中间结果：首次使用时计算，上游步骤被跳过时从产物文件读取
+# ---------------------------------------------------------------------------
+
+@profile_stage('load_data')
+def _load_raw(ctx):
+    print(f"加载原始数据: {ctx.data_path}")
+    df = load_survey(ctx.data_path, n_jobs=ctx.n_jobs)
+    print(f"原始数据形状: {df.shape}")
+    return df
+
+
+def _load_processed(ctx):
+    path = ctx.path('processed_data.csv')
+    print(f"加载预处理数据: {path}")
+    return pd.read_csv(path)
+
+
+def _load_analyzer(ctx):
+    from stepfamily_analysis import StepfamilyRelationshipAnalyzer
+
+    # 紧凑模式：分析器只保留分类基本信息、float32 得分与 int8 题目编码
+    analyzer = StepfamilyRelationshipAnalyzer(ctx.data_path, ctx.output_dir, compact=True)
+    analyzer.df = ctx.get('raw')
+    analyzer.calculate_relationship_scores()
+    options = ctx.options
+    if options['imputation'] != 'none' or options['min_completeness'] is not None:
+        analyzer.impute_scores(options['imputation'], options['min_completeness'],
+                               options['n_imputations'], options['seed'], n_jobs=ctx.n_jobs)
+    return analyzer
+
+
+def _load_clusters(ctx):
+    # 类别列写回分析器的 df，聚类步骤与分组分析共用
+    return ctx.get('analyzer').assign_clusters(n_jobs=ctx.n_jobs)
+
+
+def _load_models(ctx):
+    # 回归与中介步骤与总结报告共用
+    return ctx.get('analyzer').fit_relationship_models(n_jobs=ctx.n_jobs)
+
+
+VALUE_LOADERS = {
+    'raw': _load_raw,
+    'processed': _load_processed,
+    'analyzer': _load_analyzer,
+    'clusters': _load_clusters,
+    'models': _load_models,
+}
+
+
+class PipelineContext:
+    """步骤之间共享的配置、内存中间结果与产物记录"""
+
+    def __init__(self, data_path, output_dir, n_jobs, force=False, options=None):
+        self.data_path = data_path
+        self.output_dir = output_dir
+        self.n_jobs = n_jobs
+        self.force = force
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))
+        self._values = {}
+        self._locks = {name: threading.Lock() for name in VALUE_LOADERS}
+        self._outputs = {}
+        self._rebuild = set()
+
+    def path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def get(self, name):
+        """取得中间结果，不存在时计算（并发的步骤只计算一次）"""
+        with self._locks[name]:
+            if name not in self._values:
+                self._values[name] = VALUE_LOADERS[name](self)
+            return self._values[name]
+
+    def set(self, name, value):
+        with self._locks[name]:
+            self._values[name] = value
+
+    def peek(self, name):
+        """已在内存中的中间结果，不存在时返回 None（不计算、不读取文件）"""
+        with self._locks[name]:
+            return self._values.get(name)
+
+    def mark_rebuild(self, step):
+        self._rebuild.add(step)
+
+    def needs_rebuild(self, step):
+        """步骤是否需要全部重新计算（代码或选项变化、没有上次的记录或强制重跑）"""
+        return self.force or step in self._rebuild
+
+    def outputs(self, step):
+        return self._outputs.get(step, [])
+
+    def record_outputs(self, step, paths):
+        self._outputs[step] = list(paths)
+
+
+# ---------------------------------------------------------------------------
+# 摘要与状态
+# ---------------------------------------------------------------------------
+
+def _load_state(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'steps': {}, 'files': {}}
+
+
+def _save_state(state_path, state):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+class FileDigests:
+    """文件内容摘要；大小与修改时间未变化时复用上次记录的摘要，避免重复读取"""
+
+    def __init__(self, records):
+        self.records = records
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        if not os.path.exists(path):
+            return None
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            record = self.records.get(key)
+            if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                return record['sha256']
+        sha = file_sha256(path)
+        with self._lock:
+            self.records[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha}
+        return sha
+
+
+def _data_digest(data_path, digests):
+    """原始数据摘要；多文件来源为各文件摘要与批次/来源标签的组合摘要"""
+    if not is_multi_source(data_path):
+        return digests.digest(data_path)
+    try:
+        sources = resolve_sources(data_path)
+    except FileNotFoundError:
+        return None
+    parts = []
+    for source in sources:
+        digest = digests.digest(source['path'])
+        if digest is None:
+            return None
+        parts.append([source['wave'], source['source'], digest])
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _module_source(name):
+    """项目模块名对应的源文件（相对于项目根目录）；第三方与标准库模块返回 None"""
+    for directory in (ROOT_DIR, SCRIPTS_DIR):
+        path = os.path.join(directory, name.split('.')[0] + '.py')
+        if os.path.exists(path):
+            return os.path.relpath(path, ROOT_DIR)
+    return None
+
+
+@lru_cache(maxsize=None)
+def _project_imports(path):
+    """源文件直接导入的项目模块（包括函数内的延迟导入）"""
+    with open(os.path.join(ROOT_DIR, path), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module)
+    return {source for source in map(_module_source, names) if source and source != path}
+
+
+def step_sources(name):
+    """
+    步骤执行的全部项目源文件：入口源文件及其递归导入的项目模块
+
+    Returns:
+        list: 相对于项目根目录的路径（已排序）
+    """
+    sources = set()
+    stack = list(PIPELINE_STEPS[name]['code'])
+    while stack:
+        path = stack.pop()
+        if path not in sources:
+            sources.add(path)
+            stack.extend(_project_imports(path))
+    return sorted(sources)
+
+
+def _step_key(name, spec, data_digest, code_digests, step_outputs, options):
+    """步骤的键：代码摘要 + 原始数据摘要 + 上游产物的内容摘要 + 相关选项"""
+    key = {
+        'step': name,
+        'code': {path: code_digests[path] for path in step_sources(name)},
+        'data': data_digest if spec['uses_data'] else None,
+        'deps': {dep: step_outputs[dep] for dep in spec['deps']},
+        'options': {option: options[option] for option in spec.get('options', [])},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _code_key(name, spec, code_digests, options):
+    """步骤代码与选项的键（不含数据）：变化时增量步骤需要全部重新计算"""
+    key = {
+        'code': {path: code_digests[path] for path in step_sources(name)},
+        'options': {option: options[option] for option in spec.get('options', [])},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _select_steps(targets):
+    """选择目标步骤及其所有上游步骤"""
+    selected = set()
+    stack = list(targets or PIPELINE_STEPS)
+    while stack:
+        name = stack.pop()
+        if name not in PIPELINE_STEPS:
+            raise KeyError(f"未知的流水线步骤: {name}")
+        if name not in selected:
+            selected.add(name)
+            stack.extend(PIPELINE_STEPS[name]['deps'])
+    return [name for name in PIPELINE_STEPS if name in selected]
+
+
+def run_pipeline(data_path='assets/data.xlsx', output_dir='output', targets=None,
+                 n_jobs=None, force=False, dry_run=False, options=None):
+    """
+    运行流水线
+
+    Args:
+        data_path: 原始数据路径
+        output_dir: 输出目录
+        targets: 要运行的步骤（自动包含上游步骤），默认全部
+        n_jobs: 并发执行的步骤数（也作为步骤内部的并行进程数），默认为 CPU 核数
+        force: 为 True 时忽略状态，全部重新运行
+        dry_run: 只报告各步骤是否需要运行
+        options: 缺失数据处理与分位数精度选项，见 DEFAULT_OPTIONS
+
+    Returns:
+        dict: 步骤名 -> 状态（'ran' / 'skipped' / 'stale'）
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_PATH)
+    state = _load_state(state_path)
+    digests = FileDigests(state.setdefault('files', {}))
+    ctx = PipelineContext(data_path, output_dir, n_jobs, force=force, options=options)
+
+    steps = _select_steps(targets)
+    data_digest = _data_digest(data_path, digests)
+    if data_digest is None:
+        raise FileNotFoundError(f"未找到原始数据文件: {data_path}")
+    code_digests = {path: digests.digest(os.path.join(ROOT_DIR, path))
+                    for name in steps for path in step_sources(name)}
+
+    step_outputs = {}   # 步骤名 -> {产物文件名: 内容摘要}
+    code_keys = {}      # 步骤名 -> 代码与选项的键
+    status = {}
+
+    def plan(name):
+        """判断步骤是否最新；最新时登记其产物并返回 None，否则返回新的键"""
+        spec = PIPELINE_STEPS[name]
+        key = _step_key(name, spec, data_digest, code_digests, step_outputs, ctx.options)
+        code_keys[name] = _code_key(name, spec, code_digests, ctx.options)
+        record = state['steps'].get(name)
+        if not force and record and record['key'] == key and all(
+                digests.digest(os.path.join(output_dir, file)) == sha
+                for file, sha in record['outputs'].items()):
+            step_outputs[name] = record['outputs']
+            ctx.record_outputs(name, [os.path.join(output_dir, file) for file in record['outputs']])
+            return None
+        if not record or record.get('code_key') != code_keys[name]:
+            ctx.mark_rebuild(name)
+        return key
+
+    def execute(name, key):
+        run = profile_stage(f'pipeline:{name}')(PIPELINE_STEPS[name]['run'])
+        outputs = run(ctx) or []
+        return key, outputs
+
+    print("=" * 50)
+    print(f"流水线: {len(steps)} 个步骤，并发数 {n_jobs}")
+    print("=" * 50)
+
+    pending = list(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        while pending or running:
+            # 提交所有上游已完成的步骤
+            for name in list(pending):
+                if any(dep in pending or dep in running.values() for dep in PIPELINE_STEPS[name]['deps']):
+                    continue
+                pending.remove(name)
+                key = plan(name)
+                label = PIPELINE_STEPS[name]['label']
+                if key is None:
+                    status[name] = 'skipped'
+                    print(f"[{name}] {label}: 已是最新，跳过")
+                elif dry_run:
+                    status[name] = 'stale'
+                    step_outputs[name] = {}
+                    print(f"[{name}] {label}: 需要运行")
+                else:
+                    print(f"[{name}] {label}: 开始运行")
+                    running[executor.submit(execute, name, key)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                key, outputs = future.result()
+                relative = {os.path.relpath(path, output_dir): digests.digest(path)
+                            for path in outputs}
+                state['steps'][name] = {'key': key, 'code_key': code_keys[name],
+                                        'outputs': relative}
+                step_outputs[name] = relative
+                ctx.record_outputs(name, outputs)
+                status[name] = 'ran'
+                print(f"[{name}] {PIPELINE_STEPS[name]['label']}: 完成")
+                # 每完成一个步骤保存一次状态，中断后已完成的步骤不必重跑
+                _save_state(state_path, state)
+
+    _save_state(state_path, state)
+    print("=" * 50)
+    n_ran = sum(1 for s in status.values() if s == 'ran')
+    print(f"流水线完成: 运行 {n_ran} 个步骤，跳过 {len(status) - n_ran} 个步骤")
+    return status
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='继家庭关系数据分析流水线')
+    parser.add_argument('--data', default='assets/data.xlsx',
+                        help='原始数据路径；也可以是通配符、目录或 JSON 清单（多批次数据）')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--steps', nargs='+', choices=list(PIPELINE_STEPS), default=None,
+                        help='只运行指定步骤（自动包含上游步骤）')
+    parser.add_argument('--n-jobs', type=int, default=None, help='并发数（默认为CPU核数）')
+    parser.add_argument('--force', action='store_true', help='忽略状态，全部重新运行')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要运行的步骤')
+    parser.add_argument('--imputation', choices=IMPUTATION_METHODS, default='none',
+                        help='缺失数据处理方法：不填补 / 个人均值填补 / 链式方程多重填补')
+    parser.add_argument('--min-completeness', type=float, default=None,
+                        help='量表最低作答比例 (0-1)，低于该比例的参与者不计分')
+    parser.add_argument('--n-imputations', type=int, default=DEFAULT_IMPUTATIONS,
+                        help='多重填补的数据集数')
+    parser.add_argument('--seed', type=int, default=0, help='多重填补的随机种子')
+    parser.add_argument('--quantile-error', type=float, default=None,
+                        help='描述性统计分位数的目标秩误差（如 0.01，使用 KLL 草图近似）；默认精确计算')
+    parser.add_argument('--profile', default=None,
+                        help='记录各阶段耗时与内存并写入该 JSON 文件')
+    parser.add_argument('--cprofile-dir', default=None,
+                        help='同时为每个步骤保存 cProfile 结果 (.prof) 的目录')
+    args = parser.parse_args()
+
+    if args.profile or args.cprofile_dir:
+        enable_profiling(args.profile or os.path.join(args.output_dir, 'run_profile.json'),
+                         args.cprofile_dir)
+
+    run_pipeline(args.data, args.output_dir, targets=args.steps, n_jobs=args.n_jobs,
+                 force=args.force, dry_run=args.dry_run,
+                 options={'imputation': args.imputation,
+                          'min_completeness': args.min_completeness,
+                          'n_imputations': args.n_imputations, 'seed': args.seed,
+                          'quantile_error': args.quantile_error})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+profiling.py
+- 分析阶段的计时与内存记录：墙钟时间、CPU 时间（含子进程）、峰值 RSS、数据行列数
+- 运行结束时输出机器可读的 JSON 运行概况，可选为每个阶段保存 cProfile 结果
+- 默认关闭，开启方式：
+    环境变量 STEPFAMILY_PROFILE=概况文件.json（可选 STEPFAMILY_CPROFILE_DIR=目录）
+    或在代码中调用 enable_profiling()
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录峰值 RSS 与子进程 CPU 时间
+    resource = None
+
+# 概况文件格式版本
+PROFILE_VERSION = 1
+
+# 开启记录的环境变量
+PROFILE_ENV = 'STEPFAMILY_PROFILE'
+CPROFILE_ENV = 'STEPFAMILY_CPROFILE_DIR'
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存 (MB)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def reset_peak_rss():
+    """
+    重置当前进程的峰值常驻内存记录（Linux：向 /proc/self/clear_refs 写入 5），
+    之后 peak_rss_since_reset_mb() 返回重置以来的峰值
+
+    Returns:
+        bool: 系统不支持时返回 False
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def _proc_status_mb(field):
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    """当前进程的常驻内存 (MB)；不支持时返回 None"""
+    return _proc_status_mb('VmRSS')
+
+
+def peak_rss_since_reset_mb():
+    """上次 reset_peak_rss() 以来的峰值常驻内存 (MB)；不支持时返回 None"""
+    return _proc_status_mb('VmHWM')
+
+
+def _children_cpu_s():
+    """已结束的子进程（进程池工作进程）累计的 CPU 时间"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class RunProfiler:
+    """收集一次运行中各阶段的记录"""
+
+    def __init__(self):
+        self.enabled = False
+        self.output_path = None
+        self.cprofile_dir = None
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cprofile_counts = {}
+        # 正在运行的最外层阶段（可能在不同线程中），以及峰值记录被重置前的进程峰值
+        self._active = []
+        self._peak_before_reset_mb = 0.0
+
+    def enable(self, output_path=None, cprofile_dir=None):
+        self.enabled = True
+        self.output_path = output_path
+        self.cprofile_dir = cprofile_dir
+        if cprofile_dir:
+            os.makedirs(cprofile_dir, exist_ok=True)
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        """当前线程中最内层的阶段记录"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _start_cprofile(self, name):
+        # 只对最外层阶段做 cProfile；并发的阶段无法同时启用时跳过
+        if not self.cprofile_dir or len(self._stack()) > 1:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None
+        return profiler
+
+    def _dump_cprofile(self, name, profiler):
+        profiler.disable()
+        with self._lock:
+            index = self._cprofile_counts.get(name, 0) + 1
+            self._cprofile_counts[name] = index
+        safe_name = re.sub(r'[^\w.-]', '_', name)
+        path = os.path.join(self.cprofile_dir, f'{safe_name}_{index}.prof')
+        profiler.dump_stats(path)
+        return path
+
+    def _begin_peak_window(self, record):
+        """
+        最外层阶段开始时重置进程的峰值 RSS 记录，使阶段结束时读到的是该阶段自身的峰值；
+        与其他线程中的最外层阶段重叠时不能重置，各重叠阶段记录的是重叠期间的共同峰值
+        """
+        with self._lock:
+            if self._active:
+                scope = 'concurrent' if self._active[0]['peak_rss_scope'] != 'process' else 'process'
+                for other in self._active:
+                    if other['peak_rss_scope'] == 'stage':
+                        other['peak_rss_scope'] = 'concurrent'
+            else:
+                # 重置会同时清除 ru_maxrss，先保留此前的进程峰值
+                self._peak_before_reset_mb = max(self._peak_before_reset_mb, peak_rss_mb() or 0.0)
+                scope = 'stage' if reset_peak_rss() else 'process'
+            record['peak_rss_scope'] = scope
+            self._active.append(record)
+
+    def _end_peak_window(self, record):
+        with self._lock:
+            self._active.remove(record)
+
+    def _window_scope(self):
+        """内层阶段的峰值范围：所在最外层阶段开始以来（已重置时）或进程累计"""
+        with self._lock:
+            if self._active and self._active[0]['peak_rss_scope'] != 'process':
+                return 'enclosing'
+            return 'process'
+
+    def run_peak_rss_mb(self):
+        """整个运行期间的进程峰值 RSS (MB)，包括峰值记录被重置之前的部分"""
+        peak = peak_rss_mb()
+        if peak is None:
+            return None
+        return max(peak, self._peak_before_reset_mb)
+
+    def run_stage(self, name, func, args, kwargs):
+        record = {
+            'stage': name,
+            'function': f'{func.__module__}.{func.__qualname__}',
+            'thread': threading.current_thread().name,
+            'depth': len(self._stack()),
+            'start_s': round(time.perf_counter() - self.started, 6),
+            'rows': None,
+            'columns': None,
+        }
+        stack = self._stack()
+        # 峰值 RSS：最外层阶段为该阶段自身的峰值（'stage'），与其他线程中的阶段重叠时为共同峰值
+        # ('concurrent')；内层阶段为所在最外层阶段开始以来的峰值（'enclosing'）；
+        # 不支持重置峰值记录的系统上为进程累计峰值（'process'）
+        top_level = record['depth'] == 0
+        rss_before = rss_mb()
+        if top_level:
+            self._begin_peak_window(record)
+        else:
+            record['peak_rss_scope'] = self._window_scope()
+        stack.append(record)
+        profiler = self._start_cprofile(name)
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        children = _children_cpu_s()
+        peak_before = peak_rss_mb()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            record['error'] = None
+            return result
+        except BaseException as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            # 进程级 CPU 时间：并发执行的阶段会互相计入
+            record['cpu_s'] = round(time.process_time() - cpu, 6)
+            record['children_cpu_s'] = round(_children_cpu_s() - children, 6)
+            if record['peak_rss_scope'] == 'process':
+                peak_after = peak_rss_mb()
+                growth = None if peak_after is None else peak_after - peak_before
+            else:
+                peak_after = peak_rss_since_reset_mb()
+                growth = (None if peak_after is None or rss_before is None
+                          else peak_after - rss_before)
+            record['peak_rss_mb'] = None if peak_after is None else round(peak_after, 1)
+            record['peak_rss_growth_mb'] = None if growth is None else round(growth, 1)
+            if top_level:
+                self._end_peak_window(record)
+            if profiler is not None:
+                record['cprofile'] = self._dump_cprofile(name, profiler)
+            if record['rows'] is None:
+                _annotate_from_call(record, args, result)
+            stack.pop()
+            with self._lock:
+                self.stages.append(record)
+
+    def to_dict(self):
+        with self._lock:
+            stages = sorted(self.stages, key=lambda r: r['start_s'])
+        return {
+            'version': PROFILE_VERSION,
+            'started_at': self.started_at,
+            'total_wall_s': round(time.perf_counter() - self.started, 6),
+            'peak_rss_mb': self.run_peak_rss_mb(),
+            'argv': sys.argv,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'stages': stages,
+        }
+
+    def write(self, path=None):
+        path = path or self.output_path
+        if not path:
+            return None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _frame_shape(obj):
+    shape = getattr(obj, 'shape', None)
+    if shape is not None and len(shape) == 2 and hasattr(obj, 'columns'):
+        return shape
+    return None
+
+
+def _annotate_from_call(record, args, result):
+    """
+    未显式调用 annotate() 时自动推断数据规模：
+    返回值为 DataFrame 时取其形状，否则取方法所属对象的 df 属性
+    """
+    shape = _frame_shape(result)
+    if shape is None and args:
+        shape = _frame_shape(getattr(args[0], 'df', None))
+    if shape is not None:
+        record['rows'], record['columns'] = int(shape[0]), int(shape[1])
+
+
+# 全局记录器
+PROFILER = RunProfiler()
+
+
+def enable_profiling(output_path=None, cprofile_dir=None):
+    """
+    开启阶段记录
+
+    Args:
+        output_path: 概况 JSON 文件路径，进程退出时自动写入；为 None 时只在内存中记录
+        cprofile_dir: 保存每个阶段 cProfile 结果 (.prof) 的目录，为 None 时不做 cProfile
+    """
+    first = not PROFILER.enabled
+    PROFILER.enable(output_path, cprofile_dir)
+    if first and output_path:
+        atexit.register(PROFILER.write)
+    return PROFILER
+
+
+def write_profile(path=None):
+    """立即写出概况 JSON，返回文件路径"""
+    return PROFILER.write(path)
+
+
+def profile_stage(name=None):
+    """
+    装饰器：记录被装饰函数作为一个分析阶段的耗时与内存
+
+    Args:
+        name: 阶段名，默认为函数名
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            return PROFILER.run_stage(stage_name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(df=None, rows=None, columns=None):
+    """
+    为当前阶段记录数据规模（未开启记录时无操作）
+    """
+    record = PROFILER.current() if PROFILER.enabled else None
+    if record is None:
+        return
+    if df is not None:
+        rows, columns = df.shape
+    if rows is not None:
+        record['rows'] = int(rows)
+    if columns is not None:
+        record['columns'] = int(columns)
+
+
+# 通过环境变量开启（进程池的工作进程不记录，避免覆盖主进程的概况文件）
+if os.environ.get(PROFILE_ENV) and multiprocessing.parent_process() is None:
+    enable_profiling(os.environ[PROFILE_ENV], os.environ.get(CPROFILE_ENV) or None)
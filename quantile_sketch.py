@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+quantile_sketch.py
+- KLL 分位数草图 (Karnin, Lang & Liberty, 2016)：以有界内存近似任意分位数，可以合并不同数据块、进程的草图
+- 草图由若干层"压缩器"组成，第 h 层的每个值代表 2^h 个原始值；某层超出容量时排序后随机保留奇数位或偶数位的值，
+  送入上一层。高层容量为 k，向下按 2/3 递减，总容量约 3k
+- 秩误差（误差占样本数的比例）约为 2.3 / k^0.97（99% 置信度），`KLLSketch.for_error(eps)` 按目标误差选择 k
+- 尚未发生压缩时（样本数不超过第 0 层容量）分位数与 np.quantile 完全一致
+"""
+
+import math
+
+import numpy as np
+
+# 默认的高层压缩器容量（秩误差约 1.3%）
+DEFAULT_K = 200
+
+# 各层容量的递减比例与最小容量
+CAPACITY_RATIO = 2 / 3
+MIN_CAPACITY = 8
+
+
+def k_for_error(eps):
+    """
+    目标秩误差对应的 k（按 DataSketches 对 KLL 草图误差的经验拟合：eps ≈ 2.296 / k^0.9723）
+
+    Args:
+        eps: 目标秩误差（0-1 之间，例如 0.01 表示 1%）
+    """
+    if not 0 < eps < 1:
+        raise ValueError(f"分位数误差需在 0 与 1 之间: {eps}")
+    return max(MIN_CAPACITY, math.ceil((2.296 / eps) ** (1 / 0.9723)))
+
+
+class KLLSketch:
+    """可合并的 KLL 分位数草图"""
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        """
+        Args:
+            k: 高层压缩器容量，越大越精确（内存约 3k 个浮点数）
+            seed: 压缩时随机选择的种子
+        """
+        self.k = int(k)
+        self.rng = np.random.default_rng(seed)
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+
+    @classmethod
+    def for_error(cls, eps, seed=None):
+        """按目标秩误差创建草图"""
+        return cls(k_for_error(eps), seed=seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(MIN_CAPACITY, math.ceil(self.k * CAPACITY_RATIO ** depth))
+
+    def _compact(self, h):
+        """压缩第 h 层：排序后随机保留一半送入第 h+1 层（奇数个时留下一个）"""
+        if h + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+        level = np.sort(self.levels[h])
+        keep = level[:0]
+        if len(level) % 2:
+            # 随机留下最小或最大的一个，避免系统性偏差
+            if self.rng.integers(2):
+                keep, level = level[-1:], level[:-1]
+            else:
+                keep, level = level[:1], level[1:]
+        promoted = level[self.rng.integers(2)::2]
+        self.levels[h] = keep
+        self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def _compress(self):
+        """总量超出容量时，逐次压缩最低的超出容量的层"""
+        while True:
+            sizes = [len(level) for level in self.levels]
+            if sum(sizes) <= sum(self._capacity(h) for h in range(len(self.levels))):
+                return
+            h = next(h for h, size in enumerate(sizes) if size >= self._capacity(h))
+            self._compact(h)
+
+    def update(self, values):
+        """
+        加入一批数值（缺失值忽略）
+
+        Args:
+            values: 一维数组
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        合并另一个草图（例如其他数据块或其他进程的草图）
+        """
+        if other.k != self.k:
+            raise ValueError(f"草图的 k 不一致，无法合并: {self.k} != {other.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self._compress()
+        return self
+
+    @property
+    def size(self):
+        """草图中保存的值的个数"""
+        return sum(len(level) for level in self.levels)
+
+    def quantile(self, q):
+        """
+        近似分位数（线性插值，定义同 np.quantile）
+
+        Args:
+            q: 分位点或分位点数组（0-1）
+
+        Returns:
+            float 或 ndarray
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.n == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], q)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h)
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+
+        # 第 i 个（从 0 计）原始值近似为累计权重首次超过 i 的草图值；两端用精确的最小/最大值
+        def value_at(position):
+            idx = np.searchsorted(cumulative, position, side='right')
+            value = items[np.minimum(idx, len(items) - 1)]
+            value = np.where(position <= 0, self.min, value)
+            return np.where(position >= self.n - 1, self.max, value)
+
+        rank = q * (self.n - 1)
+        lower = np.floor(rank)
+        lo, hi = value_at(lower), value_at(np.minimum(lower + 1, self.n - 1))
+        result = lo + (hi - lo) * (rank - lower)
+        return result if q.ndim else float(result)
+
+    def rank(self, value):
+        """值 value 的近似秩（不大于 value 的原始值所占比例）"""
+        if self.n == 0:
+            return np.nan
+        total = sum(np.count_nonzero(level <= value) * 2.0 ** h
+                    for h, level in enumerate(self.levels))
+        return total / self.n
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+reliability.py
+- 量表信度分析：Cronbach's alpha、McDonald's omega、删除该题后的 alpha、校正的题目-总分相关
+- 每个量表（每个分组）只计算一次题目协方差矩阵，所有指标都由协方差矩阵推出；
+  各分组的协方差矩阵堆叠后批量计算
+- 直接使用 CompiledScaleRegistry 的编码矩阵（已反向计分），题目-总分相关为负时提示可能漏掉了反向计分
+"""
+
+import numpy as np
+import pandas as pd
+
+from likert_encoding import MISSING_CODE
+from paired_tests import ALL_GROUP
+from scale_registry import SCALE_REGISTRY
+
+# 主轴因子分析的迭代次数与共同度上限
+FACTOR_ITERATIONS = 50
+MAX_COMMUNALITY = 0.995
+
+# 低于该值的校正题目-总分相关视为区分度不足
+MIN_ITEM_TOTAL = 0.2
+
+
+def _complete_block(codes, positions):
+    """取出某量表的题目，返回 (float64 矩阵, 所有题目均非缺失的行掩码)"""
+    block = codes[:, positions]
+    if block.dtype == np.int8:
+        complete = (block != MISSING_CODE).all(axis=1)
+    else:
+        complete = ~np.isnan(block).any(axis=1)
+    return block.astype(np.float64), complete
+
+
+def _group_covariances(values, group_codes, n_groups):
+    """
+    按分组计算协方差矩阵（listwise：只用所有题目均非缺失的行）
+
+    Args:
+        values: (n, k) 完整行的题目得分
+        group_codes: (n,) 分组编号，0 为全体以外的第一个分组；-1 表示只计入全体
+        n_groups: 分组数（不含全体）
+
+    Returns:
+        (counts, means, covariances)，第 0 个为全体，形状分别为 (g+1,)、(g+1, k)、(g+1, k, k)
+    """
+    k = values.shape[1]
+    counts = np.zeros(n_groups + 1, dtype=np.int64)
+    means = np.full((n_groups + 1, k), np.nan)
+    covariances = np.full((n_groups + 1, k, k), np.nan)
+
+    # 按分组排序后每个分组是连续的一段，每段一次矩阵乘法
+    order = np.argsort(group_codes, kind='stable')
+    sorted_codes = group_codes[order]
+    bounds = np.searchsorted(sorted_codes, np.arange(-1, n_groups + 1))
+    segments = [(0, 0, len(values))]
+    segments += [(g + 1, bounds[g + 1], bounds[g + 2]) for g in range(n_groups)]
+
+    for slot, start, stop in segments:
+        rows = values if slot == 0 else values[order[start:stop]]
+        n = len(rows)
+        counts[slot] = n
+        if n < 2:
+            continue
+        means[slot] = rows.mean(axis=0)
+        centered = rows - means[slot]
+        covariances[slot] = centered.T @ centered / (n - 1)
+    return counts, means, covariances
+
+
+def _one_factor_loadings(correlations):
+    """
+    单因子主轴因子分析的标准化载荷（对堆叠的相关矩阵批量计算）
+
+    Args:
+        correlations: (g, k, k) 相关矩阵
+
+    Returns:
+        (g, k) 载荷，符号使载荷之和为正
+    """
+    g, k, _ = correlations.shape
+    valid = np.isfinite(correlations).all(axis=(1, 2))
+    loadings = np.full((g, k), np.nan)
+    if not valid.any():
+        return loadings
+    r = correlations[valid]
+
+    # 初始共同度：多元相关平方 (SMC)
+    communality = 1 - 1 / np.diagonal(np.linalg.pinv(r), axis1=1, axis2=2)
+    communality = np.clip(communality, 0.0, MAX_COMMUNALITY)
+    diagonal = np.arange(k)
+    for _ in range(FACTOR_ITERATIONS):
+        reduced = r.copy()
+        reduced[:, diagonal, diagonal] = communality
+        eigenvalues, eigenvectors = np.linalg.eigh(reduced)
+        lam = eigenvectors[:, :, -1] * np.sqrt(np.maximum(eigenvalues[:, -1], 0.0))[:, np.newaxis]
+        communality = np.clip(lam * lam, 0.0, MAX_COMMUNALITY)
+
+    lam *= np.where(lam.sum(axis=1, keepdims=True) < 0, -1.0, 1.0)
+    loadings[valid] = lam
+    return loadings
+
+
+def reliability_from_covariances(covariances):
+    """
+    由堆叠的协方差矩阵计算信度指标
+
+    Args:
+        covariances: (g, k, k) 题目协方差矩阵
+
+    Returns:
+        dict: 量表级指标 alpha / omega / average_r 为 (g,)；
+              题目级指标 item_total_r / alpha_if_deleted / loading 为 (g, k)
+    """
+    k = covariances.shape[-1]
+    item_var = np.diagonal(covariances, axis1=1, axis2=2)
+    row_sums = covariances.sum(axis=2)
+    total_var = row_sums.sum(axis=1)
+    sum_item_var = item_var.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        alpha = k / (k - 1) * (1 - sum_item_var / total_var)
+
+        # 题目与其余题目总分：cov = 行和 - 自身方差，其余总分方差 = 总方差 - 2*行和 + 自身方差
+        rest_var = total_var[:, np.newaxis] - 2 * row_sums + item_var
+        item_total_r = (row_sums - item_var) / np.sqrt(item_var * rest_var)
+        if k > 2:
+            alpha_if_deleted = (k - 1) / (k - 2) * (
+                1 - (sum_item_var[:, np.newaxis] - item_var) / rest_var)
+        else:
+            alpha_if_deleted = np.full_like(item_var, np.nan)
+
+        sd = np.sqrt(item_var)
+        correlations = covariances / (sd[:, :, np.newaxis] * sd[:, np.newaxis, :])
+        off_diagonal = ~np.eye(k, dtype=bool)
+        average_r = correlations[:, off_diagonal].mean(axis=1)
+
+    loadings = _one_factor_loadings(correlations)
+    common = loadings.sum(axis=1) ** 2
+    unique = (1 - loadings * loadings).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        omega = common / (common + unique)
+
+    return {
+        'alpha': alpha,
+        'omega': omega,
+        'average_r': average_r,
+        'item_total_r': item_total_r,
+        'alpha_if_deleted': alpha_if_deleted,
+        'loading': loadings,
+    }
+
+
+def scale_reliability(codes, scales, names=None, group_by=None):
+    """
+    计算各量表（及各分组）的信度
+
+    Args:
+        codes: CompiledScaleRegistry.encode 得到并已反向计分的编码矩阵
+        scales: CompiledScaleRegistry
+        names: 量表名列表，默认为全部量表
+        group_by: 可选的分组变量（与 codes 行对齐），每个分组分别计算
+
+    Returns:
+        (量表级结果, 题目级结果) 两个 DataFrame
+    """
+    names = scales.names if names is None else names
+    if group_by is None:
+        group_codes = np.full(len(codes), -1, dtype=np.intp)
+        groups = [ALL_GROUP]
+    else:
+        group_codes, uniques = pd.factorize(pd.Series(group_by).reset_index(drop=True),
+                                            use_na_sentinel=True)
+        groups = [ALL_GROUP] + [str(value) for value in uniques]
+
+    summaries = []
+    items = []
+    for name in names:
+        positions = scales.scale_positions[name]
+        k = len(positions)
+        if k < 2:
+            continue
+        values, complete = _complete_block(codes, positions)
+        counts, means, covariances = _group_covariances(
+            values[complete], group_codes[complete], len(groups) - 1)
+        stats = reliability_from_covariances(covariances)
+
+        reverse = set(SCALE_REGISTRY[name]['reverse'])
+        column_numbers = scales.column_indices[positions] + 1
+        item_names = scales.item_names(name)
+        for slot, group in enumerate(groups):
+            summaries.append({
+                'scale': name, 'group': group, 'n': int(counts[slot]), 'n_items': k,
+                'alpha': stats['alpha'][slot], 'omega': stats['omega'][slot],
+                'average_r': stats['average_r'][slot],
+            })
+            items.append(pd.DataFrame({
+                'scale': name, 'group': group, 'item': item_names,
+                'column': column_numbers, 'reversed': [j in reverse for j in range(k)],
+                'mean': means[slot], 'sd': np.sqrt(np.diagonal(covariances[slot])),
+                'item_total_r': stats['item_total_r'][slot],
+                'alpha_if_deleted': stats['alpha_if_deleted'][slot],
+                'loading': stats['loading'][slot],
+            }))
+
+    summary = pd.DataFrame(summaries)
+    item_results = pd.concat(items, ignore_index=True) if items else pd.DataFrame()
+    if not item_results.empty:
+        # 负相关通常意味着反向计分列表有误；区分度低或删除后 alpha 上升的题目需要复核
+        scale_alpha = item_results[['scale', 'group']].merge(
+            summary[['scale', 'group', 'alpha']], on=['scale', 'group'], how='left')['alpha']
+        item_results['flag'] = np.select(
+            [item_results['item_total_r'] < 0,
+             item_results['item_total_r'] < MIN_ITEM_TOTAL,
+             item_results['alpha_if_deleted'].to_numpy() > scale_alpha.to_numpy()],
+            ['负相关，检查反向计分', '区分度低', '删除后alpha上升'], default='')
+    return summary, item_results
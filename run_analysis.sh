@@ -11,22 +11,12 @@ echo "===   开始执行继家庭关系数据分析流程   ==="
 echo "========================================="
 echo
 
-# 步骤 1: 数据预处理
-echo "--- 步骤 1: 执行数据预处理脚本 ---"
-python3 scripts/01_preprocess_data.py
-echo "--- 数据预处理完成 ---"
-echo
-
-# 步骤 2: 相关性分析
-echo "--- 步骤 2: 执行相关性分析脚本 ---"
-python3 scripts/02_correlation_analysis.py
-echo "--- 相关性分析完成 ---"
-echo
-
-# 步骤 3: 结果可视化
-echo "--- 步骤 3: 执行结果可视化脚本 ---"
-python3 scripts/03_visualize_results.py
-echo "--- 结果可视化完成 ---"
+# 由 pipeline.py 按依赖关系执行全部步骤：
+# 预处理 -> 相关性分析 -> 可视化，以及继家庭关系分析器的各阶段
+# 输入与代码未变化的步骤自动跳过，相互独立的步骤并发执行；
+# 预处理按增量模式只对新增参与者计分（等同于 01_preprocess_data.py --incremental）
+# 额外参数会传给 pipeline.py，例如: ./run_analysis.sh --force
+python3 pipeline.py "$@"
 echo
 
 echo "========================================"
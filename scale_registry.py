@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scale_registry.py
+- 各量表的声明式定义（题目列、反向计分题、量表最大值、分量表）
+- 按数据列数编译一次，得到预先计算好的整数索引数组与掩码
+- 预处理脚本与关系分析器共用同一套编码、反向计分与计分逻辑
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from likert_encoding import (LIKERT_5_POINT_MAPPING, MISSING_CODE, decode_likert_block,
+                             encode_likert_block, reverse_score_block)
+
+# 量表定义
+# items: 题目所在的列索引 (pandas iloc，从0开始)
+# reverse: 反向计分题在 items 中的位置 (从0开始)
+# subscales: 分量表名 -> 题目在 items 中的位置
+SCALE_REGISTRY = {
+    # 关系质量 (继父母 - 过去)，对应Excel列 Y(25) 到 AZ(52)
+    'stepparent_past': {
+        'label': '继父母关系-过去',
+        'items': list(range(24, 52)),
+        # 反向题: 3, 5, 7, 9, 10, 11, 12, 15, 18, 19, 22, 25, 27
+        'reverse': [2, 4, 6, 8, 9, 10, 11, 14, 17, 18, 21, 24, 26],
+        'scale_max': 5,
+        'score_name': 'rel_stepparent_past',
+        'subscales': {},
+    },
+    # 关系质量 (继父母 - 现在)
+    'stepparent_current': {
+        'label': '继父母关系-现在',
+        'items': list(range(52, 80)),
+        # 假设反向题结构与过去相同
+        'reverse': [2, 4, 6, 8, 9, 10, 11, 14, 17, 18, 21, 24, 26],
+        'scale_max': 5,
+        'score_name': 'rel_stepparent_current',
+        'subscales': {},
+    },
+    # 关系质量 (生身父母 - 过去)
+    'bioparent_past': {
+        'label': '生身父母关系-过去',
+        'items': list(range(136, 152)),
+        # 反向题: 1, 4, 6, 7, 9, 10, 15, 16
+        'reverse': [0, 3, 5, 6, 8, 9, 14, 15],
+        'scale_max': 5,
+        'score_name': 'rel_bioparent_past',
+        'subscales': {},
+    },
+    # 关系质量 (生身父母 - 现在)
+    'bioparent_current': {
+        'label': '生身父母关系-现在',
+        'items': list(range(152, 168)),
+        # 假设反向题结构与过去相同
+        'reverse': [0, 3, 5, 6, 8, 9, 14, 15],
+        'scale_max': 5,
+        'score_name': 'rel_bioparent_current',
+        'subscales': {},
+    },
+    # 自尊量表
+    'self_esteem': {
+        'label': '自尊',
+        'items': list(range(215, 225)),
+        # 反向题: 2, 5, 6, 8, 9
+        'reverse': [1, 4, 5, 7, 8],
+        'scale_max': 5,
+        'score_name': 'mental_self_esteem',
+        'subscales': {},
+    },
+    # 自责
+    'self_blame': {
+        'label': '自责',
+        'items': list(range(225, 232)),
+        'reverse': [],
+        'scale_max': 5,
+        'score_name': 'mental_self_blame',
+        'subscales': {},
+    },
+    # 焦虑 (GAD-7)
+    'anxiety': {
+        'label': '焦虑',
+        'items': list(range(261, 268)),
+        'reverse': [],
+        'scale_max': 5,
+        'score_name': 'mental_anxiety',
+        'subscales': {},
+    },
+    # 抑郁 (PHQ-9)
+    'depression': {
+        'label': '抑郁',
+        'items': list(range(268, 277)),
+        'reverse': [],
+        'scale_max': 5,
+        'score_name': 'mental_depression',
+        'subscales': {},
+    },
+}
+
+# 预处理输出 (processed_data.csv) 中包含的量表，按输出顺序排列
+PROCESSED_SCALES = [
+    'stepparent_past', 'stepparent_current',
+    'bioparent_past', 'bioparent_current',
+    'self_esteem', 'anxiety', 'depression'
+]
+
+
+class CompiledScaleRegistry:
+    """按数据列数编译后的量表注册表"""
+
+    def __init__(self, registry, n_columns):
+        """
+        Args:
+            registry: 量表定义字典 (格式同 SCALE_REGISTRY)
+            n_columns: 原始数据的列数，超出范围的题目会被忽略
+        """
+        self.registry = registry
+        self.n_columns = n_columns
+        self.names = list(registry)
+
+        # 所有量表题目的并集，编码时只处理这些列
+        all_items = sorted({i for spec in registry.values()
+                            for i in spec['items'] if i < n_columns})
+        self.column_indices = np.array(all_items, dtype=np.intp)
+        position = {col_idx: pos for pos, col_idx in enumerate(all_items)}
+
+        self.scale_positions = {}
+        self.subscale_positions = {}
+        # 按量表最大值分组的反向计分掩码
+        self.reverse_masks = {}
+        for name, spec in registry.items():
+            items = spec['items']
+            self.scale_positions[name] = np.array(
+                [position[i] for i in items if i < n_columns], dtype=np.intp)
+
+            mask = self.reverse_masks.setdefault(
+                spec['scale_max'], np.zeros(len(all_items), dtype=bool))
+            for idx in spec['reverse']:
+                if idx < len(items) and items[idx] < n_columns:
+                    mask[position[items[idx]]] = True
+
+            for sub_name, sub_items in spec.get('subscales', {}).items():
+                self.subscale_positions[(name, sub_name)] = np.array(
+                    [position[items[i]] for i in sub_items
+                     if i < len(items) and items[i] < n_columns], dtype=np.intp)
+
+    @property
+    def n_reverse_items(self):
+        return int(sum(mask.sum() for mask in self.reverse_masks.values()))
+
+    def item_columns(self, columns, name):
+        """返回某量表对应的列名列表"""
+        return [columns[i] for i in self.column_indices[self.scale_positions[name]]]
+
+    def item_names(self, name):
+        """某量表题目在题目级数据中的列名：量表名_题号"""
+        return [f'{name}_{j:02d}' for j in range(1, len(self.scale_positions[name]) + 1)]
+
+    def item_frame(self, codes, names=None, index=None):
+        """
+        将编码矩阵中若干量表的题目转换为 DataFrame（float64，缺失值为 NaN）
+        """
+        names = self.names if names is None else names
+        positions = np.concatenate([self.scale_positions[name] for name in names])
+        columns = [col for name in names for col in self.item_names(name)]
+        return pd.DataFrame(decode_likert_block(codes[:, positions]),
+                            columns=columns, index=index)
+
+    def encode(self, df, mapping=LIKERT_5_POINT_MAPPING):
+        """
+        将所有量表题目一次性编码为二维矩阵（列顺序同 column_indices）
+        """
+        return encode_likert_block(df.iloc[:, self.column_indices], mapping)
+
+    def reverse_score(self, codes):
+        """原地对编码矩阵中的所有反向计分题进行计分"""
+        for scale_max, mask in self.reverse_masks.items():
+            if mask.any():
+                reverse_score_block(codes, mask, scale_max=scale_max)
+        return codes
+
+    def _mean_score(self, codes, positions):
+        """对一组列做一次取数 + 行均值（忽略缺失值）"""
+        block = codes[:, positions]
+        if block.dtype == np.int8:
+            valid = block != MISSING_CODE
+            totals = np.where(valid, block, 0).sum(axis=1, dtype=np.float64)
+        else:
+            valid = ~np.isnan(block)
+            totals = np.where(valid, block, 0.0).sum(axis=1)
+        counts = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    def score(self, codes, names=None):
+        """
+        计算量表得分（题目均值）
+
+        Returns:
+            dict: 量表名 -> 得分数组
+        """
+        names = self.names if names is None else names
+        return {name: self._mean_score(codes, self.scale_positions[name])
+                for name in names}
+
+    def score_subscales(self, codes):
+        """
+        计算分量表得分
+
+        Returns:
+            dict: (量表名, 分量表名) -> 得分数组
+        """
+        return {key: self._mean_score(codes, positions)
+                for key, positions in self.subscale_positions.items()}
+
+
+@lru_cache(maxsize=None)
+def compile_scale_registry(n_columns):
+    """
+    按数据列数编译默认量表注册表（同一列数只编译一次）
+    """
+    return CompiledScaleRegistry(SCALE_REGISTRY, n_columns)
@@ -5,194 +5,478 @@
 - 加载原始数据
 - 将文本答案转换为数值
 - 处理反向计分题
+- 可选的缺失数据处理：最低作答比例、个人均值填补、链式方程多重填补
 - 计算各量表综合得分
 - 保存处理后的数据
+- 可选保存紧凑表示 (int8 题目编码 + 分类基本信息 + float32 得分) 的 Parquet 文件
 """
 
+import argparse
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 import os
-import re
+import sys
 
-def clean_demographic_column(series):
-    """
-    清洗包含年龄范围或文本的列，将其转换为数值。
-    例如 '1-3年' -> 2, '小于1年' -> 0.5, '18' -> 18
-    """
-    def convert_value(val):
-        if pd.isna(val):
-            return np.nan
-        
-        # 如果已经是数字，直接返回
-        if isinstance(val, (int, float)):
-            return float(val)
-
-        val_str = str(val)
-        
-        # 处理 "X-Y年" 格式
-        match = re.search(r'(\d+)-(\d+)', val_str)
-        if match:
-            return (float(match.group(1)) + float(match.group(2))) / 2
-        
-        # 处理 "大于X年" 格式
-        match = re.search(r'大于(\d+)', val_str)
-        if match:
-            return float(match.group(1)) + 5 # 假设一个开放区间的增量
-
-        # 处理 "小于X年" 格式
-        match = re.search(r'小于(\d+)', val_str)
-        if match:
-            return float(match.group(1)) / 2
-
-        # 处理单个数字
-        match = re.search(r'(\d+)', val_str)
-        if match:
-            return float(match.group(1))
-            
-        return np.nan # 如果没有匹配，返回NaN
-
-    return series.apply(convert_value)
-
-def preprocess_data(input_path='assets/data.xlsx', output_dir='output'):
+# 使脚本可以导入项目根目录下的共享模块
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from compact_survey import CompactSurvey, processed_score_columns
+from demographics import DEMOGRAPHIC_COLUMNS, clean_demographic_column
+from imputation import (DEFAULT_IMPUTATIONS, IMPUTATION_METHODS, save_imputations,
+                        score_imputations)
+from likert_encoding import LIKERT_5_POINT_MAPPING
+from profiling import annotate, profile_stage
+from reliability import scale_reliability
+from data_loader import file_sha256
+from correlation_accumulator import (PairwiseCorrelationAccumulator, STATE_DIR_NAME,
+                                     default_state_path, file_signature,
+                                     load_current_accumulator, save_accumulator_state)
+from scale_registry import SCALE_REGISTRY, PROCESSED_SCALES, compile_scale_registry
+from survey_ingestion import WAVE_COLUMN, load_survey
+
+@profile_stage()
+def process_frame(df, verbose=True, imputation='none', min_completeness=None,
+                  n_imputations=DEFAULT_IMPUTATIONS, seed=0, n_jobs=None,
+                  return_imputations=False):
     """
-    执行完整的数据预处理流程
+    对一批原始数据进行编码、反向计分、计算综合得分并清洗人口学变量
+    返回只包含人口学变量与综合得分的 DataFrame
+
+    Args:
+        df: 原始数据
+        verbose: 是否打印进度
+        imputation: 缺失数据处理方法 'none' / 'person_mean' / 'mice'
+        min_completeness: 量表最低作答比例，低于该比例不计分；None 表示不限制
+        n_imputations: 多重填补的数据集数
+        seed: 多重填补的随机种子
+        n_jobs: 多重填补的并行进程数
+        return_imputations: 为 True 时返回 (DataFrame, 各填补数据集列表)；
+                            多重填补时 DataFrame 中的得分为各填补数据集的均值
     """
-    print("--- 开始数据预处理 ---")
+    log = print if verbose else (lambda *args, **kwargs: None)
 
-    # 确保输出目录存在
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 1. 加载数据
-    print(f"加载原始数据: {input_path}")
-    df = pd.read_excel(input_path, header=0)
-    print(f"原始数据形状: {df.shape}")
+    # 2. 文本到数值的映射见 likert_encoding.LIKERT_5_POINT_MAPPING
+    # 3. 需要处理的列和反向计分题见 scale_registry.SCALE_REGISTRY
+    #    按当前数据列数编译为整数索引数组与反向计分掩码
+    scales = compile_scale_registry(len(df.columns))
 
-    # 2. 定义文本到数值的映射
-    # 这是根据常见的李克特5点量表进行的假设，可能需要根据实际问卷调整
-    likert_5_point_mapping = {
-        '几乎从不或从不': 1,
-        '很少如此': 2,
-        '有时如此': 3,
-        '通常如此': 4,
-        '几乎总是或总是如此': 5
-    }
-    
-    # 3. 定义需要处理的列和反向计分题
-    # 列索引从0开始 (pandas iloc)
-    
-    # 关系质量 (继父母 - 过去)
-    stepparent_past_cols = list(range(24, 52)) # 对应Excel列 Y(25) 到 AZ(52)
-    # 反向题: 3, 5, 7, 9, 10, 11, 12, 15, 18, 19, 22, 25, 27
-    stepparent_past_reverse = [2, 4, 6, 8, 9, 10, 11, 14, 17, 18, 21, 24, 26] 
-
-    # 关系质量 (继父母 - 现在)
-    stepparent_current_cols = list(range(52, 80))
-    # 假设反向题结构与过去相同
-    stepparent_current_reverse = [2, 4, 6, 8, 9, 10, 11, 14, 17, 18, 21, 24, 26] 
-
-    # 关系质量 (生身父母 - 过去)
-    bioparent_past_cols = list(range(136, 152))
-    # 反向题: 1, 4, 6, 7, 9, 10, 15, 16
-    bioparent_past_reverse = [0, 3, 5, 6, 8, 9, 14, 15]
-
-    # 关系质量 (生身父母 - 现在)
-    bioparent_current_cols = list(range(152, 168))
-    # 假设反向题结构与过去相同
-    bioparent_current_reverse = [0, 3, 5, 6, 8, 9, 14, 15]
-
-    # 自尊量表
-    self_esteem_cols = list(range(215, 225))
-    # 反向题: 2, 5, 6, 8, 9
-    self_esteem_reverse = [1, 4, 5, 7, 8]
-
-    # 焦虑 (GAD-7)
-    anxiety_cols = list(range(261, 268))
-
-    # 抑郁 (PHQ-9)
-    depression_cols = list(range(268, 277))
-    
-    # --- 开始数据转换 ---
-    
-    all_scale_cols = (stepparent_past_cols + stepparent_current_cols +
-                      bioparent_past_cols + bioparent_current_cols +
-                      self_esteem_cols + anxiety_cols + depression_cols)
-    
-    # 获取唯一的列索引
-    unique_cols_indices = sorted(list(set(all_scale_cols)))
-
-    # 统一应用映射
-    print("将文本答案转换为数值...")
-    df_columns_to_process = df.iloc[:, unique_cols_indices].columns
-    for col in df_columns_to_process:
-        # 使用 .loc 避免 SettingWithCopyWarning
-        df.loc[:, col] = df[col].map(likert_5_point_mapping).fillna(df[col])
-        # 将无法映射的值（可能是数字）强制转换为数值，无效的设为NaN
-        df.loc[:, col] = pd.to_numeric(df[col], errors='coerce')
-
-    # 4. 处理反向计分题
-    print("处理反向计分题...")
-    def reverse_code(df, cols, reverse_indices, scale_max=5):
-        for idx in reverse_indices:
-            if idx < len(cols):
-                col_name = df.columns[cols[idx]]
-                print(f"  - 反向计分: {col_name}")
-                df[col_name] = (scale_max + 1) - df[col_name]
-    
-    reverse_code(df, stepparent_past_cols, stepparent_past_reverse)
-    reverse_code(df, stepparent_current_cols, stepparent_current_reverse)
-    reverse_code(df, bioparent_past_cols, bioparent_past_reverse)
-    reverse_code(df, bioparent_current_cols, bioparent_current_reverse)
-    reverse_code(df, self_esteem_cols, self_esteem_reverse)
-
-    # 5. 计算综合得分 (使用处理后的数值列)
-    print("计算各量表综合得分...")
-    def calculate_score(df, cols, new_col_name):
-        col_names = [df.columns[i] for i in cols if i < len(df.columns)]
-        df[new_col_name] = df[col_names].mean(axis=1, skipna=True)
-        print(f"  - 已计算: {new_col_name}")
-
-    calculate_score(df, stepparent_past_cols, 'rel_stepparent_past')
-    calculate_score(df, stepparent_current_cols, 'rel_stepparent_current')
-    calculate_score(df, bioparent_past_cols, 'rel_bioparent_past')
-    calculate_score(df, bioparent_current_cols, 'rel_bioparent_current')
-    calculate_score(df, self_esteem_cols, 'mental_self_esteem')
-    calculate_score(df, anxiety_cols, 'mental_anxiety')
-    calculate_score(df, depression_cols, 'mental_depression')
+    # 统一应用映射：对整个量表列块一次性编码为二维矩阵
+    # 无法映射的值（可能是数字）强制转换为数值，无效的设为缺失
+    log("将文本答案转换为数值...")
+    codes = scales.encode(df, LIKERT_5_POINT_MAPPING)
+    log(f"  - 已编码: {codes.shape[1]} 列 x {codes.shape[0]} 行")
+
+    # 4. 处理反向计分题（单次掩码运算）
+    log("处理反向计分题...")
+    scales.reverse_score(codes)
+    log(f"  - 反向计分题数: {scales.n_reverse_items}")
+
+    # 缺失数据处理（编码之后、计分之前）；多重填补的各条链并行运行
+    if imputation != 'none' or min_completeness is not None:
+        log(f"处理缺失数据: 方法 {imputation}"
+            + (f"，最低作答比例 {min_completeness}" if min_completeness is not None else ""))
+    if imputation == 'mice':
+        log(f"  - 多重填补: {n_imputations} 个数据集")
+
+    # 5. 计算综合得分 (每个量表一次取数 + 行均值)
+    log("计算各量表综合得分...")
+    imputed_scores = score_imputations(codes, scales, PROCESSED_SCALES, imputation,
+                                       min_completeness=min_completeness,
+                                       n_imputations=n_imputations, seed=seed, n_jobs=n_jobs,
+                                       auxiliary=scales.names)
+    score_cols = [SCALE_REGISTRY[name]['score_name'] for name in PROCESSED_SCALES]
+    score_frames = [pd.DataFrame({SCALE_REGISTRY[name]['score_name']: values
+                                  for name, values in scores.items()}, index=df.index)
+                    for scores in imputed_scores]
+    df_scores = (score_frames[0] if len(score_frames) == 1
+                 else sum(score_frames) / len(score_frames))
+    for col in score_cols:
+        log(f"  - 已计算: {col}")
+
+    # 每次计分时检查量表信度（每个量表一次协方差计算）
+    if verbose:
+        log("检查量表信度...")
+        reliability, items = scale_reliability(codes, scales, PROCESSED_SCALES)
+        flagged = items[items['flag'] != ''].groupby('scale').size()
+        for row in reliability.itertuples():
+            log(f"  - {row.scale}: alpha={row.alpha:.3f}, omega={row.omega:.3f} (n={row.n})"
+                f"，需复核题目 {flagged.get(row.scale, 0)} 个")
 
     # 提取关键人口学变量
-    print("提取关键人口学变量...")
+    log("提取关键人口学变量...")
     
     # 使用 iloc 按精确的列位置索引，避免KeyError
-    # 年龄 -> 第11列 (索引10)
-    # 同住时长 -> 第14列 (索引13)
-    # 开始同住年龄 -> 第16列 (索引15)
-    df_processed = df.iloc[:, [10, 13, 15]].copy()
+    df_processed = df.iloc[:, [idx for idx, _ in DEMOGRAPHIC_COLUMNS]].copy()
     
     # 为列重命名以提高可读性
-    df_processed.columns = ['demo_age', 'demo_cohab_duration', 'demo_start_age_cohab']
+    df_processed.columns = [name for _, name in DEMOGRAPHIC_COLUMNS]
     
     # 清洗新提取的人口学列
-    print("清洗人口学数据...")
+    log("清洗人口学数据...")
     for col in df_processed.columns:
-        print(f"  - 清洗列: {col}")
+        log(f"  - 清洗列: {col}")
         df_processed[col] = clean_demographic_column(df_processed[col])
 
     # 合并得分
-    score_cols = [
-        'rel_stepparent_past', 'rel_stepparent_current',
-        'rel_bioparent_past', 'rel_bioparent_current',
-        'mental_self_esteem', 'mental_anxiety', 'mental_depression'
-    ]
-    df_processed = pd.concat([df_processed, df[score_cols]], axis=1)
+    df_processed_scores = pd.concat([df_processed, df_scores[score_cols]], axis=1).astype(np.float64)
+    if not return_imputations:
+        return df_processed_scores
+    imputations = [pd.concat([df_processed, frame[score_cols]], axis=1).astype(np.float64)
+                   for frame in score_frames] if imputation == 'mice' else []
+    return df_processed_scores, imputations
+
+@profile_stage()
+def preprocess_data(input_path='assets/data.xlsx', output_dir='output', compact=False,
+                    imputation='none', min_completeness=None,
+                    n_imputations=DEFAULT_IMPUTATIONS, seed=0, n_jobs=None, df=None,
+                    return_frame=False):
+    """
+    执行完整的数据预处理流程
+
+    Args:
+        input_path: 原始数据路径
+        output_dir: 输出目录
+        compact: 同时保存紧凑表示 processed_compact.parquet
+        imputation: 缺失数据处理方法 'none' / 'person_mean' / 'mice'
+        min_completeness: 量表最低作答比例，None 表示不限制
+        n_imputations: 多重填补的数据集数
+        seed: 多重填补的随机种子
+        n_jobs: 多重填补的并行进程数
+        df: 已在内存中的原始数据（由流水线传入），提供时不再读取 input_path
+        return_frame: 为 True 时同时返回处理后的 DataFrame
+
+    Returns:
+        处理结果路径；return_frame 为 True 时为 (路径, DataFrame)
+    """
+    print("--- 开始数据预处理 ---")
+
+    # 确保输出目录存在
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 1. 加载数据
+    if df is None:
+        print(f"加载原始数据: {input_path}")
+        df = load_survey(input_path)
+    print(f"原始数据形状: {df.shape}")
+    annotate(df)
+
+    # 2-5. 编码、反向计分、计算得分、清洗人口学变量
+    df_processed, imputations = process_frame(
+        df, imputation=imputation, min_completeness=min_completeness,
+        n_imputations=n_imputations, seed=seed, n_jobs=n_jobs, return_imputations=True)
 
     # 6. 保存处理后的数据
     output_path = os.path.join(output_dir, 'processed_data.csv')
     print(f"保存处理后的数据到: {output_path}")
     df_processed.to_csv(output_path, index=False, encoding='utf-8-sig')
+    if imputations:
+        # 相关性分析按 Rubin 规则合并各填补数据集
+        paths = save_imputations(imputations, output_path, imputation_settings(
+            imputation, min_completeness, n_imputations, seed))
+        print(f"保存 {len(paths)} 个多重填补数据集到: {os.path.dirname(paths[0])}")
     
     print(f"处理后的数据形状: {df_processed.shape}")
+
+    if compact:
+        save_compact(df, output_dir, processed=df_processed)
+
     print("--- 数据预处理完成 ---")
+    if return_frame:
+        return output_path, df_processed
     return output_path
 
+@profile_stage()
+def save_compact(df, output_dir='output', processed=None):
+    """
+    保存紧凑表示：题目编码 int8、基本信息为分类类型、人口学变量与得分为 float32
+
+    Args:
+        df: 原始数据
+        output_dir: 输出目录
+        processed: 处理后的数据；提供时用其中的得分（已按缺失数据处理方法计算）替换紧凑表示中的对应得分
+    """
+    survey = CompactSurvey.from_frame(df)
+    if processed is not None:
+        columns = processed_score_columns()
+        survey.scores[columns] = processed[columns].to_numpy(dtype=np.float32)
+    compact_path = os.path.join(output_dir, 'processed_compact.parquet')
+    print(f"保存紧凑表示到: {compact_path}")
+    survey.save(compact_path)
+
+    raw_mb = df.memory_usage(index=False, deep=True).sum() / 1024 ** 2
+    usage = survey.memory_usage()
+    print(f"  - 原始数据内存: {raw_mb:.2f} MB")
+    print(f"  - 紧凑表示内存: {sum(usage.values()) / 1024 ** 2:.2f} MB "
+          f"(" + ", ".join(f"{name} {size / 1024 ** 2:.2f}" for name, size in usage.items()) + ")")
+    return compact_path
+
+def imputation_settings(imputation, min_completeness, n_imputations, seed):
+    """缺失数据处理的设置（记录在填补数据集清单中）"""
+    return {'method': imputation, 'min_completeness': min_completeness,
+            'n_imputations': n_imputations, 'seed': seed}
+
+# 增量、流式模式下可用的缺失数据处理方法：个人均值填补与完整度规则只依赖本行数据，
+# 多重填补需要全部参与者建模
+INCREMENTAL_IMPUTATION_METHODS = ('none', 'person_mean')
+
+# 参与者唯一标识列（问卷星导出的序号）
+ID_COLUMN = '序号'
+
+# 计分代码（相对于项目根目录）：本脚本 (process_frame) 与编码、计分、缺失处理、人口学清洗模块
+SCORING_SOURCES = [os.path.relpath(os.path.abspath(__file__), ROOT_DIR), 'demographics.py',
+                   'likert_encoding.py', 'scale_registry.py', 'imputation.py']
+
+def scoring_fingerprint(imputation='none', min_completeness=None):
+    """
+    计分规则的指纹：量表定义、文本映射、人口学列、计分代码或缺失数据处理设置变化后需要全量重算
+    """
+    spec = json.dumps([SCALE_REGISTRY, LIKERT_5_POINT_MAPPING, DEMOGRAPHIC_COLUMNS,
+                       {'imputation': imputation, 'min_completeness': min_completeness},
+                       {path: file_sha256(os.path.join(ROOT_DIR, path))
+                        for path in SCORING_SOURCES}],
+                      sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(spec.encode('utf-8')).hexdigest()
+
+
+@profile_stage()
+def preprocess_data_incremental(input_path='assets/data.xlsx', output_dir='output',
+                                id_column=ID_COLUMN, imputation='none', min_completeness=None,
+                                df=None, full=False, return_frame=False):
+    """
+    增量预处理：只对新增参与者进行编码与计分，追加到已有的处理结果中，
+    并同步更新相关性分析使用的充分统计量
+
+    Args:
+        input_path: 原始数据路径
+        output_dir: 输出目录
+        id_column: 参与者唯一标识列
+        imputation: 缺失数据处理方法 'none' / 'person_mean'（逐行计算，不支持多重填补）
+        min_completeness: 量表最低作答比例，None 表示不限制
+        df: 已在内存中的原始数据（由流水线传入），提供时不再读取 input_path
+        full: 为 True 时忽略已有状态，全部参与者重新计分（例如计分之外的代码变化或强制重跑）
+        return_frame: 为 True 时同时返回处理后的全部数据；只追加了新参与者或无需计分时
+                      全部数据不在内存中，返回 None
+
+    Returns:
+        处理结果路径；return_frame 为 True 时为 (路径, DataFrame 或 None)
+    """
+    if imputation not in INCREMENTAL_IMPUTATION_METHODS:
+        raise ValueError(f"增量模式不支持的缺失数据处理方法: {imputation}")
+    fingerprint = scoring_fingerprint(imputation, min_completeness)
+    print("--- 开始增量数据预处理 ---")
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_path = os.path.join(output_dir, 'processed_data.csv')
+    state_dir = os.path.join(output_dir, STATE_DIR_NAME)
+    ids_path = os.path.join(state_dir, 'processed_ids.csv')
+    state_path = os.path.join(state_dir, 'preprocess_state.json')
+    corr_state_path = default_state_path(output_path)
+    os.makedirs(state_dir, exist_ok=True)
+
+    if df is None:
+        print(f"加载原始数据: {input_path}")
+        df = load_survey(input_path)
+    print(f"原始数据形状: {df.shape}")
+    annotate(df)
+    if id_column not in df.columns:
+        raise KeyError(f"未找到参与者标识列: {id_column}")
+    ids = df[id_column].astype(str)
+    if WAVE_COLUMN in df.columns:
+        # 多批次数据中序号只在批次内唯一
+        ids = df[WAVE_COLUMN].astype(str) + ':' + ids
+
+    # 读取上次运行的状态；计分规则或处理结果文件被改动时全量重算
+    state = None
+    if full:
+        print("全量重新计分")
+    elif os.path.exists(state_path) and os.path.exists(ids_path) and os.path.exists(output_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state.get('fingerprint') != fingerprint
+                or state.get('signature') != file_signature(output_path)):
+            print("计分规则或处理结果已变化，执行全量预处理")
+            state = None
+
+    acc = None
+    if state is not None:
+        acc = load_current_accumulator(corr_state_path, output_path)
+
+    if state is None or acc is None:
+        new_mask = np.ones(len(df), dtype=bool)
+    else:
+        processed_ids = pd.read_csv(ids_path, dtype=str)[id_column]
+        new_mask = ~ids.isin(processed_ids).to_numpy()
+        print(f"已处理参与者: {len(processed_ids)}，新增参与者: {int(new_mask.sum())}")
+        if not new_mask.any():
+            print("没有新增参与者，无需重新计分")
+            print("--- 增量数据预处理完成 ---")
+            return (output_path, None) if return_frame else output_path
+
+    df_new = process_frame(df[new_mask], imputation=imputation,
+                           min_completeness=min_completeness)
+
+    complete = state is None or acc is None
+    if complete:
+        df_new.to_csv(output_path, index=False, encoding='utf-8-sig')
+        ids[new_mask].to_frame(id_column).to_csv(ids_path, index=False)
+        acc = PairwiseCorrelationAccumulator(df_new.columns)
+    else:
+        df_new.to_csv(output_path, mode='a', header=False, index=False, encoding='utf-8')
+        ids[new_mask].to_frame(id_column).to_csv(ids_path, mode='a', header=False, index=False)
+
+    # 只用新增行更新相关性分析的充分统计量
+    acc.update(df_new)
+    save_accumulator_state(acc, corr_state_path, output_path)
+
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint,
+                   'n_rows': acc.n_rows,
+                   'signature': file_signature(output_path)}, f, indent=2)
+
+    print(f"保存处理后的数据到: {output_path}")
+    print(f"本次新增计分: {len(df_new)} 行，累计: {acc.n_rows} 行")
+    print("--- 增量数据预处理完成 ---")
+    if return_frame:
+        return output_path, (df_new if complete else None)
+    return output_path
+
+def iter_input_chunks(input_path, chunksize):
+    """
+    按行分块读取 CSV/Parquet 格式的调查数据导出文件
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    if ext == '.csv':
+        yield from pd.read_csv(input_path, chunksize=chunksize)
+    elif ext == '.parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"流式模式仅支持 CSV/Parquet 输入，请先导出: {input_path}")
+
+@profile_stage()
+def preprocess_data_streaming(input_path='assets/data.csv', output_dir='output',
+                              chunksize=50000, output_format='csv',
+                              imputation='none', min_completeness=None):
+    """
+    流式预处理：按行分块读取、编码、计分，并增量追加到输出文件
+    内存占用只与分块大小有关，适用于超大规模的合并数据集
+
+    Args:
+        input_path: CSV 或 Parquet 格式的原始数据
+        output_dir: 输出目录
+        chunksize: 每块的行数
+        output_format: 输出格式 'csv' 或 'parquet'
+        imputation: 缺失数据处理方法 'none' / 'person_mean'（逐行计算，不支持多重填补）
+        min_completeness: 量表最低作答比例，None 表示不限制
+    """
+    print("--- 开始流式数据预处理 ---")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError(f"不支持的输出格式: {output_format}")
+    if imputation not in INCREMENTAL_IMPUTATION_METHODS:
+        raise ValueError(f"流式模式不支持的缺失数据处理方法: {imputation}")
+
+    output_path = os.path.join(output_dir, f'processed_data.{output_format}')
+    # 先写入临时文件，全部完成后再替换，避免中途失败留下不完整的结果
+    tmp_path = output_path + '.tmp'
+
+    print(f"分块读取原始数据: {input_path} (每块 {chunksize} 行)")
+    n_rows = 0
+    n_columns = None
+    writer = None
+    try:
+        for i, chunk in enumerate(iter_input_chunks(input_path, chunksize)):
+            chunk_processed = process_frame(chunk, verbose=(i == 0), imputation=imputation,
+                                            min_completeness=min_completeness)
+            n_columns = chunk_processed.shape[1]
+
+            if output_format == 'csv':
+                if i == 0:
+                    chunk_processed.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+                else:
+                    chunk_processed.to_csv(tmp_path, mode='a', header=False,
+                                           index=False, encoding='utf-8')
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk_processed, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+
+            n_rows += len(chunk_processed)
+            print(f"  - 已处理: {n_rows} 行")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if n_columns is None:
+        print(f"错误: 输入文件为空 {input_path}")
+        return None
+
+    os.replace(tmp_path, output_path)
+    annotate(rows=n_rows, columns=n_columns)
+    print(f"保存处理后的数据到: {output_path}")
+    print(f"处理后的数据形状: ({n_rows}, {n_columns})")
+    print("--- 流式数据预处理完成 ---")
+    return output_path
+
+
+def main(argv=None):
+    """命令行入口（也供 cli.py 调用）"""
+    parser = argparse.ArgumentParser(description='继家庭研究数据预处理')
+    parser.add_argument('--input', default=None,
+                        help='原始数据路径 (默认 assets/data.xlsx；可为通配符、目录或 JSON 清单；'
+                             '流式模式需为 CSV/Parquet 文件)')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：只对新增参与者（按序号识别）计分并追加到已有结果')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式模式：按行分块处理，内存占用与数据总量无关')
+    parser.add_argument('--chunksize', type=int, default=50000, help='流式模式下每块的行数')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help='流式模式下的输出格式')
+    parser.add_argument('--compact', action='store_true',
+                        help='同时保存紧凑表示 processed_compact.parquet')
+    parser.add_argument('--imputation', choices=IMPUTATION_METHODS, default='none',
+                        help='缺失数据处理方法：不填补 / 个人均值填补 / 链式方程多重填补')
+    parser.add_argument('--min-completeness', type=float, default=None,
+                        help='量表最低作答比例 (0-1)，低于该比例的参与者不计分')
+    parser.add_argument('--n-imputations', type=int, default=DEFAULT_IMPUTATIONS,
+                        help='多重填补的数据集数')
+    parser.add_argument('--seed', type=int, default=0, help='多重填补的随机种子')
+    parser.add_argument('--n-jobs', type=int, default=None, help='多重填补的并行进程数')
+    args = parser.parse_args(argv)
+
+    if args.incremental or args.stream:
+        mode = '--incremental' if args.incremental else '--stream'
+        if args.imputation not in INCREMENTAL_IMPUTATION_METHODS:
+            parser.error(f"--imputation {args.imputation} 需要全部数据，不能与 {mode} 同时使用")
+        if args.compact:
+            parser.error(f"--compact 需要完整的原始数据，不能与 {mode} 同时使用")
+        if args.n_imputations != DEFAULT_IMPUTATIONS:
+            parser.error(f"--n-imputations 仅用于多重填补，不能与 {mode} 同时使用")
+
+    if args.incremental:
+        preprocess_data_incremental(args.input or 'assets/data.xlsx', args.output_dir,
+                                    imputation=args.imputation,
+                                    min_completeness=args.min_completeness)
+    elif args.stream:
+        preprocess_data_streaming(args.input or 'assets/data.csv', args.output_dir,
+                                  chunksize=args.chunksize, output_format=args.format,
+                                  imputation=args.imputation,
+                                  min_completeness=args.min_completeness)
+    else:
+        preprocess_data(args.input or 'assets/data.xlsx', args.output_dir, compact=args.compact,
+                        imputation=args.imputation, min_completeness=args.min_completeness,
+                        n_imputations=args.n_imputations, seed=args.seed, n_jobs=args.n_jobs)
+
+
 if __name__ == "__main__":
-    preprocess_data() 
\ No newline at end of file
+    main()
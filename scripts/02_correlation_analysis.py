@@ -5,31 +5,80 @@
 - 加载预处理后的数据
 - 计算关键变量之间的相关性矩阵
 - 保存相关性矩阵为 CSV 和可读的 TXT 文件
+- 可选：计算每对变量的 bootstrap 置信区间与置换检验 p 值
+- 预处理保存了多重填补数据集时，按 Rubin 规则合并各数据集的相关系数
+- 输入可为紧凑格式 processed_compact.parquet（只读取人口学变量与得分列）
 """
 
-import pandas as pd
+import argparse
+import numpy as np
 import os
+import sys
 
-def analyze_correlations(input_path='output/processed_data.csv', output_dir='output'):
+# 使脚本可以导入项目根目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clustering import CLUSTER_COLUMNS
+from compact_survey import is_compact_file, load_processed
+from correlation_accumulator import PairwiseCorrelationAccumulator, refresh_accumulator
+from correlation_inference import correlation_inference
+from imputation import load_imputations, pooled_correlations
+from profiling import annotate, profile_stage
+
+@profile_stage()
+def analyze_correlations(input_path='output/processed_data.csv', output_dir='output',
+                         chunksize=100000, n_jobs=1, n_bootstrap=0, n_permutations=0,
+                         ci=0.95, seed=0, df=None, imputations=None):
     """
     执行相关性分析
+
+    Args:
+        input_path: 预处理后的数据 (CSV/Parquet，或紧凑格式 processed_compact.parquet)
+        output_dir: 输出目录
+        chunksize: 全量重算时每块的行数
+        n_jobs: 全量重算与重抽样的并行进程数
+        n_bootstrap: bootstrap 重抽样次数，0 表示不计算置信区间
+        n_permutations: 置换次数，0 表示不计算置换检验 p 值
+        ci: 置信水平
+        seed: 重抽样随机种子
+        df: 已在内存中的预处理数据（由流水线传入），提供时不再读取 input_path
+        imputations: 多重填补数据集列表；默认读取与 input_path 对应的填补数据集（如有）
     """
     print("--- 开始相关性分析 ---")
 
     # 1. 加载数据
-    if not os.path.exists(input_path):
+    if df is None and not os.path.exists(input_path):
         print(f"错误: 未找到预处理后的数据文件 {input_path}")
         print("请先运行 01_preprocess_data.py")
         return
+    if df is None and is_compact_file(input_path):
+        # 紧凑格式不支持增量累计，直接读取人口学变量与得分列
+        print(f"加载紧凑格式预处理数据: {input_path}")
+        df = load_processed(input_path)
         
-    print(f"加载预处理数据: {input_path}")
-    df = pd.read_csv(input_path)
-
     # 2. 计算相关性矩阵
+    # 通过可合并的充分统计量计算（与 DataFrame.corr(method='pearson') 一致）：
+    # 数据文件未变化时直接复用，只追加了新行时只读取新增部分，否则分块全量重算
     print("计算相关性矩阵...")
-    
-    # 直接使用英文列名计算相关性
-    corr_matrix = df.corr(method='pearson')
+    if df is not None:
+        acc = PairwiseCorrelationAccumulator.from_values(df.to_numpy(dtype=np.float64), df.columns)
+    else:
+        print(f"加载预处理数据: {input_path}")
+        acc = refresh_accumulator(input_path, chunksize=chunksize, n_workers=n_jobs)
+    print(f"  - 累计样本: {acc.n_rows} 行")
+    annotate(rows=acc.n_rows, columns=len(acc.columns))
+    corr_matrix = acc.correlation()
+    # 写回的聚类类别列不是连续变量，不参与相关性分析
+    clusters = [col for col in CLUSTER_COLUMNS if col in corr_matrix.columns]
+    corr_matrix = corr_matrix.drop(index=clusters, columns=clusters)
+
+    # 多重填补：相关矩阵改为各填补数据集按 Rubin 规则合并的结果
+    if imputations is None and os.path.exists(input_path):
+        imputations = load_imputations(input_path)
+    pooled = None
+    if imputations:
+        print(f"按 Rubin 规则合并 {len(imputations)} 个多重填补数据集的相关系数...")
+        corr_matrix, pooled = pooled_correlations(imputations, corr_matrix.columns, ci=ci)
 
     # 3. 保存结果
     # a) 保存为 CSV 文件
@@ -50,9 +99,71 @@ def analyze_correlations(input_path='output/processed_data.csv', output_dir='out
         f.write("  - Close to 0 indicates no linear correlation\n\n")
         
         f.write(corr_matrix.to_string(float_format="%.3f"))
+
+    outputs = [csv_path, report_path]
+    if pooled is not None:
+        pooled_path = os.path.join(output_dir, 'correlation_pooled.csv')
+        print(f"保存多重填补合并结果 (CSV) 到: {pooled_path}")
+        pooled.to_csv(pooled_path, index=False, encoding='utf-8-sig')
+        outputs.append(pooled_path)
+
+        with open(report_path, 'a', encoding='utf-8') as f:
+            f.write("\n\n" + "=" * 50 + "\n")
+            f.write("Pooled Estimates over Multiple Imputations\n")
+            f.write("=" * 50 + "\n\n")
+            f.write(f"The matrix above pools {len(imputations)} imputed datasets "
+                    "(Fisher z, Rubin's rules).\n")
+            f.write(f"ci_low / ci_high: {ci:.0%} interval; "
+                    "fmi: fraction of missing information\n\n")
+            f.write(pooled.to_string(index=False, float_format="%.3f"))
+
+    # c) 可选：bootstrap 置信区间与置换检验 p 值
+    if n_bootstrap > 0 or n_permutations > 0:
+        print(f"计算 bootstrap 置信区间 ({n_bootstrap} 次) 与置换检验 ({n_permutations} 次)...")
+        if df is None:
+            df = load_processed(input_path)
+        inference = correlation_inference(df[corr_matrix.columns], n_bootstrap=n_bootstrap,
+                                          n_permutations=n_permutations, ci=ci,
+                                          seed=seed, n_jobs=n_jobs)
+        inference_path = os.path.join(output_dir, 'correlation_inference.csv')
+        print(f"保存相关系数推断结果 (CSV) 到: {inference_path}")
+        inference.to_csv(inference_path, index=False, encoding='utf-8-sig')
+        outputs.append(inference_path)
+
+        with open(report_path, 'a', encoding='utf-8') as f:
+            f.write("\n\n" + "=" * 50 + "\n")
+            f.write("Uncertainty of Pairwise Correlations\n")
+            f.write("=" * 50 + "\n\n")
+            if n_bootstrap > 0:
+                f.write(f"ci_low / ci_high: {ci:.0%} percentile bootstrap interval "
+                        f"({n_bootstrap} resamples)\n")
+            if n_permutations > 0:
+                f.write(f"p_perm: two-sided permutation p-value ({n_permutations} permutations)\n")
+            f.write(f"Random seed: {seed}\n\n")
+            f.write(inference.to_string(index=False, float_format="%.3f"))
     
     print("--- 相关性分析完成 ---")
-    return csv_path, report_path
+    return tuple(outputs)
+
+
+def main(argv=None):
+    """命令行入口（也供 cli.py 调用）"""
+    parser = argparse.ArgumentParser(description='继家庭研究数据相关性分析')
+    parser.add_argument('--input', default='output/processed_data.csv', help='预处理后的数据 (CSV/Parquet，或紧凑格式 processed_compact.parquet)')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--chunksize', type=int, default=100000, help='全量重算时每块的行数')
+    parser.add_argument('--n-jobs', type=int, default=1, help='全量重算与重抽样的并行进程数')
+    parser.add_argument('--bootstrap', type=int, default=0, help='bootstrap 重抽样次数')
+    parser.add_argument('--permutations', type=int, default=0, help='置换检验的置换次数')
+    parser.add_argument('--ci', type=float, default=0.95, help='置信水平')
+    parser.add_argument('--seed', type=int, default=0, help='重抽样随机种子')
+    args = parser.parse_args(argv)
+
+    analyze_correlations(args.input, args.output_dir,
+                         chunksize=args.chunksize, n_jobs=args.n_jobs,
+                         n_bootstrap=args.bootstrap, n_permutations=args.permutations,
+                         ci=args.ci, seed=args.seed)
+
 
 if __name__ == "__main__":
-    analyze_correlations() 
\ No newline at end of file
+    main()
@@ -5,76 +5,96 @@
 - 加载相关性矩阵和处理后的数据
 - 创建并保存相关性热力图
 - 创建并保存关键变量的散点图
+- 输入未变化的图表直接跳过，其余图表并行渲染
+- 预处理数据可为紧凑格式 processed_compact.parquet
 """
 
+import argparse
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import os
+import sys
 
-def visualize_results(matrix_path='output/correlation_matrix.csv', 
-                      data_path='output/processed_data.csv', 
-                      output_dir='output'):
+# 使脚本可以导入项目根目录下的共享模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_survey import load_processed
+from figure_rendering import figure_job, render_figures
+from profiling import annotate, profile_stage
+
+# 需要生成的散点图
+SCATTER_PLOTS = [
+    ('rel_stepparent_current', 'mental_depression', 'Current Stepparent Relationship vs. Depression'),
+    ('rel_stepparent_current', 'mental_anxiety', 'Current Stepparent Relationship vs. Anxiety'),
+    ('rel_stepparent_current', 'mental_self_esteem', 'Current Stepparent Relationship vs. Self-Esteem'),
+    ('demo_start_age_cohab', 'rel_stepparent_current', 'Cohabitation Start Age vs. Current Stepparent Relationship')
+]
+
+
+@profile_stage()
+def visualize_results(matrix_path='output/correlation_matrix.csv',
+                      data_path='output/processed_data.csv',
+                      output_dir='output', n_jobs=None, force=False,
+                      corr_matrix=None, df=None):
     """
     执行结果可视化
+
+    Args:
+        n_jobs: 并行渲染的进程数，默认为 CPU 核数
+        force: 为 True 时忽略已有图表，全部重新渲染
+        corr_matrix, df: 已在内存中的相关性矩阵与预处理数据（由流水线传入），
+            提供时不再读取对应文件
     """
     print("--- 开始结果可视化 ---")
 
-    # --- 1. 创建相关性热力图 ---
-    if not os.path.exists(matrix_path):
-        print(f"错误: 未找到相关性矩阵文件 {matrix_path}")
-        print("请先运行 02_correlation_analysis.py")
-        return
-
-    print(f"加载相关性矩阵: {matrix_path}")
-    corr_matrix = pd.read_csv(matrix_path, index_col=0)
-
-    plt.figure(figsize=(12, 10))
-    # Use 'coolwarm' colormap, centered at 0
-    # annot=True will display values on the cells
-    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', fmt=".2f", linewidths=.5)
-    plt.title('Correlation Heatmap of Key Variables', fontsize=16, pad=20)
-    plt.xticks(rotation=45, ha="right")
-    plt.yticks(rotation=0)
-    
+    # --- 1. 相关性热力图 ---
+    if corr_matrix is None:
+        if not os.path.exists(matrix_path):
+            print(f"错误: 未找到相关性矩阵文件 {matrix_path}")
+            print("请先运行 02_correlation_analysis.py")
+            return
+
+        print(f"加载相关性矩阵: {matrix_path}")
+        corr_matrix = pd.read_csv(matrix_path, index_col=0)
+
     heatmap_path = os.path.join(output_dir, 'correlation_heatmap.png')
-    print(f"保存热力图到: {heatmap_path}")
-    plt.savefig(heatmap_path, dpi=300, bbox_inches='tight')
-    plt.close()
-
-    # --- 2. 创建关键散点图 ---
-    if not os.path.exists(data_path):
-        print(f"错误: 未找到预处理数据文件 {data_path}")
-        return
-        
-    print(f"加载预处理数据进行散点图绘制: {data_path}")
-    df = pd.read_csv(data_path)
-    
-    # Define scatter plots to generate
-    scatter_plots = [
-        ('rel_stepparent_current', 'mental_depression', 'Current Stepparent Relationship vs. Depression'),
-        ('rel_stepparent_current', 'mental_anxiety', 'Current Stepparent Relationship vs. Anxiety'),
-        ('rel_stepparent_current', 'mental_self_esteem', 'Current Stepparent Relationship vs. Self-Esteem'),
-        ('demo_start_age_cohab', 'rel_stepparent_current', 'Cohabitation Start Age vs. Current Stepparent Relationship')
-    ]
-
-    print("生成并保存散点图...")
-    for x_col, y_col, title in scatter_plots:
-        plt.figure(figsize=(8, 6))
-        # reg_line=True adds a linear regression fit line
-        sns.regplot(x=x_col, y=y_col, data=df,
-                    scatter_kws={'alpha':0.5},
-                    line_kws={"color": "red"})
-        plt.title(title, fontsize=14)
-        plt.xlabel(x_col)
-        plt.ylabel(y_col)
-        
+    jobs = [figure_job('heatmap', heatmap_path, corr_matrix,
+                       title='Correlation Heatmap of Key Variables', figsize=(12, 10), dpi=300)]
+
+    # --- 2. 关键散点图 ---
+    if df is None:
+        if not os.path.exists(data_path):
+            print(f"错误: 未找到预处理数据文件 {data_path}")
+            return
+
+        print(f"加载预处理数据进行散点图绘制: {data_path}")
+        df = load_processed(data_path)
+    annotate(df)
+
+    for x_col, y_col, title in SCATTER_PLOTS:
         plot_path = os.path.join(output_dir, f'scatter_{x_col}_vs_{y_col}.png')
-        plt.savefig(plot_path, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"  - 已保存: {plot_path}")
+        # 每张图只携带用到的两列，其他列变化不会使该图失效
+        jobs.append(figure_job('regplot', plot_path, df[[x_col, y_col]],
+                               x=x_col, y=y_col, title=title, figsize=(8, 6), dpi=300))
+
+    print("生成并保存热力图与散点图...")
+    render_figures(jobs, n_jobs=n_jobs, force=force)
 
     print("--- 结果可视化完成 ---")
+    return [job['path'] for job in jobs]
+
+
+def main(argv=None):
+    """命令行入口（也供 cli.py 调用）"""
+    parser = argparse.ArgumentParser(description='结果可视化')
+    parser.add_argument('--matrix', default='output/correlation_matrix.csv', help='相关性矩阵文件')
+    parser.add_argument('--data', default='output/processed_data.csv', help='预处理数据文件 (CSV，或紧凑格式 processed_compact.parquet)')
+    parser.add_argument('--output-dir', default='output', help='输出目录')
+    parser.add_argument('--n-jobs', type=int, default=None, help='并行渲染的进程数（默认为CPU核数）')
+    parser.add_argument('--force', action='store_true', help='忽略已有图表，全部重新渲染')
+    args = parser.parse_args(argv)
+
+    visualize_results(args.matrix, args.data, args.output_dir, n_jobs=args.n_jobs, force=args.force)
+
 
 if __name__ == "__main__":
-    visualize_results() 
\ No newline at end of file
+    main()
@@ -6,24 +6,46 @@
 """
 
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
 import os
 from datetime import datetime
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
+from clustering import CLUSTER_COLUMNS, cluster_relationship_patterns
+from column_schema import COLUMN_CATEGORIES, DEFAULT_SCHEMA_DIR, build_column_schema
+from compact_survey import CompactSurvey
+from demographics import BASIC_INFO_COLUMNS
+from descriptive_stats import summarize
+from figure_rendering import CHINESE_FONT_RC, figure_job, render_figures
+from imputation import DEFAULT_IMPUTATIONS, pooled_paired_tests, score_imputations
+from modelling import DEFAULT_BOOTSTRAP, MENTAL_HEALTH, fit_models, trauma_scores
+from paired_tests import paired_comparisons
+from profiling import profile_stage
+from reliability import scale_reliability
+from scale_registry import SCALE_REGISTRY, compile_scale_registry
+from survey_ingestion import load_survey
 
 class StepfamilyRelationshipAnalyzer:
     """继家庭关系分析器"""
     
-    def __init__(self, data_path='assets/data.xlsx', output_dir='output'):
+    def __init__(self, data_path='assets/data.xlsx', output_dir='output', compact=False):
+        """
+        Args:
+            data_path: 数据文件路径
+            output_dir: 输出目录
+            compact: 计分后只保留紧凑表示（分类基本信息 + float32 得分 + int8 题目编码），
+                     释放原始文本列
+        """
         self.data_path = data_path
         self.output_dir = output_dir
+        self.compact = compact
         self.df = None
+        self.schema = None
+        self.survey = None
+        self.scales = None
+        self.item_codes = None
+        self.imputations = None
+        self.clusters = None
+        self.trauma_scores = None
+        self.models = None
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # 确保输出目录存在
@@ -36,27 +58,20 @@ class StepfamilyRelationshipAnalyzer:
         """定义各类变量的列索引"""
         
         # 基本信息
-        self.basic_info = {
-            'gender': 9,  # 性别
-            'age': 10,    # 年龄
-            'stepparent_count': 11,  # 继父母数量
-            'stepparent_gender': 12, # 继父母性别
-            'cohabitation_duration': 13, # 同住时长
-            'start_age': 15,  # 开始同住年龄
-            'education': 23   # 教育水平
-        }
+        self.basic_info = dict(BASIC_INFO_COLUMNS)
         
+        # 量表题目与反向计分题统一定义在 scale_registry.SCALE_REGISTRY 中
         # 继父母关系评估 - 过去 (18岁前)
-        self.stepparent_past = list(range(24, 52))  # 列25-52
+        self.stepparent_past = SCALE_REGISTRY['stepparent_past']['items']  # 列25-52
         
         # 继父母关系评估 - 现在
-        self.stepparent_current = list(range(52, 80))  # 列53-80
+        self.stepparent_current = SCALE_REGISTRY['stepparent_current']['items']  # 列53-80
         
         # 生身父母关系评估 - 过去
-        self.bioparent_past = list(range(136, 152))  # 列137-152
+        self.bioparent_past = SCALE_REGISTRY['bioparent_past']['items']  # 列137-152
         
         # 生身父母关系评估 - 现在  
-        self.bioparent_current = list(range(152, 168))  # 列153-168
+        self.bioparent_current = SCALE_REGISTRY['bioparent_current']['items']  # 列153-168
         
         # 创伤经历
         self.trauma = {
@@ -68,43 +83,99 @@ class StepfamilyRelationshipAnalyzer:
         
         # 心理健康
         self.mental_health = {
-            'self_esteem': list(range(215, 225)),      # 自尊
-            'self_blame': list(range(225, 232)),       # 自责
-            'anxiety': list(range(261, 268)),          # 焦虑
-            'depression': list(range(268, 277))        # 抑郁
+            'self_esteem': SCALE_REGISTRY['self_esteem']['items'],  # 自尊
+            'self_blame': SCALE_REGISTRY['self_blame']['items'],    # 自责
+            'anxiety': SCALE_REGISTRY['anxiety']['items'],          # 焦虑
+            'depression': SCALE_REGISTRY['depression']['items']     # 抑郁
+        }
+        
+        # 关系量表 -> 得分列名
+        self.relationship_scales = {
+            'stepparent_past': 'stepparent_past_score',
+            'stepparent_current': 'stepparent_current_score',
+            'bioparent_past': 'bioparent_past_score',
+            'bioparent_current': 'bioparent_current_score'
         }
+        
+        # 按列名关键词分类 (column_schema) 时应属于各类别的列，用于核对上面的列索引
+        self.schema_groups = {
+            'basic_info': [self.basic_info[key] for key in ('gender', 'age', 'education')],
+            'stepparent': self.stepparent_past + self.stepparent_current,
+            'mental_health': self.mental_health['self_esteem'],
+        }
+    
+    def check_column_groups(self):
+        """
+        用列分类（按表头签名缓存）核对按索引定义的列分组：表头中有某类别的列，
+        但预期的列不属于该类别时提示列索引可能错位（例如导出的列顺序变化）
+
+        Returns:
+            dict: 类别名 -> 不属于该类别的列索引列表
+        """
+        self.schema = build_column_schema(self.df.columns, cache_dir=DEFAULT_SCHEMA_DIR)
+        mismatched = {}
+        for name, indices in self.schema_groups.items():
+            members = set(self.schema.categories.get(name, []))
+            if not members:
+                # 列名已匿名化等，表头中没有该类别的关键词，无法核对
+                continue
+            outside = [idx for idx in indices if idx not in members]
+            if outside:
+                mismatched[name] = outside
+                column = self.schema.columns[outside[0]] if outside[0] < len(self.schema.columns) else None
+                print(f"警告: {len(outside)} 个{COLUMN_CATEGORIES[name]['label']}的列不含该类别的关键词"
+                      f"（如第 {outside[0] + 1} 列: {column}），请核对列索引")
+        return mismatched
     
+    def basic_column(self, key):
+        """基本信息字段在 self.df 中的列名，不存在时返回 None"""
+        if self.survey is not None and key in self.survey.info_columns:
+            return self.survey.info_columns[key]
+        if key not in self.basic_info or self.survey is not None:
+            # 多批次数据追加的 wave / source 列、写回的聚类类别列
+            return key if key in self.df.columns else None
+        idx = self.basic_info[key]
+        return self.df.columns[idx] if idx < len(self.df.columns) else None
+    
+    @profile_stage()
     def load_data(self):
         """加载数据"""
         print("正在加载数据...")
         try:
-            self.df = pd.read_excel(self.data_path)
+            self.df = load_survey(self.data_path)
             print(f"数据加载成功！形状: {self.df.shape}")
             return True
         except Exception as e:
             print(f"数据加载失败: {e}")
             return False
     
+    @profile_stage()
     def calculate_relationship_scores(self):
         """计算关系质量得分"""
         print("计算关系质量得分...")
-        
-        # 获取列名
-        cols = self.df.columns
-        
-        # 计算继父母关系得分
-        stepparent_past_cols = [cols[i] for i in self.stepparent_past if i < len(cols)]
-        stepparent_current_cols = [cols[i] for i in self.stepparent_current if i < len(cols)]
-        
-        # 计算生身父母关系得分
-        bioparent_past_cols = [cols[i] for i in self.bioparent_past if i < len(cols)]
-        bioparent_current_cols = [cols[i] for i in self.bioparent_current if i < len(cols)]
-        
-        # 计算平均得分（需要处理反向计分题）
-        self.df['stepparent_past_score'] = self.df[stepparent_past_cols].mean(axis=1, skipna=True)
-        self.df['stepparent_current_score'] = self.df[stepparent_current_cols].mean(axis=1, skipna=True)
-        self.df['bioparent_past_score'] = self.df[bioparent_past_cols].mean(axis=1, skipna=True)
-        self.df['bioparent_current_score'] = self.df[bioparent_current_cols].mean(axis=1, skipna=True)
+        self.check_column_groups()
+        
+        # 创伤经历得分在原始文本列释放前计算
+        self.trauma_scores = trauma_scores(self.df, self.trauma)
+        
+        if self.compact:
+            # 紧凑表示：原始文本列不再保留，只保留分类基本信息、float32 得分与 int8 题目编码
+            self.survey = CompactSurvey.from_frame(self.df)
+            self.scales = self.survey.scales
+            self.item_codes = self.survey.items
+            self.df = self.survey.frame().drop(columns=[
+                SCALE_REGISTRY[name]['score_name'] for name in self.relationship_scales])
+        else:
+            # 与预处理脚本共用量表注册表：一次性编码、反向计分
+            self.scales = compile_scale_registry(len(self.df.columns))
+            self.item_codes = self.scales.encode(self.df)
+            self.scales.reverse_score(self.item_codes)
+        
+        # 用于检验的关系得分由题目编码以 float64 计算（每个量表一次取数 + 行均值），
+        # 避免 float32 舍入改变配对差值的同秩关系
+        scores = self.scales.score(self.item_codes, list(self.relationship_scales))
+        for name, score_col in self.relationship_scales.items():
+            self.df[score_col] = scores[name]
         
         # 计算变化得分
         self.df['stepparent_change'] = self.df['stepparent_current_score'] - self.df['stepparent_past_score']
@@ -112,8 +183,52 @@ class StepfamilyRelationshipAnalyzer:
         
         print("关系质量得分计算完成")
     
-    def descriptive_analysis(self):
-        """描述性统计分析"""
+    def impute_scores(self, method='mice', min_completeness=None,
+                      n_imputations=DEFAULT_IMPUTATIONS, seed=0, n_jobs=None):
+        """
+        缺失数据处理后重新计算关系质量得分（需先调用 calculate_relationship_scores）
+
+        Args:
+            method: 'none' / 'person_mean' / 'mice'
+            min_completeness: 量表最低作答比例，低于该比例不计分
+            n_imputations: 多重填补的数据集数
+            seed: 随机种子
+            n_jobs: 多重填补的并行进程数
+
+        'none' 与 'person_mean' 直接替换 self.df 中的得分；'mice' 时 self.df 保留原有得分，
+        各填补数据集的得分保存在 self.imputations，对比分析按 Rubin 规则合并
+        """
+        print(f"处理缺失数据: 方法 {method}")
+        names = list(self.relationship_scales)
+        # 其余量表只作为多重填补的预测变量
+        imputed = score_imputations(self.item_codes, self.scales, names, method,
+                                    min_completeness=min_completeness,
+                                    n_imputations=n_imputations, seed=seed, n_jobs=n_jobs,
+                                    auxiliary=self.scales.names)
+        frames = []
+        for scores in imputed:
+            frame = pd.DataFrame({score_col: scores[name]
+                                  for name, score_col in self.relationship_scales.items()},
+                                 index=self.df.index)
+            frame['stepparent_change'] = frame['stepparent_current_score'] - frame['stepparent_past_score']
+            frame['bioparent_change'] = frame['bioparent_current_score'] - frame['bioparent_past_score']
+            frames.append(frame)
+        
+        if method == 'mice':
+            self.imputations = frames
+            print(f"多重填补完成: {len(frames)} 个数据集")
+        else:
+            self.df[frames[0].columns] = frames[0]
+            self.imputations = None
+    
+    @profile_stage()
+    def descriptive_analysis(self, quantile_error=None):
+        """
+        描述性统计分析
+
+        Args:
+            quantile_error: 分位数的目标秩误差（如 0.01，使用 KLL 草图近似）；None 表示精确计算
+        """
         print("进行描述性统计分析...")
         
         output_file = os.path.join(self.output_dir, f'relationship_descriptive_{self.timestamp}.txt')
@@ -123,164 +238,251 @@ class StepfamilyRelationshipAnalyzer:
             f.write("=" * 60 + "\n\n")
             f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
             
+            # 所需各列的统计量一次扫描计算，报告由汇总结果渲染
+            gender_col = self.basic_column('gender')
+            age_col = self.basic_column('age')
+            relationship_scores = ['stepparent_past_score', 'stepparent_current_score', 
+                                 'bioparent_past_score', 'bioparent_current_score']
+            changes = ['stepparent_change', 'bioparent_change']
+            described = [col for col in [age_col] + relationship_scores + changes
+                         if col is not None and col in self.df.columns]
+            summary = summarize(self.df, described,
+                                value_counts=[gender_col] if gender_col is not None else (),
+                                quantile_error=quantile_error)
+            
             # 基本信息统计
             f.write("【基本信息统计】\n")
-            f.write(f"总参与者数: {len(self.df)}\n")
+            f.write(f"总参与者数: {summary.n_rows}\n")
             
             # 性别分布
-            if self.df.columns[self.basic_info['gender']] in self.df.columns:
-                gender_col = self.df.columns[self.basic_info['gender']]
-                gender_dist = self.df[gender_col].value_counts()
-                f.write(f"\n性别分布:\n{gender_dist}\n")
+            if gender_col is not None:
+                f.write(f"\n性别分布:\n{summary.value_counts(gender_col)}\n")
             
             # 年龄分布
-            if self.df.columns[self.basic_info['age']] in self.df.columns:
-                age_col = self.df.columns[self.basic_info['age']]
-                f.write(f"\n年龄统计:\n{self.df[age_col].describe()}\n")
+            if age_col is not None:
+                f.write(f"\n年龄统计:\n{summary.describe(age_col)}\n")
             
             # 关系质量得分统计
             f.write("\n【关系质量得分统计】\n")
-            relationship_scores = ['stepparent_past_score', 'stepparent_current_score', 
-                                 'bioparent_past_score', 'bioparent_current_score']
-            
+            if quantile_error is not None:
+                f.write(f"（分位数为近似值，秩误差约 {quantile_error:.2%}）\n")
             for score in relationship_scores:
-                if score in self.df.columns:
-                    f.write(f"\n{score}:\n{self.df[score].describe()}\n")
+                if score in described:
+                    f.write(f"\n{score}:\n{summary.describe(score)}\n")
             
             # 关系质量变化
             f.write("\n【关系质量变化】\n")
-            if 'stepparent_change' in self.df.columns:
-                f.write(f"继父母关系变化:\n{self.df['stepparent_change'].describe()}\n")
-            if 'bioparent_change' in self.df.columns:
-                f.write(f"生身父母关系变化:\n{self.df['bioparent_change'].describe()}\n")
+            if 'stepparent_change' in described:
+                f.write(f"继父母关系变化:\n{summary.describe('stepparent_change')}\n")
+            if 'bioparent_change' in described:
+                f.write(f"生身父母关系变化:\n{summary.describe('bioparent_change')}\n")
         
         print(f"描述性统计分析已保存到: {output_file}")
         return output_file
     
+    @profile_stage()
     def comparative_analysis(self):
         """对比分析：继父母vs生身父母"""
         print("进行对比分析...")
         
         output_file = os.path.join(self.output_dir, f'relationship_comparison_{self.timestamp}.txt')
         
+        # (标题, 得分A, 得分B, A的名称, B的名称)
+        comparisons = [
+            ('【过去时期（18岁前）关系质量对比】', 'stepparent_past_score', 'bioparent_past_score',
+             '继父母关系得分均值', '生身父母关系得分均值'),
+            ('【现在时期关系质量对比】', 'stepparent_current_score', 'bioparent_current_score',
+             '继父母关系得分均值', '生身父母关系得分均值'),
+            ('【时间变化对比】', 'stepparent_change', 'bioparent_change',
+             '继父母关系变化均值', '生身父母关系变化均值'),
+        ]
+        
+        # 所有配对比较一次批量计算（配对t检验、Wilcoxon、效应量、FDR校正）
+        available = [(a, b) for _, a, b, _, _ in comparisons
+                     if a in self.df.columns and b in self.df.columns]
+        results = paired_comparisons(self.df, available) if available else None
+        
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write("继家庭关系研究 - 继父母vs生身父母对比分析\n")
             f.write("=" * 60 + "\n\n")
             
-            # 1. 过去时期对比
-            f.write("【过去时期（18岁前）关系质量对比】\n")
-            if all(col in self.df.columns for col in ['stepparent_past_score', 'bioparent_past_score']):
-                # 配对t检验
-                past_data = self.df[['stepparent_past_score', 'bioparent_past_score']].dropna()
-                if len(past_data) > 0:
-                    t_stat, p_value = stats.ttest_rel(past_data['stepparent_past_score'], 
-                                                    past_data['bioparent_past_score'])
-                    
-                    f.write(f"继父母关系得分均值: {past_data['stepparent_past_score'].mean():.3f}\n")
-                    f.write(f"生身父母关系得分均值: {past_data['bioparent_past_score'].mean():.3f}\n")
-                    f.write(f"配对t检验: t={t_stat:.3f}, p={p_value:.3f}\n")
-                    f.write(f"显著性: {'显著' if p_value < 0.05 else '不显著'}\n\n")
-            
-            # 2. 现在时期对比
-            f.write("【现在时期关系质量对比】\n")
-            if all(col in self.df.columns for col in ['stepparent_current_score', 'bioparent_current_score']):
-                current_data = self.df[['stepparent_current_score', 'bioparent_current_score']].dropna()
-                if len(current_data) > 0:
-                    t_stat, p_value = stats.ttest_rel(current_data['stepparent_current_score'], 
-                                                    current_data['bioparent_current_score'])
-                    
-                    f.write(f"继父母关系得分均值: {current_data['stepparent_current_score'].mean():.3f}\n")
-                    f.write(f"生身父母关系得分均值: {current_data['bioparent_current_score'].mean():.3f}\n")
-                    f.write(f"配对t检验: t={t_stat:.3f}, p={p_value:.3f}\n")
-                    f.write(f"显著性: {'显著' if p_value < 0.05 else '不显著'}\n\n")
-            
-            # 3. 时间变化对比
-            f.write("【时间变化对比】\n")
-            if all(col in self.df.columns for col in ['stepparent_change', 'bioparent_change']):
-                change_data = self.df[['stepparent_change', 'bioparent_change']].dropna()
-                if len(change_data) > 0:
-                    t_stat, p_value = stats.ttest_rel(change_data['stepparent_change'], 
-                                                    change_data['bioparent_change'])
-                    
-                    f.write(f"继父母关系变化均值: {change_data['stepparent_change'].mean():.3f}\n")
-                    f.write(f"生身父母关系变化均值: {change_data['bioparent_change'].mean():.3f}\n")
-                    f.write(f"配对t检验: t={t_stat:.3f}, p={p_value:.3f}\n")
-                    f.write(f"显著性: {'显著' if p_value < 0.05 else '不显著'}\n\n")
+            for i, (title, col_a, col_b, label_a, label_b) in enumerate(comparisons, 1):
+                f.write(f"{title}\n")
+                if (col_a, col_b) not in available:
+                    continue
+                row = results[(results['var_a'] == col_a) & (results['var_b'] == col_b)].iloc[0]
+                if row['n'] == 0:
+                    continue
+                
+                f.write(f"{label_a}: {row['mean_a']:.3f}\n")
+                f.write(f"{label_b}: {row['mean_b']:.3f}\n")
+                f.write(f"配对t检验: t={row['t']:.3f}, p={row['p_t']:.3f}\n")
+                f.write(f"Wilcoxon符号秩检验: W={row['wilcoxon_w']:.1f}, p={row['p_wilcoxon']:.3f}\n")
+                f.write(f"效应量: Cohen's dz={row['cohen_dz']:.3f}, 秩二列相关={row['rank_biserial']:.3f}\n")
+                f.write(f"显著性: {'显著' if row['p_t'] < 0.05 else '不显著'}\n\n")
+        
+        if results is not None:
+            results.to_csv(output_file.replace('.txt', '.csv'), index=False, encoding='utf-8-sig')
+        
+        # 多重填补：各填补数据集上的配对t检验按 Rubin 规则合并
+        if self.imputations and available:
+            pooled = pooled_paired_tests(self.imputations, available)
+            pooled.to_csv(output_file.replace('.txt', '_pooled.csv'), index=False,
+                          encoding='utf-8-sig')
+            with open(output_file, 'a', encoding='utf-8') as f:
+                f.write(f"【多重填补合并结果（{len(self.imputations)} 个数据集，Rubin 规则）】\n")
+                for title, col_a, col_b, label_a, label_b in comparisons:
+                    if (col_a, col_b) not in available:
+                        continue
+                    row = pooled[(pooled['var_a'] == col_a) & (pooled['var_b'] == col_b)].iloc[0]
+                    f.write(f"{title}\n")
+                    f.write(f"{label_a}: {row['mean_a']:.3f}\n")
+                    f.write(f"{label_b}: {row['mean_b']:.3f}\n")
+                    f.write(f"合并t检验: t={row['t']:.3f}, df={row['df']:.1f}, p={row['p_t']:.3f}, "
+                            f"缺失信息比例={row['fmi']:.3f}\n\n")
         
         print(f"对比分析已保存到: {output_file}")
         return output_file
     
+    @profile_stage()
+    def item_comparisons(self):
+        """题目级对比：每道题过去vs现在（继父母28题、生身父母16题），并按性别分组"""
+        print("进行题目级对比分析...")
+        
+        items = self.scales.item_frame(
+            self.item_codes,
+            ['stepparent_past', 'stepparent_current', 'bioparent_past', 'bioparent_current'],
+            index=self.df.index)
+        
+        pairs = []
+        for past, current in [('stepparent_past', 'stepparent_current'),
+                              ('bioparent_past', 'bioparent_current')]:
+            pairs += list(zip(self.scales.item_names(past), self.scales.item_names(current)))
+        
+        results = paired_comparisons(items, pairs, group_by=self.df[self.basic_column('gender')])
+        
+        output_file = os.path.join(self.output_dir, f'relationship_item_comparison_{self.timestamp}.csv')
+        results.to_csv(output_file, index=False, encoding='utf-8-sig')
+        
+        print(f"题目级对比分析已保存到: {output_file}")
+        return output_file
+    
+    @profile_stage()
+    def reliability_analysis(self):
+        """量表信度：alpha、omega、删除该题后的 alpha、校正的题目-总分相关（全体及按性别）"""
+        print("进行量表信度分析...")
+        
+        summary, items = scale_reliability(self.item_codes, self.scales,
+                                           group_by=self.df[self.basic_column('gender')])
+        
+        output_file = os.path.join(self.output_dir, f'relationship_reliability_{self.timestamp}.csv')
+        summary.to_csv(output_file, index=False, encoding='utf-8-sig')
+        items.to_csv(output_file.replace('.csv', '_items.csv'), index=False, encoding='utf-8-sig')
+        
+        # 全体样本的结果；需复核的题目见 *_items.csv 的 flag 列
+        overall = items['group'] == items['group'].iloc[0]
+        flagged = items[overall & (items['flag'] != '')].groupby('scale').size()
+        for row in summary[summary['group'] == items['group'].iloc[0]].itertuples():
+            print(f"  - {row.scale}: alpha={row.alpha:.3f}, omega={row.omega:.3f} (n={row.n})"
+                  f"，需复核题目 {flagged.get(row.scale, 0)} 个")
+        
+        print(f"量表信度分析已保存到: {output_file}")
+        return output_file
+    
+    def assign_clusters(self, n_jobs=None):
+        """
+        关系模式聚类（四个关系得分与两个变化得分），类别列写回 self.df
+
+        Returns:
+            clustering.cluster_relationship_patterns 的结果
+        """
+        if self.clusters is None:
+            print("进行关系模式聚类...")
+            result = cluster_relationship_patterns(self.df, n_jobs=n_jobs)
+            # 整体替换 self.df，不在原 DataFrame 上插入列
+            self.df = pd.concat([self.df.drop(columns=CLUSTER_COLUMNS, errors='ignore'),
+                                 result['assignments']], axis=1)
+            self.clusters = result
+        return self.clusters
+    
+    @profile_stage()
+    def cluster_analysis(self, n_jobs=None):
+        """聚类分析：识别关系模式类型，保存类别数选择指标与各类别均值"""
+        result = self.assign_clusters(n_jobs=n_jobs)
+        
+        output_file = os.path.join(self.output_dir, f'relationship_clusters_{self.timestamp}.csv')
+        result['profiles'].to_csv(output_file, index=False, encoding='utf-8-sig')
+        result['selection'].to_csv(output_file.replace('.csv', '_selection.csv'), index=False,
+                                   encoding='utf-8-sig')
+        
+        print(f"  - 按 BIC 选择的类别数: {result['k']}")
+        for row in result['profiles'].itertuples():
+            print(f"  - 类别 {row.profile}: {row.n} 人，继父母过去/现在 "
+                  f"{row.stepparent_past_score:.2f}/{row.stepparent_current_score:.2f}，"
+                  f"生身父母过去/现在 {row.bioparent_past_score:.2f}/{row.bioparent_current_score:.2f}")
+        
+        print(f"聚类分析已保存到: {output_file}")
+        return output_file
+    
+    def model_frame(self):
+        """回归与中介模型的变量：关系得分、心理健康得分（由题目编码以 float64 计算）与创伤经历得分"""
+        scores = self.scales.score(self.item_codes, list(MENTAL_HEALTH))
+        frame = pd.DataFrame({score_col: scores[name] for name, score_col in MENTAL_HEALTH.items()},
+                             index=self.df.index)
+        relationship = self.df[list(self.relationship_scales.values())]
+        return pd.concat([relationship, frame, self.trauma_scores.set_axis(self.df.index)], axis=1)
+    
+    def fit_relationship_models(self, n_bootstrap=DEFAULT_BOOTSTRAP, n_jobs=None):
+        """
+        拟合回归与中介模型（结果保存在 self.models）
+
+        多重填补时使用观测数据（列表删除）；person_mean 等单一填补方法的关系得分直接参与建模
+
+        Returns:
+            modelling.fit_models 的结果
+        """
+        if self.models is None:
+            print("进行回归与中介分析...")
+            self.models = fit_models(self.model_frame(), n_bootstrap=n_bootstrap, n_jobs=n_jobs)
+        return self.models
+    
+    @profile_stage()
+    def modelling_analysis(self, n_bootstrap=DEFAULT_BOOTSTRAP, n_jobs=None):
+        """回归与中介分析：关系质量、创伤经历与心理健康，保存系数、拟合指标与中介效应"""
+        self.fit_relationship_models(n_bootstrap=n_bootstrap, n_jobs=n_jobs)
+        
+        output_file = os.path.join(self.output_dir, f'relationship_mediation_{self.timestamp}.csv')
+        self.models['mediation'].to_csv(output_file, index=False, encoding='utf-8-sig')
+        model_file = os.path.join(self.output_dir, f'relationship_models_{self.timestamp}.csv')
+        self.models['coefficients'].to_csv(model_file, index=False, encoding='utf-8-sig')
+        self.models['fit'].to_csv(model_file.replace('.csv', '_fit.csv'), index=False,
+                                  encoding='utf-8-sig')
+        
+        for row in self.models['fit'].itertuples():
+            print(f"  - {row.outcome}: n={row.n}, R²={row.r2:.3f}, p={row.p_f:.3f}")
+        mediation = self.models['mediation']
+        if 'significant' in mediation.columns:
+            print(f"  - 中介模型 {len(mediation)} 个，间接效应置信区间不含 0 的 "
+                  f"{int(mediation['significant'].sum())} 个")
+        
+        print(f"回归与中介分析已保存到: {output_file}")
+        return output_file
+    
+    @profile_stage()
     def create_visualizations(self):
-        """创建可视化图表"""
+        """创建可视化图表（输入未变化时复用已渲染的图表）"""
         print("创建可视化图表...")
         
-        # 设置图表样式
-        plt.style.use('default')
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        fig.suptitle('继家庭关系质量分析', fontsize=16, fontweight='bold')
-        
-        # 1. 关系质量得分对比（箱线图）
-        if all(col in self.df.columns for col in ['stepparent_past_score', 'stepparent_current_score', 
-                                                 'bioparent_past_score', 'bioparent_current_score']):
-            
-            # 准备数据
-            plot_data = []
-            labels = []
-            
-            for col, label in [('stepparent_past_score', '继父母-过去'),
-                              ('stepparent_current_score', '继父母-现在'),
-                              ('bioparent_past_score', '生身父母-过去'),
-                              ('bioparent_current_score', '生身父母-现在')]:
-                if col in self.df.columns:
-                    plot_data.append(self.df[col].dropna())
-                    labels.append(label)
-            
-            axes[0,0].boxplot(plot_data, labels=labels)
-            axes[0,0].set_title('关系质量得分对比')
-            axes[0,0].set_ylabel('关系质量得分')
-            axes[0,0].tick_params(axis='x', rotation=45)
-        
-        # 2. 关系质量变化对比
-        if all(col in self.df.columns for col in ['stepparent_change', 'bioparent_change']):
-            change_data = [self.df['stepparent_change'].dropna(), 
-                          self.df['bioparent_change'].dropna()]
-            axes[0,1].boxplot(change_data, labels=['继父母关系变化', '生身父母关系变化'])
-            axes[0,1].set_title('关系质量变化对比')
-            axes[0,1].set_ylabel('变化得分')
-            axes[0,1].axhline(y=0, color='red', linestyle='--', alpha=0.7)
-        
-        # 3. 散点图：过去vs现在关系质量
-        if all(col in self.df.columns for col in ['stepparent_past_score', 'stepparent_current_score']):
-            axes[1,0].scatter(self.df['stepparent_past_score'], self.df['stepparent_current_score'], 
-                            alpha=0.6, label='继父母关系')
-            
-        if all(col in self.df.columns for col in ['bioparent_past_score', 'bioparent_current_score']):
-            axes[1,0].scatter(self.df['bioparent_past_score'], self.df['bioparent_current_score'], 
-                            alpha=0.6, label='生身父母关系')
-            
-        axes[1,0].plot([1, 5], [1, 5], 'r--', alpha=0.7, label='无变化线')
-        axes[1,0].set_xlabel('过去关系质量')
-        axes[1,0].set_ylabel('现在关系质量')
-        axes[1,0].set_title('关系质量：过去vs现在')
-        axes[1,0].legend()
-        
-        # 4. 关系质量分布直方图
-        if 'stepparent_current_score' in self.df.columns and 'bioparent_current_score' in self.df.columns:
-            axes[1,1].hist(self.df['stepparent_current_score'].dropna(), alpha=0.7, 
-                          label='继父母关系', bins=20)
-            axes[1,1].hist(self.df['bioparent_current_score'].dropna(), alpha=0.7, 
-                          label='生身父母关系', bins=20)
-            axes[1,1].set_xlabel('关系质量得分')
-            axes[1,1].set_ylabel('频数')
-            axes[1,1].set_title('当前关系质量分布')
-            axes[1,1].legend()
-        
-        plt.tight_layout()
+        columns = [col for col in ['stepparent_past_score', 'stepparent_current_score',
+                                   'bioparent_past_score', 'bioparent_current_score',
+                                   'stepparent_change', 'bioparent_change']
+                   if col in self.df.columns]
         
         # 保存图表
         plot_file = os.path.join(self.output_dir, f'relationship_plots_{self.timestamp}.png')
-        plt.savefig(plot_file, dpi=300, bbox_inches='tight')
-        plt.close()
+        render_figures([figure_job('relationship_panel', plot_file, self.df[columns],
+                                   title='继家庭关系质量分析', dpi=300, rc=CHINESE_FONT_RC)],
+                       n_jobs=1)
         
         print(f"可视化图表已保存到: {plot_file}")
         return plot_file
@@ -302,12 +504,17 @@ class StepfamilyRelationshipAnalyzer:
         
         # 4. 对比分析
         comp_file = self.comparative_analysis()
+        item_file = self.item_comparisons()
+        reliability_file = self.reliability_analysis()
+        cluster_file = self.cluster_analysis()
+        model_file = self.modelling_analysis()
         
         # 5. 可视化
         plot_file = self.create_visualizations()
         
         # 6. 生成总结报告
-        self.generate_summary_report([desc_file, comp_file, plot_file])
+        self.generate_summary_report([desc_file, comp_file, item_file, reliability_file,
+                                      cluster_file, model_file, plot_file])
         
         print("\n分析完成！所有输出文件已保存到 output/ 目录")
         print("=" * 60)
@@ -331,19 +538,33 @@ class StepfamilyRelationshipAnalyzer:
             f.write("【主要发现】\n")
             f.write("1. 时间维度分析：比较了18岁前和现在的关系质量\n")
             f.write("2. 父母类型对比：比较了继父母和生身父母的关系质量\n")
-            f.write("3. 变化趋势：分析了关系质量随时间的变化\n\n")
+            f.write("3. 变化趋势：分析了关系质量随时间的变化\n")
+            if self.clusters is not None:
+                f.write(f"4. 关系模式：聚类识别出 {self.clusters['k']} 类关系模式（见 relationship_clusters_*.csv）\n")
+            if self.models is not None:
+                mediation = self.models['mediation']
+                significant = int(mediation['significant'].sum()) if 'significant' in mediation.columns else 0
+                f.write(f"5. 心理健康关联：关系质量、创伤经历对心理健康的回归与中介模型 "
+                        f"{len(mediation)} 个，其中间接效应显著的 {significant} 个"
+                        f"（见 relationship_mediation_*.csv）\n")
+            f.write("\n")
             
             f.write("【生成文件】\n")
             for i, file_path in enumerate(file_list, 1):
                 f.write(f"{i}. {os.path.basename(file_path)}\n")
             
             f.write(f"\n【建议后续分析】\n")
-            f.write("1. 影响因素分析：探索年龄、性别、同住时长等因素的影响\n")
-            f.write("2. 创伤经历分析：分析暴力或性侵经历对关系质量的影响\n")
-            f.write("3. 心理健康关联：分析关系质量与心理健康指标的关系\n")
-            f.write("4. 聚类分析：识别不同的关系模式类型\n")
+            suggestions = ["影响因素分析：探索年龄、性别、同住时长等因素的影响"]
+            if self.models is None:
+                suggestions += ["创伤经历分析：分析暴力或性侵经历对关系质量的影响",
+                                "心理健康关联：分析关系质量与心理健康指标的关系"]
+            if self.clusters is None:
+                suggestions.append("聚类分析：识别不同的关系模式类型")
+            for i, suggestion in enumerate(suggestions, 1):
+                f.write(f"{i}. {suggestion}\n")
         
         print(f"总结报告已保存到: {summary_file}")
+        return summary_file
 
 def main():
     """主函数"""
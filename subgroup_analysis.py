@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+subgroup_analysis.py
+- 影响因素分析：按性别、继父母性别、开始同住年龄（分段）、同住时长等基本信息划分参与者
+- 每个分组单元分别进行描述性统计、配对对比与相关分析
+- 得分矩阵放入共享内存，各工作进程直接映射读取，只向进程传递行索引
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from clustering import PROFILE_COLUMN
+from correlation_accumulator import PairwiseCorrelationAccumulator
+from demographics import clean_demographic_column
+from paired_tests import fdr_bh, paired_statistics
+from profiling import profile_stage
+
+# 开始同住年龄的分段
+START_AGE_BINS = [0, 6, 12, 18, np.inf]
+START_AGE_LABELS = ['0-6岁', '7-12岁', '13-18岁', '18岁以上']
+
+# 默认的分组字段（basic_info 中的键）
+DEFAULT_FIELDS = ['gender', 'stepparent_gender', 'start_age', 'cohabitation_duration']
+
+# 工作进程中映射的共享得分矩阵
+_SHARED = {}
+
+
+def _attach_shared(name, shape, dtype):
+    """工作进程初始化：映射共享内存中的得分矩阵"""
+    shm = shared_memory.SharedMemory(name=name)
+    _SHARED['shm'] = shm
+    _SHARED['values'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _analyze_cell(field, cell, rows, variables, pairs):
+    """
+    分析一个分组单元
+
+    Args:
+        field: 分组字段
+        cell: 分组取值
+        rows: 该单元的行索引
+        variables: 得分矩阵的列名
+        pairs: 配对比较的列位置 [(i, j), ...]
+    """
+    values = _SHARED['values'][rows]
+    n = len(rows)
+
+    # 描述性统计
+    with warnings.catch_warnings():
+        # 全部缺失的列会触发 "Mean of empty slice" 等警告，结果为 NaN 即可
+        warnings.simplefilter('ignore', RuntimeWarning)
+        count = (~np.isnan(values)).sum(axis=0)
+        quantiles = np.nanpercentile(values, [0, 25, 50, 75, 100], axis=0)
+        descriptive = pd.DataFrame({
+            'field': field, 'cell': cell, 'n_cell': n, 'variable': variables,
+            'count': count,
+            'mean': np.nanmean(values, axis=0),
+            'std': np.nanstd(values, axis=0, ddof=1),
+            'min': quantiles[0], '25%': quantiles[1], '50%': quantiles[2],
+            '75%': quantiles[3], 'max': quantiles[4],
+        })
+
+    # 配对对比
+    a = values[:, [i for i, _ in pairs]]
+    b = values[:, [j for _, j in pairs]]
+    comparison = pd.DataFrame(paired_statistics(a, b))
+    comparison.insert(0, 'var_b', [variables[j] for _, j in pairs])
+    comparison.insert(0, 'var_a', [variables[i] for i, _ in pairs])
+    comparison.insert(0, 'cell', cell)
+    comparison.insert(0, 'field', field)
+
+    # 相关分析（成对完整样本）
+    corr = PairwiseCorrelationAccumulator.from_values(values, variables)
+    upper = np.triu_indices(len(variables), k=1)
+    correlation = pd.DataFrame({
+        'field': field, 'cell': cell,
+        'var1': [variables[i] for i in upper[0]],
+        'var2': [variables[j] for j in upper[1]],
+        'n': corr.n[upper].astype(np.int64),
+        'r': corr.correlation().to_numpy()[upper],
+    })
+    return descriptive, comparison, correlation
+
+
+class SubgroupAnalyzer:
+    """基于 StepfamilyRelationshipAnalyzer 的分组分析驱动器"""
+
+    def __init__(self, analyzer, fields=None, min_cell_size=10, n_jobs=None):
+        """
+        Args:
+            analyzer: 已完成 calculate_relationship_scores 的 StepfamilyRelationshipAnalyzer
+            fields: 分组字段（basic_info 中的键或 df 中的列名），默认 DEFAULT_FIELDS，
+                    分析器已完成聚类时另加关系模式类别
+            min_cell_size: 少于该人数的分组单元不分析
+            n_jobs: 并行进程数，默认为 CPU 核数
+        """
+        self.analyzer = analyzer
+        self.fields = fields or DEFAULT_FIELDS + (
+            [PROFILE_COLUMN] if PROFILE_COLUMN in analyzer.df.columns else [])
+        self.min_cell_size = min_cell_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+
+        self.variables = list(analyzer.relationship_scales.values()) + \
+            ['stepparent_change', 'bioparent_change']
+        self.pairs = [('stepparent_past_score', 'bioparent_past_score'),
+                      ('stepparent_current_score', 'bioparent_current_score'),
+                      ('stepparent_change', 'bioparent_change')]
+
+    def partition_key(self, field):
+        """返回某分组字段的分组取值（开始同住年龄按年龄段分箱）"""
+        series = self.analyzer.df[self.analyzer.basic_column(field)]
+        if field == 'start_age':
+            return pd.cut(clean_demographic_column(series), bins=START_AGE_BINS,
+                          labels=START_AGE_LABELS, right=True, include_lowest=True)
+        return series
+
+    def iter_cells(self):
+        """遍历所有 (字段, 取值, 行索引)"""
+        for field in self.fields:
+            key = self.partition_key(field)
+            for cell, rows in key.groupby(key, observed=True).indices.items():
+                if len(rows) >= self.min_cell_size:
+                    yield field, str(cell), rows.astype(np.int64)
+
+    @profile_stage('subgroup_analysis')
+    def run(self):
+        """
+        在进程池中分析所有分组单元
+
+        Returns:
+            (描述性统计, 配对对比, 相关分析) 三个整洁格式的 DataFrame
+        """
+        values = np.ascontiguousarray(
+            self.analyzer.df[self.variables].to_numpy(dtype=np.float64))
+        position = {name: i for i, name in enumerate(self.variables)}
+        pairs = [(position[a], position[b]) for a, b in self.pairs]
+        cells = list(self.iter_cells())
+
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        try:
+            shared = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)
+            shared[:] = values
+            init_args = (shm.name, values.shape, values.dtype)
+
+            if self.n_jobs <= 1:
+                _attach_shared(*init_args)
+                results = [_analyze_cell(field, cell, rows, self.variables, pairs)
+                           for field, cell, rows in cells]
+                _SHARED.pop('shm').close()
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_attach_shared,
+                                         initargs=init_args) as executor:
+                    futures = [executor.submit(_analyze_cell, field, cell, rows,
+                                               self.variables, pairs)
+                               for field, cell, rows in cells]
+                    results = [future.result() for future in futures]
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+
+        if not results:
+            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+        descriptive = pd.concat([r[0] for r in results], ignore_index=True)
+        comparison = pd.concat([r[1] for r in results], ignore_index=True)
+        comparison['p_t_fdr'] = fdr_bh(comparison['p_t'])
+        comparison['p_wilcoxon_fdr'] = fdr_bh(comparison['p_wilcoxon'])
+        correlation = pd.concat([r[2] for r in results], ignore_index=True)
+        return descriptive, comparison, correlation
+
+    def save(self):
+        """运行分组分析并保存结果，返回输出文件列表"""
+        print("进行分组分析...")
+        descriptive, comparison, correlation = self.run()
+
+        output_dir = self.analyzer.output_dir
+        timestamp = self.analyzer.timestamp
+        files = []
+        for name, frame in [('descriptive', descriptive), ('comparison', comparison),
+                            ('correlation', correlation)]:
+            path = os.path.join(output_dir, f'subgroup_{name}_{timestamp}.csv')
+            frame.to_csv(path, index=False, encoding='utf-8-sig')
+            files.append(path)
+
+        print(f"分组分析已保存到: {', '.join(files)}")
+        return files
+
+
+def main():
+    """主函数"""
+    from stepfamily_analysis import StepfamilyRelationshipAnalyzer
+
+    analyzer = StepfamilyRelationshipAnalyzer()
+    if not analyzer.load_data():
+        return
+    analyzer.calculate_relationship_scores()
+    SubgroupAnalyzer(analyzer).save()
+
+
+if __name__ == "__main__":
+    main()
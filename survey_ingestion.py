@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+survey_ingestion.py
+- 多文件 / 多批次数据的读取：数据来源可以是单个文件、通配符、目录或 JSON 清单
+- 各工作簿在进程池中并行解析（逐个文件复用 data_loader 的列式缓存）
+- 校验各文件的列布局与量表注册表、基本信息列位置一致后按行合并，
+  并在末尾追加批次 (wave) 与来源 (source) 列，原有列位置保持不变
+- 用法:
+    python survey_ingestion.py "assets/waves/*.xlsx"        # 校验并汇总各文件
+    python survey_ingestion.py assets/manifest.json
+"""
+
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DEFAULT_CACHE_DIR, load_survey_data
+from demographics import BASIC_INFO_COLUMNS, DEMOGRAPHIC_COLUMNS
+from profiling import annotate, profile_stage
+from scale_registry import SCALE_REGISTRY
+
+# 合并后追加的列
+WAVE_COLUMN = 'wave'
+SOURCE_COLUMN = 'source'
+
+# 目录作为数据来源时读取的文件类型
+SURVEY_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.parquet')
+
+# 校验失败时最多列出的不一致列数
+MAX_REPORTED_MISMATCHES = 5
+
+
+def registered_positions():
+    """量表注册表与基本信息、人口学变量用到的所有列位置（升序）"""
+    positions = {i for spec in SCALE_REGISTRY.values() for i in spec['items']}
+    positions.update(BASIC_INFO_COLUMNS.values())
+    positions.update(idx for idx, _ in DEMOGRAPHIC_COLUMNS)
+    return sorted(positions)
+
+
+def is_multi_source(spec):
+    """数据来源是否需要按多文件读取（列表、通配符、目录或 JSON 清单）"""
+    if isinstance(spec, (list, tuple)):
+        return True
+    spec = os.fspath(spec)
+    return (glob.has_magic(spec) or os.path.isdir(spec)
+            or os.path.splitext(spec)[1].lower() == '.json')
+
+
+def _source(path, wave=None, source=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return {'path': path,
+            'wave': stem if wave is None else str(wave),
+            'source': os.path.basename(path) if source is None else str(source)}
+
+
+def _read_manifest(path):
+    """
+    读取 JSON 清单：文件列表，或 {"files": [...]}；
+    每项为路径字符串或 {"path": ..., "wave": ..., "source": ...}，相对路径相对于清单所在目录
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    entries = manifest.get('files', []) if isinstance(manifest, dict) else manifest
+    base = os.path.dirname(os.path.abspath(path))
+
+    sources = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        if 'path' not in entry:
+            raise ValueError(f"清单条目缺少 path: {entry}")
+        for file_path in resolve_sources(os.path.join(base, entry['path'])):
+            sources.append(_source(file_path['path'], entry.get('wave'), entry.get('source')))
+    return sources
+
+
+def resolve_sources(spec):
+    """
+    将数据来源展开为文件列表
+
+    Args:
+        spec: 文件路径、通配符、目录、JSON 清单，或由它们组成的列表
+
+    Returns:
+        list: [{'path': 路径, 'wave': 批次, 'source': 来源}, ...]；
+              未在清单中指定时批次为文件名（不含扩展名），来源为文件名
+    """
+    if isinstance(spec, (list, tuple)):
+        return [source for item in spec for source in resolve_sources(item)]
+
+    spec = os.fspath(spec)
+    if os.path.splitext(spec)[1].lower() == '.json' and not glob.has_magic(spec):
+        return _read_manifest(spec)
+    if os.path.isdir(spec):
+        paths = sorted(os.path.join(spec, name) for name in os.listdir(spec)
+                       if os.path.splitext(name)[1].lower() in SURVEY_EXTENSIONS
+                       and not name.startswith(('.', '~$')))
+    elif glob.has_magic(spec):
+        paths = sorted(glob.glob(spec, recursive=True))
+    else:
+        paths = [spec]
+
+    if not paths:
+        raise FileNotFoundError(f"未找到数据文件: {spec}")
+    return [_source(path) for path in paths]
+
+
+def validate_layout(columns, reference, path, check_headers=True):
+    """
+    校验一个文件的列布局
+
+    Args:
+        columns: 该文件的列名
+        reference: 第一个文件的列名
+        path: 该文件路径（用于错误信息）
+        check_headers: 是否要求注册表用到的列位置上列名与第一个文件一致
+
+    Raises:
+        ValueError: 列数不足、列数与第一个文件不同，或注册列的列名不一致
+    """
+    required = registered_positions()[-1] + 1
+    if len(columns) < required:
+        raise ValueError(f"{path}: 共 {len(columns)} 列，少于量表注册表需要的 {required} 列")
+    if len(columns) != len(reference):
+        raise ValueError(f"{path}: 共 {len(columns)} 列，与第一个文件的 {len(reference)} 列不一致")
+    if not check_headers:
+        return
+
+    mismatches = [(i, reference[i], columns[i]) for i in registered_positions()
+                  if str(columns[i]).strip() != str(reference[i]).strip()]
+    if mismatches:
+        details = '; '.join(f"第{i + 1}列 '{expected}' != '{actual}'"
+                            for i, expected, actual in mismatches[:MAX_REPORTED_MISMATCHES])
+        raise ValueError(f"{path}: {len(mismatches)} 个注册列的列名与第一个文件不一致: {details}")
+
+
+def _load_one(path, use_cache, cache_dir, read_kwargs):
+    """工作进程：读取一个文件"""
+    return load_survey_data(path, use_cache=use_cache, cache_dir=cache_dir, **read_kwargs)
+
+
+@profile_stage()
+def load_survey_files(spec, n_jobs=None, use_cache=True, cache_dir=DEFAULT_CACHE_DIR,
+                      check_headers=True, **read_kwargs):
+    """
+    读取并合并多个调查数据文件
+
+    Args:
+        spec: 文件路径、通配符、目录、JSON 清单，或由它们组成的列表
+        n_jobs: 并行解析的进程数，默认为 CPU 核数（不超过文件数）
+        use_cache: 是否使用列式缓存
+        cache_dir: 缓存目录
+        check_headers: 是否校验注册列的列名
+        read_kwargs: 传递给 pandas 读取函数的参数
+
+    Returns:
+        DataFrame: 各文件按行合并，列名取第一个文件的列名，末尾追加 wave / source 列（分类类型）
+    """
+    sources = resolve_sources(spec)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(sources))
+
+    if n_jobs <= 1:
+        frames = [_load_one(s['path'], use_cache, cache_dir, read_kwargs) for s in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_load_one, s['path'], use_cache, cache_dir, read_kwargs)
+                       for s in sources]
+            frames = [future.result() for future in futures]
+
+    reference = list(frames[0].columns)
+    for source, frame in zip(sources, frames):
+        validate_layout(list(frame.columns), reference, source['path'], check_headers)
+        if WAVE_COLUMN in frame.columns or SOURCE_COLUMN in frame.columns:
+            raise ValueError(f"{source['path']}: 已包含 {WAVE_COLUMN}/{SOURCE_COLUMN} 列")
+        # 按位置对齐：列名以第一个文件为准
+        frame.columns = reference
+
+    df = pd.concat(frames, ignore_index=True)
+    lengths = [len(frame) for frame in frames]
+    for column in (WAVE_COLUMN, SOURCE_COLUMN):
+        labels = [s[column] for s in sources]
+        categories = list(dict.fromkeys(labels))
+        codes = np.repeat([categories.index(label) for label in labels], lengths)
+        df[column] = pd.Categorical.from_codes(codes, categories=categories)
+    annotate(df)
+    return df
+
+
+def load_survey(spec, n_jobs=None, **kwargs):
+    """
+    统一入口：单个文件直接读取，多文件来源按 load_survey_files 合并
+    """
+    if is_multi_source(spec):
+        return load_survey_files(spec, n_jobs=n_jobs, **kwargs)
+    return load_survey_data(spec, **kwargs)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='校验并合并多个调查数据文件')
+    parser.add_argument('sources', nargs='+', help='文件路径、通配符、目录或 JSON 清单')
+    parser.add_argument('--n-jobs', type=int, default=None, help='并行解析的进程数')
+    parser.add_argument('--no-header-check', action='store_true',
+                        help='只校验列数，不校验注册列的列名')
+    args = parser.parse_args()
+
+    df = load_survey_files(args.sources, n_jobs=args.n_jobs,
+                           check_headers=not args.no_header_check)
+    print(f"合并后的数据形状: {df.shape}")
+    print(df.groupby([WAVE_COLUMN, SOURCE_COLUMN], observed=True).size()
+          .rename('参与者数').to_string())
+
+
+if __name__ == "__main__":
+    main()
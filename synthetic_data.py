@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+synthetic_data.py
+- 生成与真实问卷导出文件结构一致的模拟数据（366列、相同的题目位置与中文答案文本）
+- 量表答案由潜变量模型生成：继父母/生身父母关系质量、心理健康之间存在相关，反向计分题方向相反
+- 人口学变量使用与问卷一致的范围文本（"1-3年"、"大于10年" 等），并模拟题目缺失与中途退出
+- 按固定大小的块生成，随机数流与写出时的分块无关；可写出 xlsx / csv / parquet
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from likert_encoding import LIKERT_5_POINT_MAPPING
+from scale_registry import SCALE_REGISTRY
+
+# 原始数据列数
+N_COLUMNS = 366
+
+# 每个随机数流生成的行数（修改会改变同一种子下的数据）
+GENERATION_BLOCK = 10000
+
+# Excel 工作表的最大数据行数
+EXCEL_MAX_ROWS = 1048575
+
+# 五级量表答案文本，按分值排序
+LIKERT_LABELS = np.array(sorted(LIKERT_5_POINT_MAPPING, key=LIKERT_5_POINT_MAPPING.get),
+                         dtype=object)
+
+# 人口学与其他分类题目：列索引 -> (列名, 取值, 概率)
+CATEGORICAL_COLUMNS = {
+    3: ('来源', ['微信', '手机提交', '链接'], [0.6, 0.3, 0.1]),
+    9: ('1、您的性别', ['男', '女'], [0.45, 0.55]),
+    10: ('2、您的年龄', ['18', '19', '20', '21', '22', '23-25', '26-30', '大于30'],
+         [0.15, 0.15, 0.15, 0.12, 0.1, 0.15, 0.1, 0.08]),
+    11: ('3、您有几位继父母', ['1位', '2位'], [0.9, 0.1]),
+    12: ('4、您的继父母是', ['继父', '继母', '继父和继母'], [0.55, 0.4, 0.05]),
+    13: ('5、您与继父母共同生活的时长', ['小于1年', '1-3年', '4-6年', '7-10年', '大于10年'],
+         [0.1, 0.25, 0.25, 0.2, 0.2]),
+    14: ('6、您目前是否与继父母同住', ['是', '否'], [0.4, 0.6]),
+    15: ('7、您开始与继父母同住的年龄', ['小于3岁', '3-6岁', '7-9岁', '10-12岁', '13-15岁',
+                                     '16-18岁', '大于18岁'],
+         [0.08, 0.17, 0.2, 0.2, 0.17, 0.12, 0.06]),
+    23: ('15、您的受教育程度', ['高中及以下', '大专', '本科', '研究生及以上'],
+         [0.15, 0.25, 0.5, 0.1]),
+}
+
+# 创伤经历题目（列201-214）的答案文本
+TRAUMA_LABELS = np.array(['从未', '1-2次', '3-5次', '6次及以上'], dtype=object)
+TRAUMA_COLUMNS = list(range(201, 215))
+
+# 量表题目的列名前缀
+SCALE_HEADERS = {
+    'stepparent_past': '我未满18岁时的感受—继父母',
+    'stepparent_current': '我现在的感受—继父母',
+    'bioparent_past': '我未满18岁时的感受—生身父母',
+    'bioparent_current': '我现在的感受—生身父母',
+    'self_esteem': '自尊量表',
+    'self_blame': '自责量表',
+    'anxiety': '焦虑量表 (GAD-7)',
+    'depression': '抑郁量表 (PHQ-9)',
+}
+
+# 连续潜变量 -> 五级答案的切分点
+LIKERT_THRESHOLDS = np.array([-1.2, -0.4, 0.4, 1.2])
+
+
+def survey_columns():
+    """与问卷导出文件一致的列名"""
+    columns = [f'Q{i + 1}' for i in range(N_COLUMNS)]
+    columns[0] = '序号'
+    columns[1] = '提交答卷时间'
+    columns[2] = '所用时间'
+    columns[5] = '来自IP'
+    for idx, (name, _, _) in CATEGORICAL_COLUMNS.items():
+        columns[idx] = name
+    for name, spec in SCALE_REGISTRY.items():
+        for j, idx in enumerate(spec['items'], 1):
+            columns[idx] = f'{idx + 1}、{SCALE_HEADERS.get(name, spec["label"])}—{j}'
+    for j, idx in enumerate(TRAUMA_COLUMNS, 1):
+        columns[idx] = f'{idx + 1}、创伤经历—{j}'
+    return columns
+
+
+def _latent_traits(rng, n):
+    """各量表的潜变量（标准正态，彼此相关）"""
+    step_past = rng.standard_normal(n)
+    bio_past = 0.2 * step_past + np.sqrt(1 - 0.2 ** 2) * rng.standard_normal(n)
+    step_current = 0.6 * step_past + 0.8 * rng.standard_normal(n)
+    bio_current = 0.7 * bio_past + np.sqrt(1 - 0.7 ** 2) * rng.standard_normal(n)
+    wellbeing = 0.35 * step_current + 0.3 * bio_current + 0.89 * rng.standard_normal(n)
+    return {
+        'stepparent_past': step_past,
+        'stepparent_current': step_current,
+        'bioparent_past': bio_past,
+        'bioparent_current': bio_current,
+        'self_esteem': wellbeing,
+        'self_blame': -0.6 * wellbeing + 0.8 * rng.standard_normal(n),
+        'anxiety': -0.7 * wellbeing + 0.71 * rng.standard_normal(n),
+        'depression': -0.75 * wellbeing + 0.66 * rng.standard_normal(n),
+    }
+
+
+def _likert_codes(rng, latent, n_items, reverse):
+    """由潜变量生成 (n, n_items) 的 1-5 分答案，反向计分题取反"""
+    response = 0.75 * latent[:, np.newaxis] + 0.66 * rng.standard_normal((len(latent), n_items))
+    codes = np.searchsorted(LIKERT_THRESHOLDS, response) + 1
+    if reverse:
+        codes[:, reverse] = 6 - codes[:, reverse]
+    return codes
+
+
+def generate_block(n_rows, rng, start_id=1, missing_rate=0.03, dropout_rate=0.05):
+    """
+    生成一块模拟问卷数据
+
+    Args:
+        n_rows: 行数
+        rng: numpy 随机数生成器
+        start_id: 第一行的序号
+        missing_rate: 单题随机缺失的比例
+        dropout_rate: 中途退出（之后的题目全部缺失）的参与者比例
+    """
+    values = np.full((n_rows, N_COLUMNS), None, dtype=object)
+
+    # 基本信息
+    values[:, 1] = (pd.Timestamp('2024-03-01')
+                    + pd.to_timedelta(rng.integers(0, 90 * 86400, n_rows), unit='s')
+                    ).strftime('%Y/%m/%d %H:%M:%S').to_numpy(dtype=object)
+    values[:, 2] = [f'{s}秒' for s in rng.integers(300, 3600, n_rows)]
+    values[:, 5] = [f'{a}.{b}.{c}.{d}' for a, b, c, d in rng.integers(1, 255, (n_rows, 4))]
+    for idx, (_, choices, probs) in CATEGORICAL_COLUMNS.items():
+        values[:, idx] = np.array(choices, dtype=object)[
+            rng.choice(len(choices), n_rows, p=probs)]
+
+    # 其余未定义的题目使用无关的五级答案
+    values[:, 4:N_COLUMNS] = np.where(values[:, 4:N_COLUMNS] == None,  # noqa: E711
+                                      LIKERT_LABELS[rng.integers(0, 5, (n_rows, N_COLUMNS - 4))],
+                                      values[:, 4:N_COLUMNS])
+
+    # 量表题目
+    latent = _latent_traits(rng, n_rows)
+    for name, spec in SCALE_REGISTRY.items():
+        codes = _likert_codes(rng, latent[name], len(spec['items']), spec['reverse'])
+        values[:, spec['items']] = LIKERT_LABELS[codes - 1]
+
+    # 创伤经历：关系质量越差，报告越多
+    risk = -0.8 * latent['stepparent_past'] - 2.0
+    trauma = rng.standard_normal((n_rows, len(TRAUMA_COLUMNS))) * 0.8 + risk[:, np.newaxis]
+    values[:, TRAUMA_COLUMNS] = TRAUMA_LABELS[np.searchsorted([0.0, 0.8, 1.6], trauma)]
+
+    # 缺失：单题随机缺失 + 中途退出
+    first_item = min(CATEGORICAL_COLUMNS)
+    missing = rng.random((n_rows, N_COLUMNS)) < missing_rate
+    missing[:, :first_item] = False
+    dropout = rng.random(n_rows) < dropout_rate
+    stop_at = rng.integers(24, N_COLUMNS, n_rows)
+    missing |= dropout[:, np.newaxis] & (np.arange(N_COLUMNS) >= stop_at[:, np.newaxis])
+    values[missing] = None
+
+    df = pd.DataFrame(values, columns=survey_columns())
+    df['序号'] = np.arange(start_id, start_id + n_rows, dtype=np.int64)
+    return df
+
+
+def iter_survey_blocks(n_rows, seed=0, block_size=GENERATION_BLOCK, **kwargs):
+    """
+    逐块生成模拟数据；每块使用由种子派生的独立随机数流
+    """
+    n_blocks = -(-n_rows // block_size)
+    for i, seed_seq in enumerate(np.random.SeedSequence(seed).spawn(n_blocks)):
+        start = i * block_size
+        yield generate_block(min(block_size, n_rows - start), np.random.default_rng(seed_seq),
+                             start_id=start + 1, **kwargs)
+
+
+def generate_survey(n_rows, seed=0, **kwargs):
+    """
+    生成完整的模拟问卷数据
+
+    Args:
+        n_rows: 参与者数量
+        seed: 随机种子
+        **kwargs: 传给 generate_block 的缺失参数
+    """
+    return pd.concat(list(iter_survey_blocks(n_rows, seed, **kwargs)), ignore_index=True)
+
+
+def write_survey(path, n_rows, seed=0, **kwargs):
+    """
+    生成模拟数据并写入文件（按扩展名选择 xlsx / csv / parquet）
+    csv 与 parquet 逐块写出，内存占用与总行数无关
+
+    Returns:
+        输出文件路径
+    """
+    ext = os.path.splitext(path)[1].lower()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    root, _ = os.path.splitext(path)
+    tmp_path = f'{root}.tmp{ext}'
+
+    if ext == '.xlsx':
+        if n_rows > EXCEL_MAX_ROWS:
+            raise ValueError(f"Excel 最多支持 {EXCEL_MAX_ROWS} 行，请改用 csv 或 parquet")
+        generate_survey(n_rows, seed, **kwargs).to_excel(tmp_path, index=False)
+    elif ext == '.csv':
+        for i, block in enumerate(iter_survey_blocks(n_rows, seed, **kwargs)):
+            block.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=(i == 0),
+                         index=False, encoding='utf-8-sig' if i == 0 else 'utf-8')
+    elif ext == '.parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = survey_columns()
+        schema = pa.schema([(col, pa.int64() if col == '序号' else pa.string())
+                            for col in columns])
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for block in iter_survey_blocks(n_rows, seed, **kwargs):
+                writer.write_table(pa.Table.from_pandas(block, schema=schema,
+                                                        preserve_index=False))
+    else:
+        raise ValueError(f"不支持的数据文件格式: {path}")
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='生成模拟的继家庭问卷数据')
+    parser.add_argument('--rows', type=int, default=1000, help='参与者数量')
+    parser.add_argument('--output', default='assets/synthetic_data.csv',
+                        help='输出文件 (.xlsx / .csv / .parquet)')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--missing-rate', type=float, default=0.03, help='单题随机缺失比例')
+    parser.add_argument('--dropout-rate', type=float, default=0.05, help='中途退出的参与者比例')
+    args = parser.parse_args()
+
+    print(f"生成 {args.rows} 行模拟数据...")
+    path = write_survey(args.output, args.rows, seed=args.seed,
+                        missing_rate=args.missing_rate, dropout_rate=args.dropout_rate)
+    print(f"模拟数据已保存到: {path}")
+
+
+if __name__ == "__main__":
+    main()